@@ -0,0 +1,476 @@
+"""
+Cliente para consumir nuestra propia API desde las vistas de appWeb.
+
+Soporta dos transportes, seleccionados con ``settings.API_CLIENT_MODE``:
+
+- ``'local'``: despacha la llamada en el mismo proceso, resolviendo la URL
+  contra el urlconf y ejecutando directamente la vista de ``oraculoApi``,
+  ``billing`` o ``users``. No hay red, TLS ni un segundo worker ocupado.
+- ``'http'``: hace la request real contra ``settings.API_BASE_URL``. Útil
+  cuando la web y la API se despliegan por separado.
+
+En ambos casos ``get()`` devuelve el JSON ya parseado (o ``None``) y
+``post()``/``put()`` devuelven un objeto tipo respuesta con ``status_code``,
+``content``, ``headers`` y ``json()``.
+
+El modo HTTP comparte una ``requests.Session`` por proceso (keep-alive y pool
+de conexiones), con timeouts por endpoint y reintentos acotados para GET.
+
+``gather()`` agrupa varios GET independientes: en modo HTTP se lanzan en
+paralelo sobre un pool de threads, de modo que la página espera solo a la
+llamada más lenta.
+
+Las respuestas GET con ``ETag`` (los endpoints del catálogo) se guardan por
+proceso; la siguiente llamada al mismo endpoint las revalida con
+``If-None-Match`` y, si la API responde 304, se reutiliza el cuerpo guardado.
+"""
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from django.test import RequestFactory
+from django.urls import Resolver404, resolve
+
+logger = logging.getLogger(__name__)
+
+
+class LocalResponse:
+    """Respuesta de una llamada en proceso con la misma interfaz que requests.Response"""
+
+    def __init__(self, status_code, content=b'', headers=None, chunks=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+        # Solo para respuestas en streaming: iterador de bytes de la vista
+        self.chunks = chunks
+
+    def iter_lines(self):
+        """Recorrer el cuerpo línea a línea (como requests.Response.iter_lines)"""
+        if self.chunks is None:
+            yield from self.content.splitlines()
+            return
+
+        pendiente = b''
+        for chunk in self.chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            pendiente += chunk
+            *lineas, pendiente = pendiente.split(b'\n')
+            yield from lineas
+        if pendiente:
+            yield pendiente
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', errors='replace')
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class TransportMetrics:
+    """Contadores del transporte HTTP, compartidos por todo el proceso"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = 0
+            self.errors = 0
+            self.total_ms = 0.0
+            self.max_ms = 0.0
+
+    def registrar(self, duracion_ms, error=False):
+        with self._lock:
+            self.requests += 1
+            self.total_ms += duracion_ms
+            self.max_ms = max(self.max_ms, duracion_ms)
+            if error:
+                self.errors += 1
+
+    def snapshot(self):
+        """Métricas actuales, incluyendo reutilización de conexiones del pool"""
+        conexiones = 0
+        requests_pool = 0
+        session = _session
+        if session is not None:
+            # El mismo adapter está montado para http:// y https://
+            adaptadores = {id(a): a for a in session.adapters.values()}
+            for adapter in adaptadores.values():
+                pools = adapter.poolmanager.pools
+                for key in pools.keys():
+                    pool = pools.get(key)
+                    if pool is not None:
+                        conexiones += pool.num_connections
+                        requests_pool += pool.num_requests
+
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'errors': self.errors,
+                'latencia_media_ms': round(self.total_ms / self.requests, 2) if self.requests else 0.0,
+                'latencia_max_ms': round(self.max_ms, 2),
+                # Cada conexión nueva implica un handshake TCP (+TLS en https)
+                'handshakes': conexiones,
+                'pool_hits': max(0, requests_pool - conexiones),
+            }
+
+
+metrics = TransportMetrics()
+
+
+class ValidadoresCache:
+    """
+    Últimas respuestas GET con ETag, por
+    endpoint y params, compartidas por el proceso y desalojadas por LRU
+    """
+
+    def __init__(self, maximo=None):
+        self._lock = threading.Lock()
+        self._maximo = maximo
+        self._entradas = OrderedDict()
+        self.revalidadas = 0
+
+    @property
+    def maximo(self):
+        if self._maximo is None:
+            return getattr(settings, 'API_CLIENT_VALIDADORES_MAX', 256)
+        return self._maximo
+
+    @staticmethod
+    def clave(endpoint, params):
+        return endpoint, json.dumps(params or {}, sort_keys=True, default=str)
+
+    def condicionales(self, clave):
+        """Headers para revalidar la respuesta guardada, o None si no hay"""
+        with self._lock:
+            entrada = self._entradas.get(clave)
+        if entrada is None:
+            return None
+        return {'If-None-Match': entrada[0]}
+
+    def guardar(self, clave, response):
+        etag = response.headers.get('ETag')
+        with self._lock:
+            if not etag:
+                self._entradas.pop(clave, None)
+                return
+            self._entradas[clave] = (etag, response.content)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.maximo:
+                self._entradas.popitem(last=False)
+
+    def contenido(self, clave):
+        """Cuerpo guardado para una respuesta 304, o None si ya no está"""
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                return None
+            self._entradas.move_to_end(clave)
+            self.revalidadas += 1
+            return entrada[1]
+
+    def limpiar(self):
+        with self._lock:
+            self._entradas.clear()
+            self.revalidadas = 0
+
+
+validadores = ValidadoresCache()
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Session HTTP compartida por el proceso, creada la primera vez que se usa"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                pool = getattr(settings, 'API_CLIENT_POOL', {})
+                reintentos = getattr(settings, 'API_CLIENT_RETRIES', {})
+                retry = Retry(
+                    total=reintentos.get('total', 2),
+                    backoff_factor=reintentos.get('backoff_factor', 0.3),
+                    status_forcelist=reintentos.get('status_forcelist', (502, 503, 504)),
+                    # Solo GET es idempotente en nuestra API; POST/PUT nunca se repiten
+                    allowed_methods=frozenset(['GET']),
+                    raise_on_status=False,
+                )
+                adapter = HTTPAdapter(
+                    pool_connections=pool.get('connections', 10),
+                    pool_maxsize=pool.get('maxsize', 20),
+                    max_retries=retry,
+                )
+                session = requests.Session()
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session = session
+    return _session
+
+
+def get_timeout(endpoint):
+    """Timeout (connect, read) para un endpoint, según el prefijo más largo configurado"""
+    timeouts = getattr(settings, 'API_CLIENT_TIMEOUTS', {})
+    timeout = timeouts.get('default', (3.05, 10))
+    mejor = ''
+    for prefijo, valor in timeouts.items():
+        if prefijo != 'default' and endpoint.startswith(prefijo) and len(prefijo) > len(mejor):
+            mejor, timeout = prefijo, valor
+    return timeout
+
+
+class HTTPTransport:
+    """Transporte HTTP contra un despliegue remoto de la API"""
+
+    # Las llamadas esperan red, así que paralelizarlas reduce la latencia total
+    concurrente = True
+
+    def __init__(self, base_url, session=None):
+        self.base_url = base_url
+        self.session = session
+
+    def request(self, client, method, endpoint, params=None, data=None, stream=False, headers=None):
+        session = self.session or get_session()
+        inicio = time.perf_counter()
+        error = True
+        try:
+            response = session.request(
+                method,
+                f"{self.base_url}{endpoint}",
+                headers={**client._get_headers(), **(headers or {})},
+                params=params or {},
+                data=json.dumps(data or {}) if method != 'GET' else None,
+                timeout=get_timeout(endpoint),
+                stream=stream,
+            )
+            error = response.status_code >= 500
+            return response
+        finally:
+            metrics.registrar((time.perf_counter() - inicio) * 1000, error=error)
+
+
+class LocalTransport:
+    """Transporte en proceso: ejecuta la vista de la API sin salir del worker"""
+
+    # Las vistas corren en el thread de la request y comparten su conexión a la
+    # base de datos; llevarlas a otros threads abriría conexiones nuevas sin
+    # ganar nada, porque el trabajo es casi todo CPU bajo el GIL
+    concurrente = False
+
+    def __init__(self, prefix='/api'):
+        self.prefix = prefix.rstrip('/')
+
+    def _build_request(self, method, path, params, data, client_request, headers=None):
+        defaults = {}
+        if client_request is not None:
+            # Conservar host y esquema para que build_absolute_uri() genere las mismas URLs
+            defaults['HTTP_HOST'] = client_request.get_host()
+            defaults['wsgi.url_scheme'] = client_request.scheme
+        factory = RequestFactory(**defaults)
+
+        if method == 'GET':
+            api_request = factory.get(path, data=params or {}, headers=headers)
+        else:
+            api_request = factory.generic(
+                method, path, data=json.dumps(data or {}), content_type='application/json'
+            )
+
+        if client_request is not None:
+            # Compartir la sesión para las vistas que llaman a login()/logout()
+            if hasattr(client_request, 'session'):
+                api_request.session = client_request.session
+            user = getattr(client_request, 'user', None)
+            if user is not None and user.is_authenticated:
+                # Mismo mecanismo que usa DRF para autenticar sin credenciales en el header
+                api_request._force_auth_user = user
+        return api_request
+
+    def request(self, client, method, endpoint, params=None, data=None, stream=False, headers=None):
+        path = f"{self.prefix}{endpoint}"
+        try:
+            match = resolve(path)
+        except Resolver404:
+            return LocalResponse(404, b'{"detail": "No encontrado."}')
+
+        api_request = self._build_request(method, path, params, data, client.request, headers)
+        response = match.func(api_request, *match.args, **match.kwargs)
+        if response.streaming:
+            return LocalResponse(response.status_code, headers=response.headers, chunks=response.streaming_content)
+        if hasattr(response, 'render'):
+            response.render()
+        return LocalResponse(response.status_code, response.content, response.headers)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Pool de threads compartido por el proceso para gather()"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'API_CLIENT_GATHER_WORKERS', 8),
+                    thread_name_prefix='apiclient',
+                )
+    return _executor
+
+
+def leer_eventos_sse(lineas):
+    """
+    Convertir las líneas de un stream Server-Sent Events en tuplas (evento, datos)
+    con los datos ya parseados como JSON
+    """
+    evento = 'message'
+    datos = []
+    for linea in lineas:
+        if isinstance(linea, bytes):
+            linea = linea.decode('utf-8')
+        if not linea:
+            if datos:
+                yield evento, json.loads('\n'.join(datos))
+            evento, datos = 'message', []
+        elif linea.startswith('event:'):
+            evento = linea[len('event:'):].strip()
+        elif linea.startswith('data:'):
+            datos.append(linea[len('data:'):].strip())
+    if datos:
+        yield evento, json.loads('\n'.join(datos))
+
+
+def get_transport():
+    """Construir el transporte configurado en settings"""
+    mode = getattr(settings, 'API_CLIENT_MODE', 'local')
+    if mode == 'http':
+        return HTTPTransport(settings.API_BASE_URL)
+    return LocalTransport(getattr(settings, 'API_LOCAL_PREFIX', '/api'))
+
+
+class APIClient:
+    """Cliente para consumir nuestra propia API"""
+
+    def __init__(self, request=None, transport=None):
+        self.base_url = getattr(settings, 'API_BASE_URL', 'https://www.tarotnautica.store/api')
+        self.request = request
+        self.transport = transport or get_transport()
+        self._headers = None
+        self._headers_user = None
+
+    def _get_headers(self):
+        """Obtener headers para las requests, incluyendo token si está autenticado"""
+        user = self.request.user if self.request else None
+        user_id = user.pk if user is not None and user.is_authenticated else None
+        # Reutilizar mientras no cambie el usuario (evita consultar el token en cada llamada)
+        if self._headers is not None and self._headers_user == user_id:
+            return self._headers
+
+        headers = {'Content-Type': 'application/json'}
+        if user_id is not None:
+            try:
+                token = user.auth_token.key
+                headers['Authorization'] = f'Token {token}'
+            except:
+                pass
+        self._headers = headers
+        self._headers_user = user_id
+        return headers
+
+    def _request(self, method, endpoint, params=None, data=None, stream=False, headers=None):
+        return self.transport.request(
+            self, method, endpoint, params=params, data=data, stream=stream, headers=headers
+        )
+
+    def get(self, endpoint, params=None):
+        """Hacer GET request a la API, revalidando la respuesta guardada si la hay"""
+        try:
+            clave = validadores.clave(endpoint, params)
+            response = self._request('GET', endpoint, params=params, headers=validadores.condicionales(clave))
+            if response.status_code == 304:
+                contenido = validadores.contenido(clave)
+                if contenido is not None:
+                    return json.loads(contenido)
+                # Desalojada entre la revalidación y la respuesta: pedirla completa
+                response = self._request('GET', endpoint, params=params)
+            if response.status_code != 200:
+                return None
+            validadores.guardar(clave, response)
+            return response.json()
+        except Exception as e:
+            logger.error(f"Error en GET {endpoint}: {str(e)}")
+            return None
+
+    def post(self, endpoint, data=None):
+        """Hacer POST request a la API"""
+        try:
+            return self._request('POST', endpoint, data=data)
+        except Exception as e:
+            logger.error(f"Error en POST {endpoint}: {str(e)}")
+            return None
+
+    def put(self, endpoint, data=None):
+        """Hacer PUT request a la API"""
+        try:
+            return self._request('PUT', endpoint, data=data)
+        except Exception as e:
+            logger.error(f"Error en PUT {endpoint}: {str(e)}")
+            return None
+
+    def stream(self, endpoint, data=None):
+        """
+        Hacer POST a un endpoint que responde con Server-Sent Events
+
+        Returns:
+            Iterador de tuplas (evento, datos), o None si la API no aceptó la consulta
+        """
+        try:
+            response = self._request('POST', endpoint, data=data, stream=True)
+        except Exception as e:
+            logger.error(f"Error en stream {endpoint}: {str(e)}")
+            return None
+
+        if response.status_code != 200:
+            logger.warning(f"Stream {endpoint} rechazado: HTTP {response.status_code}")
+            return None
+        return leer_eventos_sse(response.iter_lines())
+
+    def gather(self, llamadas):
+        """
+        Hacer varios GET independientes a la vez
+
+        Args:
+            llamadas (dict): nombre -> endpoint, o nombre -> (endpoint, params)
+
+        Returns:
+            dict: nombre -> lo mismo que devolvería get() para ese endpoint
+        """
+        normalizadas = {}
+        for nombre, llamada in llamadas.items():
+            if isinstance(llamada, str):
+                normalizadas[nombre] = (llamada, None)
+            else:
+                normalizadas[nombre] = tuple(llamada)
+
+        if not getattr(self.transport, 'concurrente', False) or len(normalizadas) < 2:
+            return {nombre: self.get(endpoint, params) for nombre, (endpoint, params) in normalizadas.items()}
+
+        # Resolver los headers aquí: en los threads no queremos tocar la base de datos
+        self._get_headers()
+        executor = get_executor()
+        futuros = {
+            nombre: executor.submit(self.get, endpoint, params)
+            for nombre, (endpoint, params) in normalizadas.items()
+        }
+        return {nombre: futuro.result() for nombre, futuro in futuros.items()}
@@ -0,0 +1,104 @@
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+
+from appWeb.api_client import APIClient, HTTPTransport, LocalTransport, metrics
+
+
+class Command(BaseCommand):
+    help = 'Compara la latencia de APIClient en modo local (en proceso) vs HTTP'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--base-url',
+            type=str,
+            default='http://127.0.0.1:8000/api',
+            help='URL base de la API para el modo HTTP (debe haber un servidor corriendo)'
+        )
+        parser.add_argument(
+            '--iteraciones',
+            type=int,
+            default=50,
+            help='Número de llamadas por endpoint y modo (default: 50)'
+        )
+        parser.add_argument(
+            '--email',
+            type=str,
+            help='Email de un usuario existente para probar endpoints autenticados'
+        )
+        parser.add_argument(
+            '--endpoint',
+            action='append',
+            dest='endpoints',
+            help='Endpoint a medir (se puede repetir). Default: catálogo del oráculo'
+        )
+        parser.add_argument(
+            '--solo-local',
+            action='store_true',
+            help='Medir solo el modo local (sin servidor HTTP)'
+        )
+
+    def _build_request(self, email):
+        request = RequestFactory().get('/', HTTP_HOST='localhost')
+        request.session = SessionStore()
+        if email:
+            request.user = get_user_model().objects.get(email=email)
+        else:
+            request.user = AnonymousUser()
+        return request
+
+    def _medir(self, client, endpoint, iteraciones):
+        tiempos = []
+        for _ in range(iteraciones):
+            inicio = time.perf_counter()
+            client.get(endpoint)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        return tiempos
+
+    def _reportar(self, modo, endpoint, tiempos):
+        tiempos_ordenados = sorted(tiempos)
+        p95 = tiempos_ordenados[int(len(tiempos_ordenados) * 0.95) - 1]
+        self.stdout.write(
+            f"  {modo:<6} {endpoint:<40} "
+            f"media={statistics.mean(tiempos):8.2f}ms  "
+            f"p50={statistics.median(tiempos):8.2f}ms  "
+            f"p95={p95:8.2f}ms"
+        )
+
+    def handle(self, *args, **options):
+        iteraciones = options['iteraciones']
+        endpoints = options['endpoints'] or [
+            '/oraculo/sets/',
+            '/oraculo/sets-con-mazos/',
+            '/oraculo/mazos/',
+        ]
+        if options['email']:
+            endpoints += ['/billing/mi-wallet/', '/billing/estadisticas/']
+
+        request = self._build_request(options['email'])
+        transportes = [('local', LocalTransport())]
+        if not options['solo_local']:
+            transportes.append(('http', HTTPTransport(options['base_url'])))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"⏱️ Benchmark APIClient: {iteraciones} iteraciones por endpoint"
+        ))
+
+        for endpoint in endpoints:
+            for modo, transporte in transportes:
+                client = APIClient(request, transport=transporte)
+                # Calentamiento: primera llamada fuera de la medición
+                if client.get(endpoint) is None:
+                    self.stdout.write(self.style.WARNING(f"  {modo:<6} {endpoint:<40} sin respuesta válida"))
+                    continue
+                self._reportar(modo, endpoint, self._medir(client, endpoint, iteraciones))
+
+        if not options['solo_local']:
+            self.stdout.write("\n📡 Métricas del pool HTTP:")
+            for clave, valor in metrics.snapshot().items():
+                self.stdout.write(f"  {clave}: {valor}")
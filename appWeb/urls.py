@@ -43,4 +43,6 @@ urlpatterns = [
     # AJAX endpoints
     path('ajax/verificar-creditos/', views.verificar_creditos, name='verificar_creditos'),
     path('ajax/procesar-pago/', views.procesar_pago, name='procesar_pago'),
+    path('ajax/historial/', views.historial_pagina, name='historial_pagina'),
+    path('ajax/historial/<int:consulta_id>/', views.historial_consulta_detalle, name='historial_consulta_detalle'),
 ]
\ No newline at end of file
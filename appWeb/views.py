@@ -1,18 +1,26 @@
-import requests
 import json
+import logging
 from datetime import datetime
+from urllib.parse import parse_qs, urlsplit
 from django.utils.dateparse import parse_datetime
 from django.utils import timezone
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
+from django.template.loader import render_to_string
 from django.views.decorators.http import require_http_methods
 from django.conf import settings
 from django.urls import reverse
 from django.views.decorators.csrf import csrf_exempt
 from .forms import LoginForm, RegisterForm, ProfileForm, ConsultaTarotForm, ContactForm
+from .api_client import APIClient
+
+logger = logging.getLogger(__name__)
+
+# Consultas por página en el historial (la primera y cada carga del scroll infinito)
+HISTORIAL_POR_PAGINA = 10
 
 
 def render_password_reset_email(reset_url, user_email):
@@ -47,6 +55,14 @@ def render_password_reset_email(reset_url, user_email):
 
 
 
+def cursor_siguiente(pagina):
+    """Cursor de la página siguiente, tomado del link 'next' de la API (None en la última)"""
+    siguiente = pagina.get('next')
+    if not siguiente:
+        return None
+    return parse_qs(urlsplit(siguiente).query).get('cursor', [None])[0]
+
+
 def process_api_dates(data, date_fields=['created_at', 'updated_at', 'date_joined', 'last_login']):
     """
     Convierte campos de fecha de string a datetime objects en datos de API
@@ -81,55 +97,12 @@ def process_api_dates(data, date_fields=['created_at', 'updated_at', 'date_joine
     return data
 
 
-class APIClient:
-    """Cliente para consumir nuestra propia API"""
-
-    def __init__(self, request=None):
-        self.base_url = 'https://www.tarotnautica.store/api'
-        self.request = request
-
-    def _get_headers(self):
-        """Obtener headers para las requests, incluyendo token si está autenticado"""
-        headers = {'Content-Type': 'application/json'}
-        if self.request and self.request.user.is_authenticated:
-            try:
-                token = self.request.user.auth_token.key
-                headers['Authorization'] = f'Token {token}'
-            except:
-                pass
-        return headers
-
-    def get(self, endpoint, params=None):
-        """Hacer GET request a la API"""
-        try:
-            response = requests.get(
-                f"{self.base_url}{endpoint}",
-                headers=self._get_headers(),
-                params=params or {}
-            )
-            return response.json() if response.status_code == 200 else None
-        except:
-            return None
-
-    def post(self, endpoint, data=None):
-        """Hacer POST request a la API"""
-        try:
-            response = requests.post(
-                f"{self.base_url}{endpoint}",
-                headers=self._get_headers(),
-                data=json.dumps(data or {})
-            )
-            return response
-        except:
-            return None
-
-
 def home(request):
     """Página principal"""
     api = APIClient(request)
 
-    # Obtener algunos sets destacados para mostrar en home
-    sets_data = api.get('/oraculo/sets-con-mazos/')
+    # Obtener algunos sets destacados para mostrar en home (de los mazos solo se cuentan)
+    sets_data = api.get('/oraculo/sets-con-mazos/', {'fields': 'id,nombre,descripcion,mazos.id'})
 
     # Calcular total de mazos de todos los sets
     total_mazos = 0
@@ -389,11 +362,15 @@ def mazos_list(request):
 
     api = APIClient(request)
 
-    # Obtener todos los sets para el filtro
-    sets_data = api.get('/oraculo/sets/')
-
-    # Obtener mazos con información básica
-    mazos_data = api.get('/oraculo/mazos/')
+    # Sets (para el filtro), mazos y TODAS las cartas son independientes: pedirlas a la vez.
+    # De las cartas solo se usa la imagen de una al azar: sin significados
+    datos = api.gather({
+        'sets': '/oraculo/sets/',
+        'mazos': '/oraculo/mazos/',
+        'cartas': ('/oraculo/cartas/', {'fields': 'id,mazo,nombre,imagen'}),
+    })
+    sets_data = datos['sets']
+    mazos_data = datos['mazos']
 
     # Obtener filtros de la URL
     set_ids = request.GET.getlist('sets')  # Para filtros múltiples por checkbox
@@ -408,8 +385,8 @@ def mazos_list(request):
 
     # CORREGIDO: Obtener una carta aleatoria para cada mazo
     if mazos_data:
-        # Obtener TODAS las cartas de una vez para evitar múltiples llamadas
-        todas_las_cartas = api.get('/oraculo/cartas/')
+        # TODAS las cartas llegaron en una sola llamada para evitar múltiples requests
+        todas_las_cartas = datos['cartas']
 
         if todas_las_cartas:
             # Crear un diccionario que agrupe las cartas por mazo
@@ -483,6 +460,74 @@ def mazo_detail(request, mazo_id):
     return render(request, 'appWeb/mazos/detail.html', context)
 
 
+def _registrar_consulta(api, pregunta, costo, tirada_data, mazo_data, wallet_data, resultado):
+    """
+    Procesar el pago de la consulta y guardarla en el historial.
+    Devuelve los créditos que le quedan al usuario.
+    """
+    # Procesar el pago de la consulta con información completa de la tirada
+    billing_response = api.post('/billing/procesar-consulta-tarot/', {
+        'costo_creditos': costo,
+        'tirada_info': {
+            'id': tirada_data.get('id'),
+            'nombre': tirada_data.get('nombre'),
+            'descripcion': tirada_data.get('descripcion'),  # NUEVO
+            'mazo_nombre': mazo_data.get('nombre'),
+            'cantidad_cartas': tirada_data.get('cantidad_cartas'),  # NUEVO
+        },
+        'pregunta': pregunta,
+        'interpretacion': resultado.get('interpretacion_ia', ''),
+        'cartas_resultado': resultado.get('cartas', []),
+        'semilla_sorteo': resultado.get('semilla_sorteo')
+    })
+
+    # VERIFICAR QUE EL BILLING SEA EXITOSO PRIMERO
+    if billing_response and billing_response.status_code == 200:
+        # Billing exitoso = créditos fueron descontados
+        wallet_actualizada = api.get('/billing/mi-wallet/')
+        return wallet_actualizada.get('creditos_disponibles', 0) if wallet_actualizada else 0
+
+    # Billing falló = NO se descontaron créditos = cantidad original
+    return wallet_data.get('creditos_disponibles', 0)
+
+
+def _relay_consulta_stream(api, eventos, pregunta, costo, tirada_data, mazo_data, wallet_data):
+    """
+    Reenviar al navegador los eventos SSE de la API. Al terminar el stream se
+    cobra la consulta y se guarda la interpretación completa en el historial.
+
+    Si el navegador se desconecta a mitad del stream, la interpretación se
+    termina de leer igual y la consulta se registra: las cartas ya se
+    mostraron y la lectura se generó.
+    """
+    resultado = {}
+    registrada = False
+    try:
+        for evento, datos in eventos:
+            if evento == 'cartas':
+                resultado.update(datos)
+            elif evento == 'fin':
+                resultado['interpretacion_ia'] = datos.get('interpretacion_ia', '')
+                creditos_finales = _registrar_consulta(api, pregunta, costo, tirada_data, mazo_data, wallet_data, resultado)
+                registrada = True
+                datos = {
+                    'resultado': resultado,
+                    'creditos_restantes': creditos_finales
+                }
+            yield f"event: {evento}\ndata: {json.dumps(datos, ensure_ascii=False)}\n\n"
+    finally:
+        if not registrada and resultado:
+            try:
+                for evento, datos in eventos:
+                    if evento == 'fin':
+                        resultado['interpretacion_ia'] = datos.get('interpretacion_ia', '')
+                        _registrar_consulta(api, pregunta, costo, tirada_data, mazo_data, wallet_data, resultado)
+                        logger.info("Consulta registrada tras desconexión del cliente")
+                        break
+            except Exception as e:
+                logger.error(f"Error registrando consulta tras desconexión: {str(e)}")
+
+
 @login_required
 def consulta_mazo(request, mazo_id):
     """
@@ -490,16 +535,18 @@ def consulta_mazo(request, mazo_id):
     """
     api = APIClient(request)
 
-    # Obtener mazo con sus tiradas
-    mazo_data = api.get(f'/oraculo/mazos-con-tiradas/{mazo_id}/')
+    # Obtener mazo con sus tiradas e información de créditos del usuario
+    datos = api.gather({
+        'mazo': f'/oraculo/mazos-con-tiradas/{mazo_id}/',
+        'wallet': '/billing/mi-wallet/',
+    })
+    mazo_data = datos['mazo']
+    wallet_data = datos['wallet']
 
     if not mazo_data:
         messages.error(request, 'Mazo no encontrado.')
         return redirect('appWeb:mazos_list')
 
-    # Obtener información de créditos del usuario
-    wallet_data = api.get('/billing/mi-wallet/')
-
     # Si es POST, manejar la consulta AJAX
     if request.method == 'POST':
         tirada_id = request.POST.get('tirada_id')
@@ -530,39 +577,36 @@ def consulta_mazo(request, mazo_id):
                 'creditos_disponibles': wallet_data.get('creditos_disponibles', 0) if wallet_data else 0
             })
 
-        # Realizar consulta - AHORA incluye toda la información de la tirada
-        consulta_response = api.post('/oraculo/consulta-tarot/', {
+        datos_consulta = {
             'pregunta': pregunta,
             'set_id': mazo_data['set'],
             'mazo_id': mazo_id,
             'tirada_id': tirada_id
-        })
+        }
 
-        if consulta_response and consulta_response.status_code == 200:
-            resultado = consulta_response.json()
+        # Modo streaming: las cartas llegan de inmediato y la interpretación por partes (SSE)
+        if request.POST.get('stream') == '1':
+            eventos = api.stream('/oraculo/consulta-tarot-stream/', datos_consulta)
+            if eventos is None:
+                return JsonResponse({
+                    'success': False,
+                    'error': 'Error al procesar la consulta. Inténtalo de nuevo.'
+                })
 
-            # Procesar el pago de la consulta con información completa de la tirada
-            billing_response = api.post('/billing/procesar-consulta-tarot/', {
-                'costo_creditos': costo,
-                'tirada_info': {
-                    'nombre': tirada_data.get('nombre'),
-                    'descripcion': tirada_data.get('descripcion'),  # NUEVO
-                    'mazo_nombre': mazo_data.get('nombre'),
-                    'cantidad_cartas': tirada_data.get('cantidad_cartas'),  # NUEVO
-                },
-                'pregunta': pregunta,
-                'interpretacion': resultado.get('interpretacion_ia', ''),
-                'cartas_resultado': resultado.get('cartas', [])
-            })
+            response = StreamingHttpResponse(
+                _relay_consulta_stream(api, eventos, pregunta, costo, tirada_data, mazo_data, wallet_data),
+                content_type='text/event-stream'
+            )
+            response['Cache-Control'] = 'no-cache'
+            response['X-Accel-Buffering'] = 'no'
+            return response
 
-            # VERIFICAR QUE EL BILLING SEA EXITOSO PRIMERO
-            if billing_response and billing_response.status_code == 200:
-                # Billing exitoso = créditos fueron descontados
-                wallet_actualizada = api.get('/billing/mi-wallet/')
-                creditos_finales = wallet_actualizada.get('creditos_disponibles', 0) if wallet_actualizada else 0
-            else:
-                # Billing falló = NO se descontaron créditos = cantidad original
-                creditos_finales = wallet_data.get('creditos_disponibles', 0)
+        # Realizar consulta - AHORA incluye toda la información de la tirada
+        consulta_response = api.post('/oraculo/consulta-tarot/', datos_consulta)
+
+        if consulta_response and consulta_response.status_code == 200:
+            resultado = consulta_response.json()
+            creditos_finales = _registrar_consulta(api, pregunta, costo, tirada_data, mazo_data, wallet_data, resultado)
 
             return JsonResponse({
                 'success': True,
@@ -589,14 +633,18 @@ def consulta_mazo(request, mazo_id):
 def consulta_tarot(request, tirada_id):
     """Realizar consulta de tarot (requiere descontar créditos o usar suscripción)"""
     api = APIClient(request)
-    tirada_data = api.get(f'/oraculo/tiradas/{tirada_id}/')
+    datos = api.gather({
+        'tirada': f'/oraculo/tiradas/{tirada_id}/',
+        'wallet': '/billing/mi-wallet/',
+    })
+    tirada_data = datos['tirada']
 
     if not tirada_data:
         messages.error(request, 'Tirada no encontrada.')
         return redirect('appWeb:sets_list')
 
     # Verificar si tiene créditos suficientes
-    wallet_data = api.get('/billing/mi-wallet/')
+    wallet_data = datos['wallet']
     costo = tirada_data.get('costo', 1)
 
     form = ConsultaTarotForm()
@@ -621,6 +669,7 @@ def consulta_tarot(request, tirada_id):
                     billing_response = api.post('/billing/procesar-consulta-tarot/', {
                         'costo_creditos': costo,
                         'tirada_info': {
+                            'id': tirada_data.get('id'),
                             'nombre': tirada_data.get('nombre'),
                             'descripcion': tirada_data.get('descripcion'),
                             'mazo_nombre': tirada_data['mazo']['nombre'],
@@ -628,7 +677,8 @@ def consulta_tarot(request, tirada_id):
                         },
                         'pregunta': form.cleaned_data['pregunta'],
                         'interpretacion': resultado.get('interpretacion_ia', ''),
-                        'cartas_resultado': resultado.get('cartas', [])
+                        'cartas_resultado': resultado.get('cartas', []),
+                        'semilla_sorteo': resultado.get('semilla_sorteo')
                     })
 
                     if billing_response and billing_response.status_code == 200:
@@ -680,10 +730,15 @@ def perfil(request):
     """Perfil del usuario"""
     api = APIClient(request)
 
-    # Obtener datos del usuario
-    user_data = api.get('/users/profile/detail/')
-    wallet_data = api.get('/billing/mi-wallet/')
-    estadisticas = api.get('/billing/estadisticas/')
+    # Obtener datos del usuario (llamadas independientes, en paralelo)
+    datos = api.gather({
+        'user_data': '/users/profile/detail/',
+        'wallet': '/billing/mi-wallet/',
+        'estadisticas': '/billing/estadisticas/',
+    })
+    user_data = datos['user_data']
+    wallet_data = datos['wallet']
+    estadisticas = datos['estadisticas']
 
     # Procesar fechas en todos los datos
     user_data = process_api_dates(user_data)
@@ -738,17 +793,13 @@ def editar_perfil(request):
 
         # CORREGIDO: Usar el método correcto de APIClient
         try:
-            response = requests.put(
-                f"{api.base_url}/users/profile/update/",
-                headers=api._get_headers(),
-                data=json.dumps(data)
-            )
+            response = api.put('/users/profile/update/', data)
 
-            if response.status_code == 200:
+            if response and response.status_code == 200:
                 messages.success(request, 'Perfil actualizado exitosamente.')
                 return redirect('appWeb:perfil')
             else:
-                messages.error(request, f'Error al actualizar el perfil. Código: {response.status_code}')
+                messages.error(request, f'Error al actualizar el perfil. Código: {response.status_code if response else "sin respuesta"}')
         except Exception as e:
             messages.error(request, f'Error de conexión: {str(e)}')
 
@@ -822,8 +873,12 @@ def comprar_creditos(request):
 
     # Obtener paquetes con botones de pago
     pais_usuario = 'CL'  # Por defecto, luego puedes detectarlo con GeoIP
-    paquetes_data = api.get('/billing/paquetes-con-botones/', {'pais': pais_usuario})
-    wallet_data = api.get('/billing/mi-wallet/')
+    datos = api.gather({
+        'paquetes': ('/billing/paquetes-con-botones/', {'pais': pais_usuario}),
+        'wallet': '/billing/mi-wallet/',
+    })
+    paquetes_data = datos['paquetes']
+    wallet_data = datos['wallet']
 
     context = {
         'paquetes': paquetes_data or [],
@@ -837,21 +892,84 @@ def comprar_creditos(request):
 
 @login_required
 def historial_consultas(request):
-    """Historial de consultas del usuario"""
+    """Historial de consultas del usuario (primera página; el resto llega con scroll infinito)"""
     api = APIClient(request)
-    consultas_data = api.get('/billing/mi-historial-consultas/')
+    datos = api.gather({
+        'pagina': ('/billing/mi-historial-consultas/', {'vista': 'resumen', 'limite': HISTORIAL_POR_PAGINA}),
+        'estadisticas': '/billing/estadisticas/',
+    })
+    pagina = datos['pagina'] or {}
+    estadisticas = datos['estadisticas'] or {}
 
     # Procesar fechas en los datos de la API
-    consultas_procesadas = process_api_dates(consultas_data)
+    consultas_procesadas = process_api_dates(pagina.get('results', []))
+
+    # El listado viene sin cartas: pedir solo las cartas de la última consulta
+    # (sin cargar ni descomprimir su interpretación)
+    ultima_consulta = None
+    if consultas_procesadas:
+        ultima_consulta = api.get(
+            f"/billing/mi-historial-consultas/{consultas_procesadas[0]['id']}/", {'fields': 'cartas_resultado'}
+        )
 
     context = {
-        'consultas': consultas_procesadas or [],
+        'consultas': consultas_procesadas,
+        'cursor': cursor_siguiente(pagina),
+        'total_consultas': estadisticas.get('total_consultas', len(consultas_procesadas)),
+        'cartas_ultima_consulta': len(ultima_consulta['cartas_resultado']) if ultima_consulta else 0,
         'page_title': 'Tu Viaje Místico'
     }
 
     return render(request, 'appWeb/perfil/historial.html', context)
 
 
+@login_required
+@require_http_methods(["GET"])
+def historial_pagina(request):
+    """Página siguiente del historial para el scroll infinito (tarjetas ya renderizadas)"""
+    api = APIClient(request)
+    parametros = {'vista': 'resumen', 'limite': HISTORIAL_POR_PAGINA}
+    if request.GET.get('cursor'):
+        parametros['cursor'] = request.GET['cursor']
+    pagina = api.get('/billing/mi-historial-consultas/', parametros)
+
+    if pagina is None:
+        return JsonResponse({
+            'success': False,
+            'error': 'No se pudo cargar el historial'
+        }, status=502)
+
+    html = ''.join(
+        render_to_string('appWeb/perfil/_consulta_historial.html', {'consulta': consulta}, request=request)
+        for consulta in process_api_dates(pagina['results'])
+    )
+    return JsonResponse({
+        'success': True,
+        'html': html,
+        'cursor': cursor_siguiente(pagina)
+    })
+
+
+@login_required
+@require_http_methods(["GET"])
+def historial_consulta_detalle(request, consulta_id):
+    """Cartas e interpretación completa de una consulta, pedidas al expandirla"""
+    api = APIClient(request)
+    consulta = api.get(f'/billing/mi-historial-consultas/{consulta_id}/')
+
+    if consulta is None:
+        return JsonResponse({
+            'success': False,
+            'error': 'Consulta no encontrada'
+        }, status=404)
+
+    html = render_to_string('appWeb/perfil/_consulta_historial_detalle.html', {'consulta': consulta}, request=request)
+    return JsonResponse({
+        'success': True,
+        'html': html
+    })
+
+
 def motor_nautica(request):
     """Página explicativa del Motor Náutica"""
     context = {
@@ -907,7 +1025,8 @@ def _procesar_retorno_paypal(request):
 
     try:
         # Importar modelos necesarios
-        from billing.models import PagoCreditos, Wallet, TransaccionCreditos
+        from billing.models import PagoCreditos
+        from billing.movimientos import registrar_movimiento, clave_pago
         from django.db import transaction
         from django.utils import timezone
 
@@ -932,17 +1051,14 @@ def _procesar_retorno_paypal(request):
             })
             pago.save()
 
-            # Agregar créditos al usuario
-            wallet, created = Wallet.objects.get_or_create(user=pago.user)
-            wallet.agregar_creditos(pago.paquete_creditos.cantidad_creditos)
-
-            # Crear registro de transacción
-            TransaccionCreditos.objects.create(
-                user=pago.user,
-                tipo='compra',
-                cantidad=pago.paquete_creditos.cantidad_creditos,
-                descripcion=f'Compra PayPal - {pago.paquete_creditos.nombre}',
-                paquete_creditos=pago.paquete_creditos
+            # Agregar créditos al usuario y registrar la transacción
+            registrar_movimiento(
+                pago.user,
+                'compra',
+                pago.paquete_creditos.cantidad_creditos,
+                f'Compra PayPal - {pago.paquete_creditos.nombre}',
+                paquete_creditos=pago.paquete_creditos,
+                clave_idempotencia=clave_pago(pago)
             )
 
             logger.info(f"Pago completado: {custom_id} | Usuario: {pago.user.email}")
@@ -67,7 +67,8 @@ class WalletAdmin(admin.ModelAdmin):
     list_display = ['user', 'creditos_disponibles', 'created_at', 'updated_at']
     list_filter = ['created_at', 'updated_at']
     search_fields = ['user__email', 'user__nombre']
-    readonly_fields = ['created_at', 'updated_at']
+    # Los saldos solo cambian con movimientos del libro (billing.movimientos)
+    readonly_fields = ['creditos_disponibles', 'creditos_gastados_total', 'created_at', 'updated_at']
 
 
 @admin.register(Suscripcion)
@@ -81,12 +82,29 @@ class SuscripcionAdmin(admin.ModelAdmin):
 
 @admin.register(TransaccionCreditos)
 class TransaccionCreditosAdmin(admin.ModelAdmin):
-    list_display = ['user', 'tipo', 'cantidad', 'paquete_creditos', 'created_at']
+    list_display = ['user', 'tipo', 'variacion', 'saldo_resultante', 'paquete_creditos', 'created_at']
     list_filter = ['tipo', 'created_at']
-    search_fields = ['user__email', 'user__nombre', 'descripcion']
+    search_fields = ['user__email', 'user__nombre', 'descripcion', 'clave_idempotencia']
     readonly_fields = ['created_at']
     date_hierarchy = 'created_at'
 
+    # El libro solo crece a través de billing.movimientos.registrar_movimiento
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        # Sin borrado desde las vistas de este admin; las filas sí se borran en
+        # cascada al eliminar al usuario (el admin revisa este permiso para
+        # cada objeto relacionado)
+        match = getattr(request, 'resolver_match', None)
+        prefijo = f'{self.opts.app_label}_{self.opts.model_name}_'
+        if match is not None and (match.url_name or '').startswith(prefijo):
+            return False
+        return super().has_delete_permission(request, obj)
+
 
 @admin.register(HistorialConsultas)
 class HistorialConsultasAdmin(admin.ModelAdmin):
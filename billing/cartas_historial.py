@@ -0,0 +1,148 @@
+"""
+Formato compacto de HistorialConsultas.cartas_resultado.
+
+La consulta entrega cada carta con su CartaSerializer completo (significados,
+imagen, mazo), pero todo eso ya está en el catálogo. En el historial se
+guarda solo lo que identifica la lectura:
+
+    {"v": 1, "tirada": 7, "hash": "1f0c...", "semilla": 8123..., "cartas": [[12, 0, "Pasado"], [40, 1, "Presente"]]}
+
+cada carta como [carta_id, invertida, nombre de la posición], en el orden
+de los items de la tirada. Al leer, expandir_cartas arma de nuevo el formato
+completo desde el snapshot del catálogo (sin queries). `hash` resume el
+contenido expandido al momento de guardar: si no coincide al leer, el
+catálogo cambió desde la consulta (ver el comando reporte_historial).
+`semilla` es la del sorteo (oraculoApi/sorteo.py), para auditar la consulta;
+la envía el cliente, así que solo se guarda si sorteo.reproducir() vuelve a
+dar exactamente esas cartas y orientaciones. Falta en las filas anteriores
+al motor de sorteo.
+
+Las filas en formato completo (lista) se siguen leyendo tal cual; se
+convierten con la migración 0009 o con reporte_historial --compactar.
+"""
+import hashlib
+import json
+
+from oraculoApi import sorteo
+from oraculoApi.catalogo import obtener_catalogo
+
+FORMATO_COMPACTO = 1
+
+
+def es_compacto(valor):
+    return isinstance(valor, dict) and valor.get('v') == FORMATO_COMPACTO
+
+
+def _hash(cartas):
+    contenido = json.dumps(cartas, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(contenido.encode()).hexdigest()[:16]
+
+
+def _buscar_tirada(catalogo, tirada_nombre, mazo_nombre, posiciones):
+    """
+    Id de la tirada con ese nombre, mazo y posiciones; None si no hay una sola
+    """
+    candidatas = [
+        tirada.id for tirada in catalogo.tiradas.values()
+        if tirada.nombre == tirada_nombre and tirada.mazo.nombre == mazo_nombre
+        and [item.nombre_posicion for item in catalogo.items_por_tirada.get(tirada.id, ())] == posiciones
+    ]
+    return candidatas[0] if len(candidatas) == 1 else None
+
+
+def _semilla_reproduce(catalogo, tirada_id, semilla, entradas):
+    """
+    True si el sorteo con `semilla` da las cartas y orientaciones de `entradas`
+    """
+    if isinstance(semilla, bool) or not isinstance(semilla, int) or not 0 <= semilla < 2 ** sorteo.BITS_SEMILLA:
+        return False
+    tirada = catalogo.tiradas[tirada_id]
+    try:
+        resultado = sorteo.reproducir(semilla, catalogo.mazos[tirada.mazo_id], tirada)
+    except ValueError:
+        return False
+    return list(zip(resultado.cartas, resultado.invertidas)) == [
+        (carta_id, invertida) for carta_id, invertida, _ in entradas
+    ]
+
+
+def compactar_cartas(cartas_resultado, tirada_id=None, tirada_nombre='', mazo_nombre='', semilla=None):
+    """
+    Formato compacto de cartas_resultado. Si la tirada no se indica se busca
+    por nombre; si alguna carta o posición no calza con el catálogo, o su
+    contenido cambió desde la consulta, se retorna cartas_resultado sin cambios.
+    La semilla se descarta si no reproduce las cartas.
+    """
+    if not isinstance(cartas_resultado, list) or not cartas_resultado:
+        return cartas_resultado
+    catalogo = obtener_catalogo()
+
+    try:
+        entradas = [
+            (entrada['carta']['id'], bool(entrada['es_invertida']), entrada['posicion'])
+            for entrada in cartas_resultado
+        ]
+    except (KeyError, TypeError):
+        return cartas_resultado
+
+    if tirada_id is None:
+        tirada_id = _buscar_tirada(catalogo, tirada_nombre, mazo_nombre, [posicion for _, _, posicion in entradas])
+    items = catalogo.items_por_tirada.get(tirada_id)
+    if not items or len(items) != len(entradas):
+        return cartas_resultado
+    for (carta_id, _, posicion), item in zip(entradas, items):
+        if carta_id not in catalogo.cartas_serializadas or posicion != item.nombre_posicion:
+            return cartas_resultado
+
+    valor = {
+        'v': FORMATO_COMPACTO,
+        'tirada': tirada_id,
+        'cartas': [[carta_id, int(invertida), posicion] for carta_id, invertida, posicion in entradas],
+    }
+    expandidas = _expandir(valor, catalogo)
+    if expandidas != cartas_resultado:
+        # Las cartas o posiciones guardadas ya no son las del catálogo: al
+        # expandir se mostraría el texto actual en vez del de la consulta
+        return cartas_resultado
+    valor['hash'] = _hash(expandidas)
+    if semilla is not None and _semilla_reproduce(catalogo, tirada_id, semilla, entradas):
+        valor['semilla'] = semilla
+    return valor
+
+
+def _expandir(valor, catalogo):
+    items = catalogo.items_por_tirada.get(valor['tirada'], ())
+    cartas = []
+    for i, (carta_id, invertida, posicion) in enumerate(valor['cartas']):
+        carta = catalogo.carta_serializada(carta_id)
+        item = items[i] if i < len(items) and items[i].nombre_posicion == posicion else None
+        if carta is None:
+            # La carta ya no existe en el catálogo
+            carta, significado = {'id': carta_id}, ''
+        else:
+            significado = carta['significado_invertida'] if invertida else carta['significado_normal']
+        cartas.append({
+            'carta': carta,
+            'posicion': posicion,
+            'descripcion_posicion': item.descripcion if item else '',
+            'es_invertida': bool(invertida),
+            'significado_usado': significado,
+        })
+    return cartas
+
+
+def expandir_cartas(valor):
+    """
+    cartas_resultado en el formato completo, sea cual sea el formato guardado
+    """
+    if es_compacto(valor):
+        return _expandir(valor, obtener_catalogo())
+    return valor
+
+
+def catalogo_modificado(valor):
+    """
+    True si las cartas o posiciones de una fila compacta cambiaron en el
+    catálogo desde que se guardó
+    """
+    return es_compacto(valor) and 'hash' in valor and _hash(expandir_cartas(valor)) != valor['hash']
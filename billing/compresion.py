@@ -0,0 +1,206 @@
+"""
+Texto comprimido con zlib y un diccionario entrenado con las interpretaciones.
+
+Las interpretaciones repiten mucho vocabulario y estructura (títulos en
+markdown, nombres de posiciones, fórmulas de cierre), así que un diccionario
+precargado (zdict) con las frases más frecuentes del corpus comprime bastante
+mejor que zlib solo, sobre todo en textos de pocos KB.
+
+Formato guardado:
+- MAGIA + id del diccionario (2 bytes, 0 = sin diccionario) + deflate crudo
+- o el texto en UTF-8 tal cual: filas anteriores a la compresión y textos
+  que no se achican al comprimir. Un texto nunca empieza con un byte nulo.
+
+Los diccionarios (DiccionarioCompresion) no se modifican una vez creados:
+cada fila indica con cuál se comprimió, y el comando recomprimir_historial
+entrena uno nuevo y recomprime las filas existentes.
+
+TextoComprimidoField guarda en la instancia los bytes tal como vienen de la
+base de datos y descomprime recién al leer el atributo, así un listado que
+no usa el texto no paga la descompresión.
+"""
+import struct
+import threading
+import zlib
+from collections import Counter
+
+from django import forms
+from django.apps import apps
+from django.db import models
+from django.db.models.query_utils import DeferredAttribute
+
+from core.versiones import VersionCompartida
+
+MAGIA = b'\x00z'
+NIVEL = 9
+# zlib solo mira los últimos 32 KB: un diccionario más grande no sirve
+TAMANO_DICCIONARIO = 32 * 1024
+DICCIONARIO_ACTIVO_KEY = 'billing:compresion:diccionario_activo'
+
+_diccionarios = {}
+_diccionarios_lock = threading.Lock()
+
+
+def _modelo_diccionario():
+    return apps.get_model('billing', 'DiccionarioCompresion')
+
+
+def _ultimo_diccionario():
+    return _modelo_diccionario().objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+
+
+# Compartido por todos los procesos (core/versiones.py); sin valor guardado
+# se usa el último diccionario entrenado
+_diccionario_activo = VersionCompartida(DICCIONARIO_ACTIVO_KEY, inicial=_ultimo_diccionario)
+
+
+def diccionario(diccionario_id):
+    """
+    Bytes del diccionario; se cargan una vez por proceso
+    """
+    if diccionario_id == 0:
+        return None
+    datos = _diccionarios.get(diccionario_id)
+    if datos is None:
+        datos = bytes(_modelo_diccionario().objects.values_list('datos', flat=True).get(pk=diccionario_id))
+        with _diccionarios_lock:
+            _diccionarios[diccionario_id] = datos
+    return datos
+
+
+def diccionario_activo():
+    """
+    Id del diccionario con el que se comprimen los textos nuevos (0 si no hay)
+    """
+    return _diccionario_activo.obtener()
+
+
+def activar_diccionario(diccionario_id):
+    _diccionario_activo.cambiar(diccionario_id)
+
+
+def entrenar_diccionario(textos, tamano=TAMANO_DICCIONARIO):
+    """
+    Diccionario con las frases (2 a 6 palabras) que más bytes ahorran en el
+    corpus: las que aparecen en más textos, ponderadas por su largo. Las más
+    valiosas quedan al final, donde zlib las alcanza con distancias cortas.
+    """
+    frecuencias = Counter()
+    for texto in textos:
+        palabras = texto.split(' ')
+        frases = set()
+        for n in range(2, 7):
+            for i in range(len(palabras) - n + 1):
+                frases.add(' '.join(palabras[i:i + n]))
+        frecuencias.update(frases)
+
+    candidatas = sorted(
+        ((apariciones - 1) * len(frase.encode()), frase)
+        for frase, apariciones in frecuencias.items() if apariciones > 1
+    )
+    elegidas = []
+    ocupado = 0
+    for _, frase in reversed(candidatas):
+        if ocupado >= tamano:
+            break
+        if any(frase in elegida for elegida in elegidas):
+            continue
+        elegidas.append(frase)
+        ocupado += len(frase.encode()) + 1
+    return ' '.join(reversed(elegidas)).encode()[-tamano:]
+
+
+def diccionario_de(valor):
+    """
+    Id del diccionario de un valor guardado; None si está sin comprimir
+    """
+    valor = bytes(valor) if isinstance(valor, memoryview) else valor
+    if isinstance(valor, bytes) and valor.startswith(MAGIA):
+        return struct.unpack('>H', valor[len(MAGIA):len(MAGIA) + 2])[0]
+    return None
+
+
+def comprimir(texto, diccionario_id=None):
+    """
+    Bytes a guardar para `texto`, con el diccionario activo salvo que se indique otro
+    """
+    datos = texto.encode()
+    if diccionario_id is None:
+        diccionario_id = diccionario_activo()
+    zdict = diccionario(diccionario_id)
+    compresor = zlib.compressobj(NIVEL, zlib.DEFLATED, -15, zdict=zdict) if zdict else \
+        zlib.compressobj(NIVEL, zlib.DEFLATED, -15)
+    comprimido = MAGIA + struct.pack('>H', diccionario_id) + compresor.compress(datos) + compresor.flush()
+    return comprimido if len(comprimido) < len(datos) else datos
+
+
+def descomprimir(valor):
+    """
+    Texto a partir de lo guardado (comprimido, UTF-8 o ya texto)
+    """
+    if valor is None or isinstance(valor, str):
+        return valor
+    valor = bytes(valor)
+    diccionario_id = diccionario_de(valor)
+    if diccionario_id is None:
+        return valor.decode()
+    zdict = diccionario(diccionario_id)
+    descompresor = zlib.decompressobj(-15, zdict=zdict) if zdict else zlib.decompressobj(-15)
+    inicio = len(MAGIA) + 2
+    return (descompresor.decompress(valor[inicio:]) + descompresor.flush()).decode()
+
+
+class _TextoComprimidoDescriptor(DeferredAttribute):
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+        valor = super().__get__(instance, cls)
+        if isinstance(valor, (bytes, memoryview)):
+            valor = descomprimir(valor)
+            instance.__dict__[self.field.attname] = valor
+        return valor
+
+    def __set__(self, instance, value):
+        instance.__dict__[self.field.attname] = value
+
+
+class TextoComprimidoField(models.BinaryField):
+    """
+    Texto que se guarda comprimido (ver el docstring del módulo). En Python
+    se lee y se asigna como str.
+    """
+    descriptor_class = _TextoComprimidoDescriptor
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('editable', True)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if kwargs.get('editable'):
+            del kwargs['editable']
+        else:
+            kwargs['editable'] = False
+        return name, path, args, kwargs
+
+    def pre_save(self, model_instance, add):
+        # Los bytes cargados de la base se guardan tal cual, sin descomprimir
+        if self.attname in model_instance.__dict__:
+            return model_instance.__dict__[self.attname]
+        return super().pre_save(model_instance, add)
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if isinstance(value, str):
+            value = comprimir(value)
+        return super().get_db_prep_value(value, connection, prepared)
+
+    def to_python(self, value):
+        if isinstance(value, str):
+            return value
+        return descomprimir(value)
+
+    def value_to_string(self, obj):
+        return self.value_from_object(obj)
+
+    def formfield(self, **kwargs):
+        return super().formfield(**{'form_class': forms.CharField, 'widget': forms.Textarea, **kwargs})
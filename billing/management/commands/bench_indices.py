@@ -0,0 +1,228 @@
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from billing.models import (
+    PaqueteCreditos, Suscripcion, TipoSuscripcion, TransaccionCreditos, HistorialConsultas, PagoCreditos
+)
+
+DOMINIO_BENCH = 'bench-indices.invalid'
+MODELOS_INDEXADOS = [TransaccionCreditos, HistorialConsultas, PagoCreditos, Suscripcion]
+
+
+class Command(BaseCommand):
+    help = ('Siembra datos de prueba en las tablas de billing por usuario y compara planes de ejecución '
+            'y latencias de las queries más usadas sin y con los índices compuestos. '
+            'Corre sobre una base de datos de prueba desechable (la misma que crea el test runner, '
+            'test_<NAME>), nunca sobre la base configurada.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--filas',
+            type=int,
+            default=1_000_000,
+            help='Filas de TransaccionCreditos y de HistorialConsultas (default: 1000000)'
+        )
+        parser.add_argument(
+            '--usuarios',
+            type=int,
+            default=2000,
+            help='Usuarios entre los que se reparten las filas (default: 2000)'
+        )
+        parser.add_argument(
+            '--repeticiones',
+            type=int,
+            default=200,
+            help='Ejecuciones de cada query, con usuarios al azar (default: 200)'
+        )
+        parser.add_argument(
+            '--planes',
+            action='store_true',
+            help='Mostrar el plan de ejecución (EXPLAIN) de cada query'
+        )
+
+    # ------------------------------------------------------------------
+    # Datos
+    # ------------------------------------------------------------------
+
+    def _en_lotes(self, modelo, filas, total):
+        lote = []
+        for fila in filas:
+            lote.append(fila)
+            if len(lote) >= 5000:
+                modelo.objects.bulk_create(lote)
+                lote = []
+        if lote:
+            modelo.objects.bulk_create(lote)
+        self.stdout.write(f"  {modelo.__name__}: {total} filas")
+
+    def _sembrar(self, num_usuarios, num_filas):
+        User = get_user_model()
+        # bulk_create no dispara las señales: sin billeteras ni créditos de bienvenida
+        User.objects.bulk_create(
+            User(email=f'u{i}@{DOMINIO_BENCH}', nombre=f'Bench {i}', password='!')
+            for i in range(num_usuarios)
+        )
+        user_ids = list(User.objects.filter(email__endswith=DOMINIO_BENCH).values_list('id', flat=True))
+
+        paquete = PaqueteCreditos.objects.create(
+            nombre='Bench índices', descripcion='Paquete temporal', cantidad_creditos=10,
+            precio=1, activo=False
+        )
+        tipo = TipoSuscripcion.objects.create(
+            nombre='Bench índices', descripcion='Tipo temporal', precio_mensual=0, activo=False
+        )
+        azar = random.Random(0)
+        ahora = timezone.now()
+
+        self._en_lotes(TransaccionCreditos, (
+            TransaccionCreditos(
+                user_id=azar.choice(user_ids), tipo=tipo_tx, cantidad=1,
+                variacion=-1 if tipo_tx == 'uso' else 1, descripcion='bench'
+            )
+            for tipo_tx in (azar.choice(('uso', 'uso', 'uso', 'compra', 'regalo')) for _ in range(num_filas))
+        ), num_filas)
+        self._en_lotes(HistorialConsultas, (
+            HistorialConsultas(
+                user_id=azar.choice(user_ids), pregunta='bench', tirada_nombre='bench',
+                mazo_nombre='bench', interpretacion='bench', cartas_resultado=[]
+            )
+            for _ in range(num_filas)
+        ), num_filas)
+        num_pagos = max(1, num_filas // 10)
+        self._en_lotes(PagoCreditos, (
+            PagoCreditos(
+                user_id=azar.choice(user_ids), paquete_creditos=paquete, monto=1,
+                estado=azar.choice(('completado', 'completado', 'pendiente', 'fallido')),
+                referencia_externa=f'BENCH-{i}'
+            )
+            for i in range(num_pagos)
+        ), num_pagos)
+        num_suscripciones = num_usuarios * 5
+        self._en_lotes(Suscripcion, (
+            Suscripcion(
+                user_id=user_ids[i % num_usuarios], tipo_suscripcion=tipo,
+                # Una activa por usuario, el resto históricas
+                estado='activa' if i < num_usuarios else azar.choice(('expirada', 'cancelada')),
+                fecha_inicio=ahora - timedelta(days=30 * (i // num_usuarios)),
+                fecha_fin=ahora + timedelta(days=30 - 30 * (i // num_usuarios))
+            )
+            for i in range(num_suscripciones)
+        ), num_suscripciones)
+
+        return user_ids, num_pagos
+
+    def _crear_base_prueba(self):
+        """
+        Crear y migrar la base desechable; retorna (nombre original, archivo temporal o None)
+        """
+        archivo = None
+        prueba = connection.settings_dict.setdefault('TEST', {})
+        if connection.vendor == 'sqlite' and not prueba.get('NAME'):
+            # La base de prueba de SQLite es en memoria por defecto: usar un archivo
+            # para que la medición incluya lecturas de disco como en la base real
+            descriptor, archivo = tempfile.mkstemp(prefix='bench_indices_', suffix='.sqlite3')
+            os.close(descriptor)
+            prueba['NAME'] = archivo
+        nombre_original = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        return nombre_original, archivo
+
+    def _destruir_base_prueba(self, nombre_original, archivo):
+        connection.creation.destroy_test_db(nombre_original, verbosity=0)
+        if archivo:
+            connection.settings_dict['TEST']['NAME'] = None
+            if os.path.exists(archivo):
+                os.remove(archivo)
+
+    # ------------------------------------------------------------------
+    # Medición
+    # ------------------------------------------------------------------
+
+    def _queries(self, user_ids, num_pagos, azar):
+        return [
+            ('transacciones del usuario', lambda: list(
+                TransaccionCreditos.objects.filter(user_id=azar.choice(user_ids))[:20])),
+            ('usos del usuario', lambda: TransaccionCreditos.objects.filter(
+                user_id=azar.choice(user_ids), tipo='uso').count()),
+            ('historial del usuario', lambda: list(
+                HistorialConsultas.objects.filter(user_id=azar.choice(user_ids))[:20])),
+            ('suscripción activa', lambda: Suscripcion.objects.filter(
+                user_id=azar.choice(user_ids), estado='activa').first()),
+            ('pagos completados', lambda: PagoCreditos.objects.filter(
+                user_id=azar.choice(user_ids), estado='completado').count()),
+            ('pago por referencia', lambda: PagoCreditos.objects.filter(
+                referencia_externa=f'BENCH-{azar.randrange(num_pagos)}').first()),
+        ]
+
+    def _planes(self, user_id):
+        return {
+            'transacciones del usuario': TransaccionCreditos.objects.filter(user_id=user_id)[:20],
+            # count() descarta el ordering del modelo
+            'usos del usuario': TransaccionCreditos.objects.filter(user_id=user_id, tipo='uso').order_by(),
+            'historial del usuario': HistorialConsultas.objects.filter(user_id=user_id)[:20],
+            'suscripción activa': Suscripcion.objects.filter(user_id=user_id, estado='activa')[:1],
+            'pagos completados': PagoCreditos.objects.filter(user_id=user_id, estado='completado').order_by(),
+            'pago por referencia': PagoCreditos.objects.filter(referencia_externa='BENCH-0')[:1],
+        }
+
+    def _medir(self, user_ids, num_pagos, repeticiones):
+        azar = random.Random(1)
+        resultados = {}
+        for nombre, query in self._queries(user_ids, num_pagos, azar):
+            query()  # calentar cache de páginas
+            tiempos = []
+            for _ in range(repeticiones):
+                inicio = time.perf_counter()
+                query()
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+            resultados[nombre] = statistics.median(tiempos)
+        return resultados
+
+    def _cambiar_indices(self, agregar):
+        with connection.schema_editor() as editor:
+            for modelo in MODELOS_INDEXADOS:
+                for indice in modelo._meta.indexes:
+                    if agregar:
+                        editor.add_index(modelo, indice)
+                    else:
+                        editor.remove_index(modelo, indice)
+
+    def handle(self, *args, **options):
+        nombre_original, archivo = self._crear_base_prueba()
+        try:
+            self.stdout.write(self.style.SUCCESS(
+                f"🌱 Sembrando {options['filas']} filas para {options['usuarios']} usuarios "
+                f"en la base de prueba {connection.settings_dict['NAME']} ({connection.vendor})"
+            ))
+            inicio = time.perf_counter()
+            user_ids, num_pagos = self._sembrar(options['usuarios'], options['filas'])
+            self.stdout.write(f"  sembrado en {time.perf_counter() - inicio:.1f}s")
+
+            self._cambiar_indices(agregar=False)
+            planes_antes = {nombre: qs.explain() for nombre, qs in self._planes(user_ids[0]).items()}
+            antes = self._medir(user_ids, num_pagos, options['repeticiones'])
+
+            self._cambiar_indices(agregar=True)
+            planes_despues = {nombre: qs.explain() for nombre, qs in self._planes(user_ids[0]).items()}
+            despues = self._medir(user_ids, num_pagos, options['repeticiones'])
+        finally:
+            self._destruir_base_prueba(nombre_original, archivo)
+
+        self.stdout.write(self.style.SUCCESS(f"\n⏱️ Mediana de {options['repeticiones']} ejecuciones"))
+        for nombre in antes:
+            self.stdout.write(
+                f"  {nombre:<26} sin índices={antes[nombre]:8.3f}ms  con índices={despues[nombre]:8.3f}ms  "
+                f"({antes[nombre] / despues[nombre]:5.1f}x)"
+            )
+            if options['planes']:
+                self.stdout.write(f"      antes:   {planes_antes[nombre]}".replace('\n', '\n               '))
+                self.stdout.write(f"      después: {planes_despues[nombre]}".replace('\n', '\n               '))
@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from billing.models import Wallet
+from billing.movimientos import conciliar_billetera, totales_libro
+
+
+class Command(BaseCommand):
+    help = ('Concilia las billeteras con el libro de créditos: saldo y créditos gastados de cada '
+            'Wallet deben coincidir con la suma de sus transacciones')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--corregir',
+            action='store_true',
+            help=('Registrar en el libro un ajuste por la diferencia de saldo de cada billetera '
+                  'descuadrada y recalcular sus créditos gastados desde el libro')
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=2000,
+            help='Billeteras por lote (default: 2000)'
+        )
+
+    def handle(self, *args, **options):
+        lote = options['lote']
+        revisadas = 0
+        descuadradas = []
+
+        wallets = Wallet.objects.order_by('pk').values_list('pk', 'user_id', 'creditos_disponibles', 'creditos_gastados_total')
+        ultimo_pk = 0
+        while True:
+            filas = list(wallets.filter(pk__gt=ultimo_pk)[:lote])
+            if not filas:
+                break
+            ultimo_pk = filas[-1][0]
+            libro = totales_libro([user_id for _, user_id, _, _ in filas])
+
+            for pk, user_id, saldo, gastados in filas:
+                saldo_libro, gastados_libro = libro.get(user_id, (0, 0))
+                if (saldo, gastados) != (saldo_libro, gastados_libro):
+                    descuadradas.append((pk, user_id, saldo, saldo_libro, gastados, gastados_libro))
+            revisadas += len(filas)
+
+        self.stdout.write(f"🔎 {revisadas} billeteras revisadas")
+        if not descuadradas:
+            self.stdout.write(self.style.SUCCESS("✅ Todas las billeteras cuadran con el libro"))
+            return
+
+        for pk, user_id, saldo, saldo_libro, gastados, gastados_libro in descuadradas:
+            self.stdout.write(self.style.ERROR(
+                f"  ❌ wallet {pk} (user {user_id}): saldo {saldo} vs libro {saldo_libro}, "
+                f"gastados {gastados} vs libro {gastados_libro}"
+            ))
+
+        if options['corregir']:
+            ajustes = sum(1 for _, user_id, _, _, _, _ in descuadradas if conciliar_billetera(user_id))
+            self.stdout.write(self.style.WARNING(
+                f"🔧 {len(descuadradas)} billeteras conciliadas, {ajustes} ajustes registrados en el libro"
+            ))
+            return
+
+        raise CommandError(f'{len(descuadradas)} billeteras no cuadran con el libro')
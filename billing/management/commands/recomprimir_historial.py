@@ -0,0 +1,123 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from billing.compresion import (
+    activar_diccionario, comprimir, descomprimir, diccionario_activo, diccionario_de, entrenar_diccionario
+)
+from billing.models import DiccionarioCompresion, HistorialConsultas
+
+
+class Command(BaseCommand):
+    help = ('Comprime las interpretaciones del historial con el diccionario activo, por lotes, y reporta '
+            'el espacio ahorrado y el costo de leerlas. Con --entrenar crea antes un diccionario nuevo.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--entrenar',
+            action='store_true',
+            help='Entrenar un diccionario con las interpretaciones más recientes y activarlo'
+        )
+        parser.add_argument(
+            '--muestras',
+            type=int,
+            default=2000,
+            help='Interpretaciones para entrenar el diccionario (default: 2000)'
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=500,
+            help='Filas por lote (default: 500)'
+        )
+        parser.add_argument(
+            '--simular',
+            action='store_true',
+            help='Calcular el ahorro sin escribir en la base de datos'
+        )
+
+    def _entrenar(self, muestras):
+        textos = [
+            descomprimir(valor) for valor in
+            HistorialConsultas.objects.order_by('-pk').values_list('interpretacion', flat=True)[:muestras]
+        ]
+        if not textos:
+            raise CommandError('No hay interpretaciones para entrenar el diccionario')
+        inicio = time.perf_counter()
+        datos = entrenar_diccionario(textos)
+        nuevo = DiccionarioCompresion.objects.create(datos=datos, muestras=len(textos))
+        self.stdout.write(
+            f"📚 Diccionario {nuevo.pk}: {len(datos):,}B entrenado con {len(textos)} textos "
+            f"en {time.perf_counter() - inicio:.1f}s"
+        )
+        return nuevo.pk
+
+    def _tiempo_lectura(self, valores):
+        # Mediana de µs por fila para obtener el texto desde lo guardado
+        tiempos = []
+        for valor in valores:
+            inicio = time.perf_counter()
+            descomprimir(valor)
+            tiempos.append((time.perf_counter() - inicio) * 1_000_000)
+        return statistics.median(tiempos) if tiempos else 0
+
+    def handle(self, *args, **options):
+        lote = options['lote']
+        if options['entrenar']:
+            diccionario_id = self._entrenar(options['muestras'])
+            if options['simular']:
+                self.stdout.write(self.style.WARNING("  (--simular: el diccionario nuevo no se activa)"))
+            else:
+                activar_diccionario(diccionario_id)
+        else:
+            diccionario_id = diccionario_activo()
+
+        filas = recomprimidas = 0
+        bytes_antes = bytes_despues = 0
+        muestra_antes, muestra_despues = [], []
+
+        consultas = HistorialConsultas.objects.order_by('pk').values_list('pk', 'interpretacion')
+        ultimo_pk = 0
+        while True:
+            bloque = list(consultas.filter(pk__gt=ultimo_pk)[:lote])
+            if not bloque:
+                break
+            ultimo_pk = bloque[-1][0]
+
+            cambios = []
+            for pk, guardado in bloque:
+                guardado = guardado.encode() if isinstance(guardado, str) else bytes(guardado)
+                filas += 1
+                bytes_antes += len(guardado)
+                if diccionario_de(guardado) == diccionario_id:
+                    bytes_despues += len(guardado)
+                    continue
+                texto = descomprimir(guardado)
+                nuevo = comprimir(texto, diccionario_id)
+                bytes_despues += len(nuevo)
+                if nuevo != guardado:
+                    cambios.append(HistorialConsultas(pk=pk, interpretacion=texto))
+                if len(muestra_antes) < 1000:
+                    muestra_antes.append(guardado)
+                    muestra_despues.append(nuevo)
+
+            if cambios and not options['simular']:
+                HistorialConsultas.objects.bulk_update(cambios, ['interpretacion'])
+            recomprimidas += len(cambios)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"🗜️ {filas} interpretaciones, {recomprimidas} {'a recomprimir' if options['simular'] else 'recomprimidas'} "
+            f"con el diccionario {diccionario_id}"
+        ))
+        if filas:
+            ahorro = bytes_antes - bytes_despues
+            self.stdout.write(
+                f"  espacio: {bytes_antes:,}B -> {bytes_despues:,}B "
+                f"({bytes_antes / max(bytes_despues, 1):.2f}x, {ahorro:,}B menos)"
+            )
+        if muestra_antes:
+            self.stdout.write(
+                f"  lectura por fila: {self._tiempo_lectura(muestra_antes):.1f}µs antes, "
+                f"{self._tiempo_lectura(muestra_despues):.1f}µs después"
+            )
@@ -0,0 +1,86 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from billing.cartas_historial import compactar_cartas, es_compacto, catalogo_modificado
+from billing.models import HistorialConsultas
+
+
+def _tamano(valor):
+    return len(json.dumps(valor, ensure_ascii=False).encode())
+
+
+class Command(BaseCommand):
+    help = ('Reporta cuánto ocupa cartas_resultado en el historial, por formato (compacto o completo), '
+            'y cuántas filas compactas apuntan a cartas que cambiaron en el catálogo')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--compactar',
+            action='store_true',
+            help='Convertir al formato compacto las filas que sigan en el formato completo'
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=500,
+            help='Filas por lote (default: 500)'
+        )
+
+    def handle(self, *args, **options):
+        lote = options['lote']
+        filas = {'compacto': 0, 'completo': 0}
+        bytes_formato = {'compacto': 0, 'completo': 0}
+        bytes_compactables = [0, 0]  # (antes, después) de las filas completas que se pueden compactar
+        modificadas = 0
+        pendientes = []
+        compactadas = 0
+
+        consultas = HistorialConsultas.objects.only('id', 'tirada_nombre', 'mazo_nombre', 'cartas_resultado')
+        for consulta in consultas.order_by('pk').iterator(lote):
+            valor = consulta.cartas_resultado
+            tamano = _tamano(valor)
+            if es_compacto(valor):
+                filas['compacto'] += 1
+                bytes_formato['compacto'] += tamano
+                modificadas += catalogo_modificado(valor)
+                continue
+
+            filas['completo'] += 1
+            bytes_formato['completo'] += tamano
+            compacto = compactar_cartas(valor, tirada_nombre=consulta.tirada_nombre, mazo_nombre=consulta.mazo_nombre)
+            if not es_compacto(compacto):
+                continue
+            bytes_compactables[0] += tamano
+            bytes_compactables[1] += _tamano(compacto)
+            if options['compactar']:
+                consulta.cartas_resultado = compacto
+                pendientes.append(consulta)
+                if len(pendientes) >= lote:
+                    HistorialConsultas.objects.bulk_update(pendientes, ['cartas_resultado'])
+                    compactadas += len(pendientes)
+                    pendientes = []
+        if pendientes:
+            HistorialConsultas.objects.bulk_update(pendientes, ['cartas_resultado'])
+            compactadas += len(pendientes)
+
+        self.stdout.write(self.style.SUCCESS("📊 cartas_resultado en HistorialConsultas"))
+        for formato in ('compacto', 'completo'):
+            promedio = bytes_formato[formato] / filas[formato] if filas[formato] else 0
+            self.stdout.write(
+                f"  {formato:<9} {filas[formato]:>8} filas  {bytes_formato[formato]:>12,}B  "
+                f"({promedio:,.0f}B por fila)"
+            )
+
+        antes, despues = bytes_compactables
+        if antes:
+            self.stdout.write(
+                f"  compactables: {antes:,}B -> {despues:,}B ({antes / despues:.1f}x, {antes - despues:,}B menos)"
+            )
+        if options['compactar']:
+            self.stdout.write(self.style.SUCCESS(f"🗜️ {compactadas} filas convertidas al formato compacto"))
+
+        if modificadas:
+            self.stdout.write(self.style.WARNING(
+                f"⚠️ {modificadas} filas compactas muestran cartas o posiciones que cambiaron en el catálogo"
+            ))
@@ -0,0 +1,78 @@
+# Generated by Django 5.2.1 on 2026-10-17 04:02
+
+from django.db import migrations, models
+from django.db.models import F, Sum
+
+
+def poblar_libro(apps, schema_editor):
+    """
+    Dar signo a las transacciones existentes, calcular los créditos gastados
+    de cada billetera y registrar un ajuste de apertura donde el libro no
+    cuadre con el saldo actual
+    """
+    Wallet = apps.get_model('billing', 'Wallet')
+    TransaccionCreditos = apps.get_model('billing', 'TransaccionCreditos')
+
+    TransaccionCreditos.objects.filter(tipo='uso').update(variacion=-F('cantidad'))
+    TransaccionCreditos.objects.exclude(tipo='uso').update(variacion=F('cantidad'))
+
+    totales = {
+        fila['user_id']: fila
+        for fila in TransaccionCreditos.objects.values('user_id').annotate(
+            saldo=Sum('variacion'),
+            gastados=Sum('cantidad', filter=models.Q(tipo='uso'))
+        )
+    }
+
+    for wallet in Wallet.objects.all():
+        fila = totales.get(wallet.user_id, {})
+        wallet.creditos_gastados_total = fila.get('gastados') or 0
+        wallet.save(update_fields=['creditos_gastados_total'])
+
+        diferencia = wallet.creditos_disponibles - (fila.get('saldo') or 0)
+        if diferencia:
+            TransaccionCreditos.objects.create(
+                user_id=wallet.user_id,
+                tipo='ajuste',
+                cantidad=abs(diferencia),
+                variacion=diferencia,
+                saldo_resultante=wallet.creditos_disponibles,
+                clave_idempotencia=f'apertura:{wallet.user_id}',
+                descripcion='Ajuste de apertura del libro de créditos'
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0006_pagocreditos_custom_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaccioncreditos',
+            name='clave_idempotencia',
+            field=models.CharField(blank=True, max_length=100, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='transaccioncreditos',
+            name='saldo_resultante',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='transaccioncreditos',
+            name='variacion',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='wallet',
+            name='creditos_gastados_total',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='transaccioncreditos',
+            name='tipo',
+            field=models.CharField(choices=[('compra', 'Compra'), ('uso', 'Uso'), ('regalo', 'Regalo'), ('reembolso', 'Reembolso'), ('ajuste', 'Ajuste')], max_length=20),
+        ),
+        migrations.RunPython(poblar_libro, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.1 on 2026-10-17 04:03
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0007_libro_creditos'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='historialconsultas',
+            index=models.Index(fields=['user', '-created_at'], name='billing_hist_user_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pagocreditos',
+            index=models.Index(fields=['user', '-created_at'], name='billing_pago_user_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pagocreditos',
+            index=models.Index(fields=['user', 'estado'], name='billing_pago_user_estado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pagocreditos',
+            index=models.Index(fields=['referencia_externa'], name='billing_pago_referencia_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='suscripcion',
+            index=models.Index(fields=['user', 'estado', '-created_at'], name='billing_susc_user_estado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='suscripcion',
+            index=models.Index(condition=models.Q(('estado', 'activa')), fields=['user', '-created_at'], name='billing_susc_activa_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaccioncreditos',
+            index=models.Index(fields=['user', '-created_at'], name='billing_tx_user_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaccioncreditos',
+            index=models.Index(fields=['user', 'tipo'], name='billing_tx_user_tipo_idx'),
+        ),
+    ]
@@ -0,0 +1,145 @@
+import hashlib
+import json
+
+from django.db import migrations
+
+FORMATO_COMPACTO = 1
+LOTE = 500
+
+
+def _tiradas(apps):
+    """
+    (nombre de tirada, nombre de mazo) -> {tirada_id: [posiciones en orden]}
+    """
+    ItemDeTirada = apps.get_model('oraculoApi', 'ItemDeTirada')
+    tiradas = {}
+    for item in ItemDeTirada.objects.select_related('tirada__mazo').order_by('tirada_id', 'orden'):
+        tirada = item.tirada
+        candidatas = tiradas.setdefault((tirada.nombre, tirada.mazo.nombre), {})
+        candidatas.setdefault(tirada.id, []).append(item.nombre_posicion)
+    return tiradas
+
+
+def _hash(cartas):
+    # Igual que billing.cartas_historial._hash
+    contenido = json.dumps(cartas, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(contenido.encode()).hexdigest()[:16]
+
+
+def _catalogo(apps):
+    """
+    Cartas como las entrega CartaSerializer (sin request) e items por tirada en orden
+    """
+    Carta = apps.get_model('oraculoApi', 'Carta')
+    ItemDeTirada = apps.get_model('oraculoApi', 'ItemDeTirada')
+
+    cartas = {}
+    for carta in Carta.objects.select_related('mazo'):
+        cartas[carta.id] = {
+            'id': carta.id,
+            'mazo': carta.mazo_id,
+            'mazo_nombre': carta.mazo.nombre,
+            'numero': carta.numero,
+            'nombre': carta.nombre,
+            'imagen': carta.imagen.url if carta.imagen else None,
+            'significado_normal': carta.significado_normal,
+            'significado_invertida': carta.significado_invertida,
+        }
+    items = {}
+    for item in ItemDeTirada.objects.order_by('tirada_id', 'orden'):
+        items.setdefault(item.tirada_id, []).append(item)
+    return cartas, items
+
+
+def _expandir(valor, cartas, items):
+    # Igual que billing.cartas_historial._expandir
+    items_tirada = items.get(valor['tirada'], [])
+    completas = []
+    for i, (carta_id, invertida, posicion) in enumerate(valor['cartas']):
+        carta = cartas.get(carta_id)
+        item = items_tirada[i] if i < len(items_tirada) and items_tirada[i].nombre_posicion == posicion else None
+        if carta is None:
+            carta, significado = {'id': carta_id}, ''
+        else:
+            significado = carta['significado_invertida'] if invertida else carta['significado_normal']
+        completas.append({
+            'carta': carta,
+            'posicion': posicion,
+            'descripcion_posicion': item.descripcion if item else '',
+            'es_invertida': bool(invertida),
+            'significado_usado': significado,
+        })
+    return completas
+
+
+def compactar(apps, schema_editor):
+    HistorialConsultas = apps.get_model('billing', 'HistorialConsultas')
+    cartas_catalogo, items = _catalogo(apps)
+    tiradas = _tiradas(apps)
+
+    pendientes = []
+    for consulta in HistorialConsultas.objects.only('id', 'tirada_nombre', 'mazo_nombre', 'cartas_resultado').iterator(LOTE):
+        cartas = consulta.cartas_resultado
+        if not isinstance(cartas, list) or not cartas:
+            continue
+        try:
+            entradas = [(c['carta']['id'], bool(c['es_invertida']), c['posicion']) for c in cartas]
+        except (KeyError, TypeError):
+            continue
+        posiciones = [posicion for _, _, posicion in entradas]
+        candidatas = [
+            tirada_id for tirada_id, nombres in tiradas.get((consulta.tirada_nombre, consulta.mazo_nombre), {}).items()
+            if nombres == posiciones
+        ]
+        if len(candidatas) != 1 or any(carta_id not in cartas_catalogo for carta_id, _, _ in entradas):
+            # Sin una tirada o cartas que calcen se deja en el formato completo
+            continue
+
+        valor = {
+            'v': FORMATO_COMPACTO,
+            'tirada': candidatas[0],
+            'cartas': [[carta_id, int(invertida), posicion] for carta_id, invertida, posicion in entradas],
+        }
+        expandidas = _expandir(valor, cartas_catalogo, items)
+        if expandidas != cartas:
+            # Cartas o posiciones editadas después de la consulta: compactarla
+            # mostraría el texto actual en vez del que vio el usuario
+            continue
+        valor['hash'] = _hash(expandidas)
+        consulta.cartas_resultado = valor
+        pendientes.append(consulta)
+        if len(pendientes) >= LOTE:
+            HistorialConsultas.objects.bulk_update(pendientes, ['cartas_resultado'])
+            pendientes = []
+    if pendientes:
+        HistorialConsultas.objects.bulk_update(pendientes, ['cartas_resultado'])
+
+
+def expandir(apps, schema_editor):
+    HistorialConsultas = apps.get_model('billing', 'HistorialConsultas')
+    cartas_catalogo, items = _catalogo(apps)
+
+    pendientes = []
+    for consulta in HistorialConsultas.objects.only('id', 'cartas_resultado').iterator(LOTE):
+        valor = consulta.cartas_resultado
+        if not (isinstance(valor, dict) and valor.get('v') == FORMATO_COMPACTO):
+            continue
+        consulta.cartas_resultado = _expandir(valor, cartas_catalogo, items)
+        pendientes.append(consulta)
+        if len(pendientes) >= LOTE:
+            HistorialConsultas.objects.bulk_update(pendientes, ['cartas_resultado'])
+            pendientes = []
+    if pendientes:
+        HistorialConsultas.objects.bulk_update(pendientes, ['cartas_resultado'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0008_indices_por_usuario'),
+        ('oraculoApi', '0003_alter_carta_significado_invertida'),
+    ]
+
+    operations = [
+        migrations.RunPython(compactar, expandir),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.1 on 2026-10-17 04:16
+
+import billing.compresion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0009_cartas_resultado_compactas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DiccionarioCompresion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('datos', models.BinaryField()),
+                ('muestras', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Diccionario de Compresión',
+                'verbose_name_plural': 'Diccionarios de Compresión',
+            },
+        ),
+        migrations.AlterField(
+            model_name='historialconsultas',
+            name='interpretacion',
+            field=billing.compresion.TextoComprimidoField(),
+        ),
+    ]
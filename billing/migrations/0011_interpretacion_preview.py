@@ -0,0 +1,42 @@
+# Generated by Django 5.2.1 on 2026-10-17 04:34
+
+from django.db import migrations, models
+
+from billing.compresion import descomprimir
+
+LARGO_PREVIEW = 400
+LOTE = 500
+
+
+def llenar_previews(apps, schema_editor):
+    HistorialConsultas = apps.get_model('billing', 'HistorialConsultas')
+    consultas = HistorialConsultas.objects.order_by('pk').values_list('pk', 'interpretacion')
+    ultimo_pk = 0
+    while True:
+        bloque = list(consultas.filter(pk__gt=ultimo_pk)[:LOTE])
+        if not bloque:
+            break
+        ultimo_pk = bloque[-1][0]
+        HistorialConsultas.objects.bulk_update(
+            [
+                HistorialConsultas(pk=pk, interpretacion_preview=descomprimir(guardado)[:LARGO_PREVIEW])
+                for pk, guardado in bloque
+            ],
+            ['interpretacion_preview']
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0010_interpretacion_comprimida'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='historialconsultas',
+            name='interpretacion_preview',
+            field=models.CharField(blank=True, default='', max_length=400),
+        ),
+        migrations.RunPython(llenar_previews, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,14 @@
 from django.db import models
 from django.conf import settings
+from django.db.models import F
 from django.utils import timezone
 from datetime import timedelta
 
+from .compresion import TextoComprimidoField
+
+# Caracteres de la interpretación que se guardan sin comprimir para los listados
+LARGO_PREVIEW_INTERPRETACION = 400
+
 
 class MetodoPago(models.Model):
     nombre = models.CharField(max_length=50, unique=True)  # "PayPal", "Flow", "Stripe"
@@ -123,6 +129,7 @@ class TipoSuscripcion(models.Model):
 class Wallet(models.Model):
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='wallet')
     creditos_disponibles = models.IntegerField(default=0)
+    creditos_gastados_total = models.IntegerField(default=0)  # Acumulado de consumos, mantenido con cada descuento
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -137,15 +144,31 @@ class Wallet(models.Model):
         return self.creditos_disponibles >= cantidad
 
     def descontar_creditos(self, cantidad):
-        if self.tiene_creditos_suficientes(cantidad):
-            self.creditos_disponibles -= cantidad
-            self.save()
-            return True
-        return False
+        """
+        Descontar créditos con un único UPDATE condicional en la base de datos.
+        El saldo se compara y se resta en SQL, así dos consultas simultáneas no
+        pueden pisarse ni dejar la billetera en negativo. Retorna si se descontó.
+        """
+        descontado = Wallet.objects.filter(
+            pk=self.pk,
+            creditos_disponibles__gte=cantidad
+        ).update(
+            creditos_disponibles=F('creditos_disponibles') - cantidad,
+            creditos_gastados_total=F('creditos_gastados_total') + cantidad,
+            updated_at=timezone.now()
+        )
+        self.refresh_from_db(fields=['creditos_disponibles', 'creditos_gastados_total', 'updated_at'])
+        return bool(descontado)
 
     def agregar_creditos(self, cantidad):
-        self.creditos_disponibles += cantidad
-        self.save()
+        """
+        Sumar créditos en la base de datos sin leer el saldo antes
+        """
+        Wallet.objects.filter(pk=self.pk).update(
+            creditos_disponibles=F('creditos_disponibles') + cantidad,
+            updated_at=timezone.now()
+        )
+        self.refresh_from_db(fields=['creditos_disponibles', 'updated_at'])
 
 
 class Suscripcion(models.Model):
@@ -170,6 +193,16 @@ class Suscripcion(models.Model):
         verbose_name = 'Suscripción'
         verbose_name_plural = 'Suscripciones'
         ordering = ['-created_at']
+        indexes = [
+            # Suscripción activa del usuario: filter(user=..., estado='activa').first()
+            models.Index(fields=['user', 'estado', '-created_at'], name='billing_susc_user_estado_idx'),
+            # Parcial donde la base lo soporta (PostgreSQL, SQLite); MySQL la omite y usa la anterior
+            models.Index(
+                fields=['user', '-created_at'],
+                condition=models.Q(estado='activa'),
+                name='billing_susc_activa_idx'
+            ),
+        ]
 
     def __str__(self):
         return f"Suscripción {self.tipo_suscripcion.nombre} de {self.user.email}"
@@ -189,11 +222,27 @@ class Suscripcion(models.Model):
         return 0
 
     def usar_tirada(self):
-        if self.tiradas_disponibles() > 0:
-            self.tiradas_usadas += 1
-            self.save()
-            return True
-        return False
+        """
+        Consumir una tirada con un único UPDATE condicional: estado, vigencia
+        y cupo se verifican en el mismo statement que incrementa el contador,
+        así dos consultas simultáneas no pueden usar la misma última tirada.
+        Retorna si se consumió.
+        """
+        ahora = timezone.now()
+        # El cupo se pasa como valor y no como F() sobre tipo_suscripcion: un filtro
+        # por una tabla relacionada haría que MySQL separe el UPDATE en dos queries
+        usada = Suscripcion.objects.filter(
+            pk=self.pk,
+            estado='activa',
+            fecha_inicio__lte=ahora,
+            fecha_fin__gte=ahora,
+            tiradas_usadas__lt=self.tipo_suscripcion.tiradas_incluidas
+        ).update(
+            tiradas_usadas=F('tiradas_usadas') + 1,
+            updated_at=ahora
+        )
+        self.refresh_from_db(fields=['tiradas_usadas', 'estado', 'updated_at'])
+        return bool(usada)
 
     def renovar(self):
         if self.auto_renovar and self.estado == 'activa':
@@ -204,16 +253,25 @@ class Suscripcion(models.Model):
 
 
 class TransaccionCreditos(models.Model):
+    """
+    Libro de créditos: un registro por cada movimiento de la billetera, solo
+    se agregan filas. Se crean con billing.movimientos.registrar_movimiento,
+    que aplica el movimiento a la billetera en la misma transacción.
+    """
     TIPO_CHOICES = [
         ('compra', 'Compra'),
         ('uso', 'Uso'),
         ('regalo', 'Regalo'),
         ('reembolso', 'Reembolso'),
+        ('ajuste', 'Ajuste'),
     ]
 
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='transacciones_creditos')
     tipo = models.CharField(max_length=20, choices=TIPO_CHOICES)
     cantidad = models.IntegerField()
+    variacion = models.IntegerField(default=0)  # Cantidad con signo: negativa en los usos
+    saldo_resultante = models.IntegerField(null=True, blank=True)  # Saldo de la billetera tras el movimiento
+    clave_idempotencia = models.CharField(max_length=100, unique=True, null=True, blank=True)  # Ej: "pago:42"
     descripcion = models.TextField()
     paquete_creditos = models.ForeignKey(PaqueteCreditos, on_delete=models.SET_NULL, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -222,10 +280,22 @@ class TransaccionCreditos(models.Model):
         verbose_name = 'Transacción de Créditos'
         verbose_name_plural = 'Transacciones de Créditos'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='billing_tx_user_fecha_idx'),
+            models.Index(fields=['user', 'tipo'], name='billing_tx_user_tipo_idx'),
+        ]
 
     def __str__(self):
         return f"{self.tipo} - {self.cantidad} créditos - {self.user.email}"
 
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError('Las transacciones de créditos no se modifican; registra un ajuste')
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError('Las transacciones de créditos no se eliminan; registra un ajuste')
+
 
 class HistorialConsultas(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='historial_consultas')
@@ -234,18 +304,49 @@ class HistorialConsultas(models.Model):
     mazo_nombre = models.CharField(max_length=200)
     costo_creditos = models.IntegerField(default=0)
     uso_suscripcion = models.BooleanField(default=False)
-    interpretacion = models.TextField()
-    cartas_resultado = models.JSONField()  # Guardar las cartas y sus posiciones
+    interpretacion = TextoComprimidoField()
+    # Comienzo de la interpretación en texto plano: el listado resumido no descomprime
+    interpretacion_preview = models.CharField(max_length=LARGO_PREVIEW_INTERPRETACION, blank=True, default='')
+    cartas_resultado = models.JSONField()  # Cartas y posiciones, en formato compacto (ver billing/cartas_historial.py)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         verbose_name = 'Historial de Consultas'
         verbose_name_plural = 'Historial de Consultas'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='billing_hist_user_fecha_idx'),
+        ]
 
     def __str__(self):
         return f"Consulta de {self.user.email} - {self.created_at.strftime('%d/%m/%Y')}"
 
+    def save(self, *args, **kwargs):
+        # Mantener el preview al día cuando se guarda la interpretación (si no está diferida)
+        update_fields = kwargs.get('update_fields')
+        if 'interpretacion' in self.__dict__ and (update_fields is None or 'interpretacion' in update_fields):
+            self.interpretacion_preview = self.interpretacion[:LARGO_PREVIEW_INTERPRETACION]
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'interpretacion_preview'}
+        super().save(*args, **kwargs)
+
+
+class DiccionarioCompresion(models.Model):
+    """
+    Diccionario zlib para TextoComprimidoField (ver billing/compresion.py).
+    Las filas comprimidas guardan su id: no se modifica ni se borra mientras se use.
+    """
+    datos = models.BinaryField()
+    muestras = models.IntegerField(default=0)  # Textos usados para entrenarlo
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Diccionario de Compresión'
+        verbose_name_plural = 'Diccionarios de Compresión'
+
+    def __str__(self):
+        return f"Diccionario {self.pk} ({len(self.datos)} bytes, {self.muestras} muestras)"
+
 
 class PagoSuscripcion(models.Model):
     ESTADO_CHOICES = [
@@ -296,6 +397,12 @@ class PagoCreditos(models.Model):
         verbose_name = 'Pago de Créditos'
         verbose_name_plural = 'Pagos de Créditos'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='billing_pago_user_fecha_idx'),
+            models.Index(fields=['user', 'estado'], name='billing_pago_user_estado_idx'),
+            # Búsqueda del pago por la referencia que devuelve la pasarela
+            models.Index(fields=['referencia_externa'], name='billing_pago_referencia_idx'),
+        ]
 
     def __str__(self):
         return f"Pago {self.estado} - ${self.monto} - {self.user.email}"
\ No newline at end of file
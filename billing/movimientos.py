@@ -0,0 +1,129 @@
+"""
+Movimientos de créditos: única puerta para cambiar el saldo de una billetera.
+
+Cada movimiento actualiza Wallet con un UPDATE atómico (ver
+Wallet.descontar_creditos / agregar_creditos) y agrega en la misma
+transacción su fila en el libro (TransaccionCreditos) con la cantidad con
+signo y el saldo resultante. Así la billetera mantiene los totales
+materializados (saldo y créditos gastados) y el libro permite
+reconstruirlos y conciliarlos (ver el comando conciliar_creditos).
+
+Una clave de idempotencia (por ejemplo "pago:<id>") garantiza que un mismo
+pago acreditado por dos caminos (página de éxito, IPN, verificación) mueva
+el saldo una sola vez.
+
+conciliar_billetera registra como 'ajuste' la diferencia entre el saldo de
+una billetera y su libro (saldos cambiados antes del libro o por fuera de
+esta puerta), sin volver a mover el saldo.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Q, Sum
+
+from .models import Wallet, TransaccionCreditos
+
+TIPOS_DEBITO = {'uso'}
+
+
+def clave_pago(pago):
+    """
+    Clave de idempotencia para acreditar un PagoCreditos
+    """
+    return f'pago:{pago.pk}'
+
+
+def registrar_movimiento(user, tipo, cantidad, descripcion, paquete_creditos=None, clave_idempotencia=None,
+                         debito=None, aplicar=True):
+    """
+    Aplicar un movimiento a la billetera del usuario y registrarlo en el libro.
+
+    `cantidad` es siempre positiva; el signo lo da el tipo, o `debito` si se
+    indica (ajustes). Con aplicar=False el saldo ya incluye el movimiento y
+    solo se registra en el libro (ver conciliar_billetera). Retorna
+    (transaccion, creada): si la clave de idempotencia ya estaba registrada
+    retorna la transacción existente sin mover el saldo, y si es un débito
+    sin saldo suficiente retorna (None, False).
+    """
+    if cantidad < 0:
+        raise ValueError('La cantidad de un movimiento debe ser positiva')
+    es_debito = tipo in TIPOS_DEBITO if debito is None else debito
+
+    if clave_idempotencia:
+        existente = TransaccionCreditos.objects.filter(clave_idempotencia=clave_idempotencia).first()
+        if existente:
+            return existente, False
+
+    try:
+        with transaction.atomic():
+            if not aplicar:
+                wallet = Wallet.objects.select_for_update().get(user=user)
+                variacion = -cantidad if es_debito else cantidad
+            else:
+                wallet, _ = Wallet.objects.get_or_create(user=user)
+                if es_debito:
+                    if not wallet.descontar_creditos(cantidad):
+                        return None, False
+                    variacion = -cantidad
+                else:
+                    wallet.agregar_creditos(cantidad)
+                    variacion = cantidad
+
+            transaccion = TransaccionCreditos.objects.create(
+                user=user,
+                tipo=tipo,
+                cantidad=cantidad,
+                variacion=variacion,
+                saldo_resultante=wallet.creditos_disponibles,
+                clave_idempotencia=clave_idempotencia,
+                descripcion=descripcion,
+                paquete_creditos=paquete_creditos
+            )
+    except IntegrityError:
+        # Otra petición registró la misma clave entre la búsqueda y el insert;
+        # el rollback deshace también el cambio de saldo
+        if not clave_idempotencia:
+            raise
+        return TransaccionCreditos.objects.get(clave_idempotencia=clave_idempotencia), False
+
+    return transaccion, True
+
+
+def totales_libro(user_ids):
+    """
+    user_id -> (saldo, créditos gastados) según el libro
+    """
+    return {
+        fila['user_id']: (fila['saldo'] or 0, fila['gastados'] or 0)
+        for fila in TransaccionCreditos.objects.filter(user_id__in=user_ids).values('user_id').annotate(
+            saldo=Sum('variacion'),
+            gastados=Sum('cantidad', filter=Q(tipo='uso'))
+        )
+    }
+
+
+def conciliar_billetera(user_id):
+    """
+    Dejar el libro del usuario cuadrado con su billetera: la diferencia de
+    saldo se registra como un 'ajuste' (sin mover el saldo) y los créditos
+    gastados se recalculan desde los usos del libro. Retorna el ajuste
+    registrado, o None si el saldo ya cuadraba.
+    """
+    with transaction.atomic():
+        wallet = Wallet.objects.select_for_update().select_related('user').get(user_id=user_id)
+        saldo_libro, gastados_libro = totales_libro([user_id]).get(user_id, (0, 0))
+
+        if wallet.creditos_gastados_total != gastados_libro:
+            Wallet.objects.filter(pk=wallet.pk).update(creditos_gastados_total=gastados_libro)
+
+        diferencia = wallet.creditos_disponibles - saldo_libro
+        if diferencia == 0:
+            return None
+        ajuste, _ = registrar_movimiento(
+            wallet.user,
+            'ajuste',
+            abs(diferencia),
+            f'Conciliación: el saldo de la billetera ({wallet.creditos_disponibles}) '
+            f'difería del libro ({saldo_libro})',
+            debito=diferencia < 0,
+            aplicar=False
+        )
+        return ajuste
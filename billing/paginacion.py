@@ -0,0 +1,41 @@
+"""
+Paginación por cursor para los listados por usuario.
+
+Los listados se ordenan por (created_at, id) descendente y el cursor opaco
+de CursorPagination apunta a la posición en ese orden, así cada página es
+una búsqueda por índice (ver los índices (user, -created_at) de
+billing/models.py) que no se degrada con el número de página ni repite o
+salta filas cuando se agregan registros nuevos mientras se recorre el listado.
+
+Sin ?cursor= ni ?limite= los endpoints responden como siempre: una lista
+con los registros más recientes. Con cualquiera de los dos responden la
+página de CursorPagination: {'next', 'previous', 'results'}.
+"""
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+
+
+class PaginacionPorFecha(CursorPagination):
+    ordering = ('-created_at', '-id')
+    page_size = 20
+    page_size_query_param = 'limite'
+    max_page_size = 100
+
+    def pide_pagina(self, request):
+        """
+        Si el request usa la paginación (?cursor= o ?limite=)
+        """
+        return self.cursor_query_param in request.query_params or self.page_size_query_param in request.query_params
+
+
+def respuesta_paginada(request, queryset, serializar):
+    """
+    Response con la página pedida del queryset, o con la lista de los
+    page_size más recientes si el request no pide página.
+    `serializar` recibe los objetos y retorna los datos serializados.
+    """
+    paginador = PaginacionPorFecha()
+    if not paginador.pide_pagina(request):
+        return Response(serializar(queryset.order_by(*paginador.ordering)[:paginador.page_size]))
+    pagina = paginador.paginate_queryset(queryset, request)
+    return paginador.get_paginated_response(serializar(pagina))
@@ -1,18 +1,21 @@
 from rest_framework import serializers
+from core.campos import CamposDinamicosMixin
+from django.urls import reverse
+from .cartas_historial import expandir_cartas
 from .models import (
     MetodoPago, PaqueteCreditos, BotonPago, TipoSuscripcion, Wallet, Suscripcion,
     TransaccionCreditos, HistorialConsultas, PagoSuscripcion, PagoCreditos
 )
 
 
-class MetodoPagoSerializer(serializers.ModelSerializer):
+class MetodoPagoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     class Meta:
         model = MetodoPago
         fields = ['id', 'nombre', 'codigo', 'descripcion', 'icono', 'color_boton',
                  'paises_soportados', 'activo', 'orden']
 
 
-class BotonPagoSerializer(serializers.ModelSerializer):
+class BotonPagoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     metodo_pago = MetodoPagoSerializer(read_only=True)
 
     class Meta:
@@ -20,7 +23,7 @@ class BotonPagoSerializer(serializers.ModelSerializer):
         fields = ['id', 'metodo_pago', 'url_base', 'parametros_adicionales', 'activo']
 
 
-class PaqueteCreditosSerializer(serializers.ModelSerializer):
+class PaqueteCreditosSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     precio_por_credito = serializers.ReadOnlyField()
     tiene_descuento = serializers.ReadOnlyField()
     porcentaje_descuento = serializers.ReadOnlyField()
@@ -33,7 +36,7 @@ class PaqueteCreditosSerializer(serializers.ModelSerializer):
                  'porcentaje_descuento', 'destacado', 'activo', 'botones_pago']
 
 
-class PaqueteCreditosSimpleSerializer(serializers.ModelSerializer):
+class PaqueteCreditosSimpleSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     """Serializer simple sin botones de pago para listas"""
     precio_por_credito = serializers.ReadOnlyField()
     tiene_descuento = serializers.ReadOnlyField()
@@ -46,13 +49,13 @@ class PaqueteCreditosSimpleSerializer(serializers.ModelSerializer):
                  'porcentaje_descuento', 'destacado', 'activo']
 
 
-class TipoSuscripcionSerializer(serializers.ModelSerializer):
+class TipoSuscripcionSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     class Meta:
         model = TipoSuscripcion
         fields = ['id', 'nombre', 'descripcion', 'precio_mensual', 'tiradas_incluidas', 'activo']
 
 
-class WalletSerializer(serializers.ModelSerializer):
+class WalletSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     user_email = serializers.CharField(source='user.email', read_only=True)
     user_nombre = serializers.CharField(source='user.nombre', read_only=True)
 
@@ -62,7 +65,7 @@ class WalletSerializer(serializers.ModelSerializer):
         read_only_fields = ['created_at', 'updated_at']
 
 
-class SuscripcionSerializer(serializers.ModelSerializer):
+class SuscripcionSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     user_email = serializers.CharField(source='user.email', read_only=True)
     tipo_nombre = serializers.CharField(source='tipo_suscripcion.nombre', read_only=True)
     tiradas_disponibles = serializers.SerializerMethodField()
@@ -74,6 +77,7 @@ class SuscripcionSerializer(serializers.ModelSerializer):
                  'fecha_fin', 'estado', 'tiradas_usadas', 'tiradas_disponibles',
                  'esta_activa', 'auto_renovar', 'created_at']
         read_only_fields = ['created_at', 'updated_at']
+        expandibles = {'tipo_suscripcion': TipoSuscripcionSerializer}
 
     def get_tiradas_disponibles(self, obj):
         return obj.tiradas_disponibles()
@@ -82,7 +86,7 @@ class SuscripcionSerializer(serializers.ModelSerializer):
         return obj.esta_activa()
 
 
-class TransaccionCreditosSerializer(serializers.ModelSerializer):
+class TransaccionCreditosSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     user_email = serializers.CharField(source='user.email', read_only=True)
     paquete_nombre = serializers.CharField(source='paquete_creditos.nombre', read_only=True)
 
@@ -91,10 +95,23 @@ class TransaccionCreditosSerializer(serializers.ModelSerializer):
         fields = ['id', 'user_email', 'tipo', 'cantidad', 'descripcion',
                  'paquete_creditos', 'paquete_nombre', 'created_at']
         read_only_fields = ['created_at']
+        expandibles = {'paquete_creditos': PaqueteCreditosSimpleSerializer}
 
 
-class HistorialConsultasSerializer(serializers.ModelSerializer):
+class CartasResultadoField(serializers.JSONField):
+    """
+    cartas_resultado en el formato completo, aunque esté guardado compacto
+    """
+
+    def to_representation(self, value):
+        return super().to_representation(expandir_cartas(value))
+
+
+class HistorialConsultasSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     user_email = serializers.CharField(source='user.email', read_only=True)
+    # Se guarda comprimida: solo se descomprime si el campo está en la respuesta
+    interpretacion = serializers.CharField()
+    cartas_resultado = CartasResultadoField()
 
     class Meta:
         model = HistorialConsultas
@@ -104,7 +121,27 @@ class HistorialConsultasSerializer(serializers.ModelSerializer):
         read_only_fields = ['created_at']
 
 
-class PagoSuscripcionSerializer(serializers.ModelSerializer):
+class HistorialConsultasResumenSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
+    """
+    Serializer liviano para listados: sin interpretación completa ni cartas,
+    que se piden por consulta en `detalle`. Espera el queryset de
+    billing.views.historial_resumido.
+    """
+    detalle = serializers.SerializerMethodField()
+
+    class Meta:
+        model = HistorialConsultas
+        fields = ['id', 'pregunta', 'tirada_nombre', 'mazo_nombre', 'costo_creditos',
+                 'uso_suscripcion', 'interpretacion_preview', 'detalle', 'created_at']
+        read_only_fields = ['interpretacion_preview', 'created_at']
+
+    def get_detalle(self, obj):
+        url = reverse('mi-historial-consulta-detalle', args=[obj.pk])
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+
+class PagoSuscripcionSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     user_email = serializers.CharField(source='suscripcion.user.email', read_only=True)
     tipo_suscripcion = serializers.CharField(source='suscripcion.tipo_suscripcion.nombre', read_only=True)
 
@@ -115,7 +152,7 @@ class PagoSuscripcionSerializer(serializers.ModelSerializer):
         read_only_fields = ['created_at', 'updated_at']
 
 
-class PagoCreditosSerializer(serializers.ModelSerializer):
+class PagoCreditosSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     user_email = serializers.CharField(source='user.email', read_only=True)
     paquete_nombre = serializers.CharField(source='paquete_creditos.nombre', read_only=True)
     metodo_pago_nombre = serializers.CharField(source='boton_pago.metodo_pago.nombre', read_only=True)
@@ -125,6 +162,7 @@ class PagoCreditosSerializer(serializers.ModelSerializer):
         fields = ['id', 'user_email', 'paquete_creditos', 'paquete_nombre', 'boton_pago',
                  'metodo_pago_nombre', 'monto', 'estado', 'metodo_pago', 'referencia_externa', 'custom_id', 'created_at']
         read_only_fields = ['created_at', 'updated_at']
+        expandibles = {'paquete_creditos': PaqueteCreditosSimpleSerializer, 'boton_pago': BotonPagoSerializer}
 
 
 # Serializers para procesos específicos
@@ -1,7 +1,10 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.conf import settings
-from .models import Wallet, TransaccionCreditos
+from django.db import transaction
+from .models import Wallet, MetodoPago, PaqueteCreditos, BotonPago
+from .movimientos import registrar_movimiento
+from .tienda import invalidar_tienda, reconstruir_metodos_por_pais
 
 
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
@@ -15,12 +18,34 @@ def create_user_wallet(sender, instance, created, **kwargs):
         # Si se creó una nueva wallet, darle créditos de bienvenida
         if wallet_created:
             creditos_bienvenida = 5
-            wallet.agregar_creditos(creditos_bienvenida)
+            registrar_movimiento(
+                instance,
+                'regalo',
+                creditos_bienvenida,
+                'Créditos de bienvenida por registrarse en Tarotnaútica',
+                clave_idempotencia=f'bienvenida:{instance.pk}'
+            )
 
-            # Crear registro de transacción
-            TransaccionCreditos.objects.create(
-                user=instance,
-                tipo='regalo',
-                cantidad=creditos_bienvenida,
-                descripcion='Créditos de bienvenida por registrarse en Tarotnaútica'
-            )
\ No newline at end of file
+
+@receiver(post_save, sender=MetodoPago)
+@receiver(post_save, sender=PaqueteCreditos)
+@receiver(post_save, sender=BotonPago)
+@receiver(post_delete, sender=MetodoPago)
+@receiver(post_delete, sender=PaqueteCreditos)
+@receiver(post_delete, sender=BotonPago)
+def tienda_modificada(sender, **kwargs):
+    """
+    Invalidar la tienda cacheada al editar paquetes, botones o métodos de pago,
+    al confirmar la transacción (antes se podría cachear el contenido anterior
+    con la versión nueva)
+    """
+    transaction.on_commit(invalidar_tienda)
+
+
+@receiver(post_save, sender=MetodoPago)
+@receiver(post_delete, sender=MetodoPago)
+def metodo_pago_modificado(sender, **kwargs):
+    """
+    Reconstruir el índice de métodos de pago por país al confirmar el cambio
+    """
+    transaction.on_commit(reconstruir_metodos_por_pais)
@@ -1,3 +1,460 @@
-from django.test import TestCase
+import os
+import threading
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from billing import views
+from billing.cartas_historial import catalogo_modificado, compactar_cartas, es_compacto, expandir_cartas
+from billing.models import (
+    LARGO_PREVIEW_INTERPRETACION, MetodoPago, PaqueteCreditos, BotonPago, TransaccionCreditos, HistorialConsultas,
+    Wallet, TipoSuscripcion, Suscripcion
+)
+from billing.movimientos import totales_libro
+from billing.tienda import construir_tienda, invalidar_tienda
+from oraculoApi.catalogo import invalidar_catalogo, obtener_catalogo
+from oraculoApi import sorteo
+from oraculoApi.models import Set, Mazo, Carta, Tirada, ItemDeTirada
+
+
+# La versión de la tienda se recuerda en el proceso durante toda la prueba,
+# así el conteo no depende de cuándo se vuelve a leer del cache compartido
+@override_settings(VERSIONES_REFRESCO=3600)
+class QueriesTiendaTests(TestCase):
+    """
+    La tienda (paquetes-con-botones y con-botones) hace un número constante de
+    queries sin importar cuántos paquetes haya
+    """
+    # Sin cache: índice de métodos por país, paquetes activos y botones con su
+    # método (prefetch); con la tienda del país en cache: ninguna
+    QUERIES_PAQUETES_CON_BOTONES = 3
+    QUERIES_CON_BOTONES = 3
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.metodos = [
+            MetodoPago.objects.create(nombre='Prueba CL', codigo='prueba_cl', paises_soportados=['CL']),
+            MetodoPago.objects.create(nombre='Prueba MX', codigo='prueba_mx', paises_soportados=['MX']),
+            MetodoPago.objects.create(nombre='Prueba GLOBAL', codigo='prueba_global', paises_soportados=['GLOBAL']),
+        ]
+
+    def setUp(self):
+        self.factory = RequestFactory(HTTP_HOST='localhost')
+
+    def _crear_paquetes(self, cantidad):
+        creados = PaqueteCreditos.objects.filter(activo=True).count()
+        for i in range(creados, cantidad):
+            paquete = PaqueteCreditos.objects.create(
+                nombre=f'Paquete prueba {i}',
+                descripcion='Paquete para contar queries',
+                cantidad_creditos=10 + i,
+                precio=Decimal('1000') + i,
+            )
+            for metodo in self.metodos:
+                BotonPago.objects.create(paquete=paquete, metodo_pago=metodo, url_base='https://example.com/pago')
+
+    def _assert_queries(self, esperadas, vista, **kwargs):
+        invalidar_tienda()
+        with self.assertNumQueries(esperadas):
+            respuesta = vista(self.factory.get('/', {'pais': 'CL'}), **kwargs)
+        self.assertEqual(respuesta.status_code, 200)
+        with self.assertNumQueries(0):
+            vista(self.factory.get('/', {'pais': 'CL'}), **kwargs)
+
+    def test_queries_constantes(self):
+        con_botones = views.PaqueteCreditosViewSet.as_view({'get': 'con_botones'})
+        for cantidad in (1, 5, 25):
+            with self.subTest(paquetes=cantidad):
+                self._crear_paquetes(cantidad)
+                paquete_id = PaqueteCreditos.objects.filter(activo=True).values_list('id', flat=True).last()
+                self._assert_queries(self.QUERIES_PAQUETES_CON_BOTONES, views.paquetes_con_botones)
+                self._assert_queries(self.QUERIES_CON_BOTONES, con_botones, pk=str(paquete_id))
+
+    def test_indice_por_pais_coincide_con_paises_soportados(self):
+        self._crear_paquetes(5)
+        for pais in ('CL', 'MX', 'US'):
+            with self.subTest(pais=pais):
+                por_indice = {
+                    boton['id']
+                    for entrada in construir_tienda(pais)
+                    for boton in entrada['botones_disponibles']
+                }
+                # Filtro original recorriendo paises_soportados de cada método
+                por_json = {
+                    boton.id
+                    for boton in BotonPago.objects.filter(paquete__activo=True).select_related('metodo_pago')
+                    if boton.metodo_pago.activo and boton.es_disponible_para_pais(pais)
+                }
+                self.assertEqual(por_indice, por_json)
+
+
+class LibroCreditosTests(TestCase):
+    """
+    El libro de créditos solo crece: no se edita ni se borra desde el admin,
+    pero no impide eliminar usuarios
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = get_user_model().objects.create_superuser(
+            email='admin@example.com', nombre='Admin', password='clave-admin'
+        )
+        cls.usuario = get_user_model().objects.create_user(
+            email='usuario@example.com', nombre='Usuario', password='clave-usuario'
+        )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_eliminar_usuario_con_libro_desde_admin(self):
+        self.assertTrue(TransaccionCreditos.objects.filter(user=self.usuario).exists())
+        url = reverse('admin:users_customuser_delete', args=[self.usuario.pk])
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.client.post(url, {'post': 'yes'})
+        self.assertFalse(get_user_model().objects.filter(pk=self.usuario.pk).exists())
+        self.assertFalse(TransaccionCreditos.objects.filter(user_id=self.usuario.pk).exists())
+
+    def test_filas_del_libro_no_se_borran_desde_su_admin(self):
+        transaccion = TransaccionCreditos.objects.filter(user=self.usuario).first()
+        url = reverse('admin:billing_transaccioncreditos_delete', args=[transaccion.pk])
+        self.assertEqual(self.client.get(url).status_code, 403)
+        respuesta = self.client.get(reverse('admin:billing_transaccioncreditos_changelist'))
+        model_admin = respuesta.context['cl'].model_admin
+        self.assertNotIn('delete_selected', model_admin.get_actions(respuesta.wsgi_request))
+
+    def test_saldo_no_editable_en_admin(self):
+        wallet = Wallet.objects.get(user=self.usuario)
+        url = reverse('admin:billing_wallet_change', args=[wallet.pk])
+        form = self.client.get(url).context['adminform'].form
+        self.assertNotIn('creditos_disponibles', form.fields)
+        self.assertNotIn('creditos_gastados_total', form.fields)
+
+    def test_conciliar_registra_ajuste(self):
+        # Saldo cambiado por fuera del libro
+        Wallet.objects.filter(user=self.usuario).update(creditos_disponibles=12, creditos_gastados_total=3)
+        call_command('conciliar_creditos', '--corregir', stdout=open(os.devnull, 'w'))
+
+        wallet = Wallet.objects.get(user=self.usuario)
+        self.assertEqual((wallet.creditos_disponibles, wallet.creditos_gastados_total), (12, 0))
+        self.assertEqual(totales_libro([self.usuario.pk])[self.usuario.pk], (12, 0))
+        ajuste = TransaccionCreditos.objects.get(user=self.usuario, tipo='ajuste')
+        self.assertEqual((ajuste.variacion, ajuste.saldo_resultante), (7, 12))
+        call_command('conciliar_creditos', stdout=open(os.devnull, 'w'))
+
+
+class HistorialResumidoTests(TestCase):
+    """
+    El listado resumido del historial no carga ni descomprime la interpretación
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = get_user_model().objects.create_user(
+            email='lector@example.com', nombre='Lector', password='clave-lector'
+        )
+        for i in range(3):
+            HistorialConsultas.objects.create(
+                user=cls.usuario, pregunta=f'Pregunta {i}', tirada_nombre='Tirada', mazo_nombre='Mazo',
+                interpretacion='Las cartas hablan. ' * 100, cartas_resultado=[]
+            )
+
+    def test_preview_se_guarda_con_la_interpretacion(self):
+        consulta = HistorialConsultas.objects.first()
+        self.assertEqual(consulta.interpretacion_preview, consulta.interpretacion[:LARGO_PREVIEW_INTERPRETACION])
+        consulta.interpretacion = 'Texto nuevo'
+        consulta.save(update_fields=['interpretacion'])
+        consulta.refresh_from_db()
+        self.assertEqual(consulta.interpretacion_preview, 'Texto nuevo')
+
+    def test_resumen_sin_interpretacion(self):
+        self.client.force_login(self.usuario)
+        with CaptureQueriesContext(connection) as queries:
+            respuesta = self.client.get(reverse('mi-historial-consultas'), {'vista': 'resumen'})
+        self.assertEqual(respuesta.status_code, 200)
+        resultados = respuesta.json()
+        self.assertEqual(len(resultados), 3)
+        self.assertEqual(len(resultados[0]['interpretacion_preview']), LARGO_PREVIEW_INTERPRETACION)
+        consulta_historial = [q['sql'] for q in queries if 'billing_historialconsultas' in q['sql']]
+        self.assertEqual(len(consulta_historial), 1)
+        self.assertNotIn('"interpretacion",', consulta_historial[0])
+        self.assertNotIn('"interpretacion" ', consulta_historial[0])
+
+    def test_detalle_solo_cartas(self):
+        # La página del historial cuenta las cartas de la última consulta así
+        self.client.force_login(self.usuario)
+        consulta = HistorialConsultas.objects.first()
+        url = reverse('mi-historial-consulta-detalle', args=[consulta.pk])
+        with CaptureQueriesContext(connection) as queries:
+            respuesta = self.client.get(url, {'fields': 'cartas_resultado'})
+        self.assertEqual(respuesta.json(), {'cartas_resultado': []})
+        consulta_historial = [q['sql'] for q in queries if 'billing_historialconsultas' in q['sql']]
+        self.assertEqual(len(consulta_historial), 1)
+        self.assertNotIn('"interpretacion"', consulta_historial[0])
+
+
+class CartasHistorialTests(TestCase):
+    """
+    Formato compacto de cartas_resultado: ida y vuelta con el catálogo y
+    filas que se dejan en formato completo
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        set_obj = Set.objects.create(nombre='Set', descripcion='Descripción')
+        mazo = Mazo.objects.create(set=set_obj, nombre='Mazo', descripcion='Descripción')
+        cls.cartas = [
+            Carta.objects.create(
+                mazo=mazo, numero=numero, nombre=f'Carta {numero}',
+                significado_normal=f'Normal {numero}', significado_invertida=f'Invertida {numero}'
+            )
+            for numero in range(3)
+        ]
+        cls.tirada = Tirada.objects.create(mazo=mazo, nombre='Tirada', descripcion='Descripción', cantidad_cartas=2)
+        for orden, posicion in enumerate(('Pasado', 'Futuro')):
+            ItemDeTirada.objects.create(tirada=cls.tirada, nombre_posicion=posicion, descripcion=f'Sobre {posicion}', orden=orden)
+
+    def setUp(self):
+        invalidar_catalogo()
+
+    def _lectura(self, semilla=None):
+        # Lo que entrega la consulta: con semilla, las cartas de ese sorteo; sin
+        # ella, Carta 2 al derecho en Pasado y Carta 0 invertida en Futuro
+        catalogo = obtener_catalogo()
+        items = catalogo.items_por_tirada[self.tirada.id]
+        sorteadas = ((self.cartas[2].id, self.cartas[0].id), (False, True))
+        if semilla is not None:
+            resultado = sorteo.reproducir(semilla, self.tirada.mazo, self.tirada)
+            sorteadas = (resultado.cartas, resultado.invertidas)
+        cartas = []
+        for item, carta_id, invertida in zip(items, *sorteadas):
+            serializada = catalogo.carta_serializada(carta_id)
+            cartas.append({
+                'carta': serializada,
+                'posicion': item.nombre_posicion,
+                'descripcion_posicion': item.descripcion,
+                'es_invertida': invertida,
+                'significado_usado': serializada['significado_invertida' if invertida else 'significado_normal'],
+            })
+        return cartas
+
+    def test_ida_y_vuelta(self):
+        lectura = self._lectura()
+        valor = compactar_cartas(lectura, self.tirada.id)
+        self.assertTrue(es_compacto(valor))
+        self.assertEqual(valor['cartas'], [[self.cartas[2].id, 0, 'Pasado'], [self.cartas[0].id, 1, 'Futuro']])
+        self.assertEqual(expandir_cartas(valor), lectura)
+        self.assertFalse(catalogo_modificado(valor))
+
+    def test_semilla_que_reproduce_las_cartas(self):
+        lectura = self._lectura(semilla=1234)
+        self.assertEqual(compactar_cartas(lectura, self.tirada.id, semilla=1234)['semilla'], 1234)
+        self.assertEqual(expandir_cartas(compactar_cartas(lectura, self.tirada.id, semilla=1234)), lectura)
+
+    def test_semilla_que_no_reproduce_se_descarta(self):
+        lectura = self._lectura(semilla=1234)
+        for semilla in (1235, '1234', True, -1, 2 ** sorteo.BITS_SEMILLA):
+            with self.subTest(semilla=semilla):
+                valor = compactar_cartas(lectura, self.tirada.id, semilla=semilla)
+                self.assertTrue(es_compacto(valor))
+                self.assertNotIn('semilla', valor)
+
+    def test_historial_guarda_solo_semillas_verificadas(self):
+        usuario = get_user_model().objects.create_user(email='semilla@example.com', nombre='Semilla', password='clave')
+        self.client.force_login(usuario)
+        tirada_info = {'id': self.tirada.id, 'nombre': 'Tirada', 'mazo_nombre': 'Mazo'}
+        for semilla in (1234, 1235):
+            self.client.post(reverse('procesar-consulta-tarot'), {
+                'pregunta': f'Semilla {semilla}', 'tirada_info': tirada_info, 'costo_creditos': 0,
+                'interpretacion': 'Interpretación', 'cartas_resultado': self._lectura(semilla=1234),
+                'semilla_sorteo': semilla,
+            }, content_type='application/json')
+
+        guardadas = {
+            consulta.pregunta: consulta.cartas_resultado.get('semilla')
+            for consulta in HistorialConsultas.objects.filter(user=usuario)
+        }
+        self.assertEqual(guardadas, {'Semilla 1234': 1234, 'Semilla 1235': None})
+
+    def test_tirada_por_nombre(self):
+        valor = compactar_cartas(self._lectura(), tirada_nombre='Tirada', mazo_nombre='Mazo')
+        self.assertEqual(valor['tirada'], self.tirada.id)
+        lectura = self._lectura()
+        self.assertIs(compactar_cartas(lectura, tirada_nombre='Otra', mazo_nombre='Mazo'), lectura)
+
+    def test_sin_cambios_si_no_calza_con_el_catalogo(self):
+        # Texto distinto al del catálogo actual (la carta se editó después de la consulta)
+        editada = self._lectura()
+        editada[0]['carta']['significado_normal'] = 'Texto de la consulta'
+        editada[0]['significado_usado'] = 'Texto de la consulta'
+        # Posiciones en otro orden
+        desordenada = self._lectura()[::-1]
+        # Carta que ya no existe
+        inexistente = self._lectura()
+        inexistente[1]['carta']['id'] = 0
+
+        for cartas in (editada, desordenada, inexistente, [], 'no es una lista', [{'sin': 'carta'}]):
+            with self.subTest(cartas=cartas):
+                self.assertEqual(compactar_cartas(cartas, self.tirada.id), cartas)
+        self.assertEqual(expandir_cartas(editada), editada)
+
+    def test_catalogo_modificado_despues_de_guardar(self):
+        valor = compactar_cartas(self._lectura(), self.tirada.id)
+        Carta.objects.filter(pk=self.cartas[2].pk).update(significado_normal='Significado nuevo')
+        invalidar_catalogo()
+        self.assertTrue(catalogo_modificado(valor))
+        self.assertEqual(expandir_cartas(valor)[0]['significado_usado'], 'Significado nuevo')
+
+        carta_id = self.cartas[0].id
+        Carta.objects.filter(pk=carta_id).delete()
+        invalidar_catalogo()
+        self.assertEqual(expandir_cartas(valor)[1]['carta'], {'id': carta_id})
+        self.assertEqual(expandir_cartas(valor)[1]['significado_usado'], '')
+
+
+class PaginacionPorFechaTests(TestCase):
+    """
+    Listados por usuario: lista simple sin ?cursor= / ?limite=, páginas de
+    CursorPagination con ellos
+    """
+    url = '/api/billing/mi-historial-consultas/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = get_user_model().objects.create_user(
+            email='paginas@example.com', nombre='Paginas', password='clave-paginas'
+        )
+        ahora = timezone.now()
+        for i in range(25):
+            consulta = HistorialConsultas.objects.create(
+                user=cls.usuario, pregunta=f'Pregunta {i}', tirada_nombre='Tirada', mazo_nombre='Mazo',
+                interpretacion='Interpretación', cartas_resultado=[]
+            )
+            # Pares con la misma fecha para recorrer también el desempate por id
+            HistorialConsultas.objects.filter(pk=consulta.pk).update(created_at=ahora - timedelta(minutes=i // 2))
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+        self.esperadas = list(
+            HistorialConsultas.objects.filter(user=self.usuario).order_by('-created_at', '-id').values_list('id', flat=True)
+        )
+
+    def test_sin_parametros_lista_simple(self):
+        respuesta = self.client.get(self.url, {'vista': 'resumen'})
+        self.assertEqual([consulta['id'] for consulta in respuesta.json()], self.esperadas[:20])
+
+    def test_recorrer_por_cursor(self):
+        vistas = []
+        respuesta = self.client.get(self.url, {'vista': 'resumen', 'limite': 4}).json()
+        self.assertIsNone(respuesta['previous'])
+        while True:
+            vistas += [consulta['id'] for consulta in respuesta['results']]
+            if respuesta['next'] is None:
+                break
+            respuesta = self.client.get(respuesta['next']).json()
+            self.assertIsNotNone(respuesta['previous'])
+        self.assertEqual(vistas, self.esperadas)
+
+    def test_limite_acotado_y_cursor_invalido(self):
+        respuesta = self.client.get(self.url, {'limite': 1000}).json()
+        self.assertEqual(len(respuesta['results']), 25)
+        self.assertEqual(self.client.get(self.url, {'cursor': 'no-es-un-cursor'}).status_code, 404)
+
+    def test_fields_con_cursor(self):
+        # ?fields= reduce las columnas pero conserva las del orden del cursor
+        with CaptureQueriesContext(connection) as queries:
+            respuesta = self.client.get(self.url, {'fields': 'id,pregunta', 'limite': 20}).json()
+        self.assertEqual(set(respuesta['results'][0]), {'id', 'pregunta'})
+        consulta_historial = [q['sql'] for q in queries if 'billing_historialconsultas' in q['sql']]
+        self.assertNotIn('"interpretacion"', consulta_historial[0])
+        siguiente = self.client.get(respuesta['next']).json()
+        self.assertEqual(
+            [c['id'] for c in respuesta['results'] + siguiente['results']], self.esperadas
+        )
+        self.assertEqual(self.client.get(self.url, {'fields': 'id,no_existe'}).status_code, 400)
+
+    def test_transacciones(self):
+        url = '/api/billing/mis-transacciones/'
+        self.assertIsInstance(self.client.get(url).json(), list)
+        self.assertIn('results', self.client.get(url, {'limite': 5}).json())
+
+
+class DescuentosConcurrentesTests(TransactionTestCase):
+    """
+    Los UPDATE condicionales de créditos y de tiradas no pierden
+    actualizaciones ni se pasan del saldo o del cupo con varios hilos a la vez
+    """
+    HILOS = 8
+    OPERACIONES = 25
+
+    def setUp(self):
+        self.usuario = get_user_model().objects.create_user(
+            email='concurrente@example.com', nombre='Concurrente', password='clave-concurrente'
+        )
+
+    def _en_paralelo(self, operacion):
+        """
+        Ejecutar `operacion` OPERACIONES veces en cada hilo, todos a la vez.
+        Retorna cuántas veces devolvió True.
+        """
+        exitos = [0] * self.HILOS
+        barrera = threading.Barrier(self.HILOS)
+
+        def trabajar(indice):
+            try:
+                barrera.wait()
+                for _ in range(self.OPERACIONES):
+                    try:
+                        exitos[indice] += bool(operacion())
+                    except OperationalError:
+                        # SQLite rechaza la escritura si otro hilo tiene la base bloqueada
+                        pass
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=trabajar, args=(i,)) for i in range(self.HILOS)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        return sum(exitos)
+
+    def test_descontar_creditos(self):
+        saldo = self.HILOS * self.OPERACIONES // 2
+        Wallet.objects.filter(user=self.usuario).update(creditos_disponibles=saldo, creditos_gastados_total=0)
+        wallet_id = Wallet.objects.get(user=self.usuario).pk
+
+        descontados = self._en_paralelo(lambda: Wallet(pk=wallet_id).descontar_creditos(1))
+
+        wallet = Wallet.objects.get(pk=wallet_id)
+        self.assertGreater(descontados, 0)
+        self.assertLessEqual(descontados, saldo)
+        self.assertGreaterEqual(wallet.creditos_disponibles, 0)
+        self.assertEqual(wallet.creditos_disponibles, saldo - descontados)
+        self.assertEqual(wallet.creditos_gastados_total, descontados)
+
+    def test_usar_tirada(self):
+        tipo = TipoSuscripcion.objects.create(
+            nombre='Prueba', descripcion='Tipo de prueba', precio_mensual=Decimal('1000'),
+            tiradas_incluidas=self.HILOS * self.OPERACIONES // 2
+        )
+        ahora = timezone.now()
+        suscripcion_id = Suscripcion.objects.create(
+            user=self.usuario, tipo_suscripcion=tipo,
+            fecha_inicio=ahora - timedelta(days=1), fecha_fin=ahora + timedelta(days=29)
+        ).pk
+
+        usadas = self._en_paralelo(
+            lambda: Suscripcion.objects.select_related('tipo_suscripcion').get(pk=suscripcion_id).usar_tirada()
+        )
+
+        suscripcion = Suscripcion.objects.get(pk=suscripcion_id)
+        self.assertGreater(usadas, 0)
+        self.assertLessEqual(suscripcion.tiradas_usadas, tipo.tiradas_incluidas)
+        self.assertEqual(suscripcion.tiradas_usadas, usadas)
@@ -0,0 +1,138 @@
+"""
+Tienda de créditos por país: paquetes activos con los botones de pago
+disponibles en cada país.
+
+Se arma con un número fijo de queries sin importar cuántos paquetes haya
+(paquetes + botones con su método de pago en un prefetch) y el resultado se
+guarda en el cache de Django por país. Las señales de billing/signals.py
+cambian la versión de la tienda al editar paquetes, botones o métodos de
+pago, con lo que las entradas anteriores dejan de usarse. La versión vive
+en el cache compartido por todos los procesos (core/versiones.py).
+
+La disponibilidad por país se resuelve con un índice país → ids de métodos
+de pago activos (metodos_por_pais), calculado una vez a partir de
+MetodoPago.paises_soportados y reconstruido cada vez que se guarda un
+método de pago. Así cada botón se resuelve con una búsqueda en un conjunto
+de ids en vez de recorrer la lista JSON de su método en cada consulta.
+"""
+from django.core.cache import cache
+from django.db.models import Prefetch
+
+from core.versiones import VersionCompartida
+
+from .models import MetodoPago, PaqueteCreditos, BotonPago
+from .serializers import PaqueteCreditosSerializer, BotonPagoSerializer
+
+TIENDA_VERSION_KEY = 'billing:tienda:version'
+TIENDA_TIMEOUT = 60 * 60
+PAIS_GLOBAL = 'GLOBAL'
+
+_version = VersionCompartida(TIENDA_VERSION_KEY)
+
+
+def version_tienda():
+    """
+    Versión actual de la tienda
+    """
+    return _version.obtener()
+
+
+def invalidar_tienda():
+    """
+    Marcar la tienda como modificada
+    """
+    _version.cambiar()
+
+
+def _clave_metodos_por_pais(version):
+    return f'billing:metodos_por_pais:{version}'
+
+
+def reconstruir_metodos_por_pais():
+    """
+    Recalcular el índice país → ids de métodos de pago activos y guardarlo en el cache
+    """
+    indice = {}
+    for metodo_id, paises in MetodoPago.objects.filter(activo=True).values_list('id', 'paises_soportados'):
+        for pais in paises or []:
+            indice.setdefault(pais, set()).add(metodo_id)
+    indice = {pais: frozenset(ids) for pais, ids in indice.items()}
+
+    cache.set(_clave_metodos_por_pais(version_tienda()), indice, timeout=TIENDA_TIMEOUT)
+    return indice
+
+
+def metodos_por_pais():
+    """
+    Índice país → ids de métodos de pago activos, tal como aparecen en paises_soportados
+    """
+    indice = cache.get(_clave_metodos_por_pais(version_tienda()))
+    if indice is None:
+        indice = reconstruir_metodos_por_pais()
+    return indice
+
+
+def metodos_para_pais(codigo_pais):
+    """
+    Ids de los métodos de pago activos que se pueden usar en el país
+    (los que lo listan explícitamente y los GLOBAL)
+    """
+    indice = metodos_por_pais()
+    return indice.get(PAIS_GLOBAL, frozenset()) | indice.get(codigo_pais, frozenset())
+
+
+def boton_disponible_para_pais(boton, codigo_pais):
+    """
+    Verificar con el índice si el botón se puede usar en el país
+    """
+    return boton.activo and boton.metodo_pago_id in metodos_para_pais(codigo_pais)
+
+
+def paquetes_activos():
+    """
+    Paquetes activos con todos sus botones y métodos de pago precargados
+    """
+    return PaqueteCreditos.objects.filter(activo=True).order_by('precio').prefetch_related(
+        Prefetch('botones_pago', queryset=BotonPago.objects.select_related('metodo_pago'))
+    )
+
+
+def botones_para_pais(paquete, metodos_pais):
+    """
+    Botones del paquete cuyos métodos están en metodos_pais (ver metodos_para_pais),
+    sin queries si los botones vienen precargados (ver paquetes_activos)
+    """
+    return [
+        boton for boton in paquete.botones_pago.all()
+        if boton.activo and boton.metodo_pago_id in metodos_pais
+    ]
+
+
+def construir_tienda(codigo_pais):
+    """
+    Todos los paquetes activos, en orden de precio, con sus botones para el país
+    """
+    metodos_pais = metodos_para_pais(codigo_pais)
+    return [
+        {
+            'paquete': PaqueteCreditosSerializer(paquete).data,
+            'botones_disponibles': BotonPagoSerializer(botones_para_pais(paquete, metodos_pais), many=True).data,
+        }
+        for paquete in paquetes_activos()
+    ]
+
+
+def obtener_tienda(codigo_pais):
+    """
+    Tienda del país desde el cache, construyéndola si no está
+    """
+    # Solo se cachean códigos razonables; cualquier otro valor se calcula sin cache
+    if not (codigo_pais.isalnum() and len(codigo_pais) <= 10):
+        return construir_tienda(codigo_pais)
+
+    clave = f'billing:tienda:{version_tienda()}:{codigo_pais}'
+    tienda = cache.get(clave)
+    if tienda is None:
+        tienda = construir_tienda(codigo_pais)
+        cache.set(clave, tienda, timeout=TIENDA_TIMEOUT)
+    return tienda
@@ -34,6 +34,7 @@ urlpatterns = [
     
     # Historial y consultas
     path('mi-historial-consultas/', views.mi_historial_consultas, name='mi-historial-consultas'),
+    path('mi-historial-consultas/<int:pk>/', views.mi_historial_consulta_detalle, name='mi-historial-consulta-detalle'),
     path('procesar-consulta-tarot/', views.procesar_consulta_tarot, name='procesar-consulta-tarot'),
     
     # Estadísticas y resúmenes
@@ -2,9 +2,9 @@ from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import api_view, permission_classes, action
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
+from django.http import Http404
 from django.utils import timezone
 from django.db import transaction
-from django.db import models
 import uuid
 import logging
 from urllib.parse import urlencode
@@ -18,13 +18,19 @@ from .serializers import (
     BotonPagoSerializer, TipoSuscripcionSerializer, WalletSerializer,
     SuscripcionSerializer, TransaccionCreditosSerializer, HistorialConsultasSerializer,
     ComprarCreditosSerializer, SuscribirseSerializer, EstadisticasUsuarioSerializer,
-    ResumenBillingSerializer
+    ResumenBillingSerializer, HistorialConsultasResumenSerializer
 )
+from core.campos import CamposDinamicosViewSetMixin, optimizar_queryset, pide_campos
+
+from .cartas_historial import compactar_cartas
+from .movimientos import registrar_movimiento, clave_pago
+from .paginacion import respuesta_paginada
+from .tienda import obtener_tienda, boton_disponible_para_pais
 
 logger = logging.getLogger(__name__)
 
 
-class MetodoPagoViewSet(viewsets.ReadOnlyModelViewSet):
+class MetodoPagoViewSet(CamposDinamicosViewSetMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet para obtener métodos de pago disponibles
     """
@@ -33,7 +39,7 @@ class MetodoPagoViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = [permissions.AllowAny]
 
 
-class PaqueteCreditosViewSet(viewsets.ReadOnlyModelViewSet):
+class PaqueteCreditosViewSet(CamposDinamicosViewSetMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet para obtener paquetes de créditos disponibles
     """
@@ -46,27 +52,13 @@ class PaqueteCreditosViewSet(viewsets.ReadOnlyModelViewSet):
         """
         Obtener paquete con botones de pago filtrados por país
         """
-        paquete = self.get_object()
         pais_usuario = request.GET.get('pais', 'CL')
 
-        # Filtrar botones disponibles para el país
-        botones_disponibles = paquete.botones_pago.filter(
-            activo=True,
-            metodo_pago__activo=True
-        )
-
-        # Filtrar por país soportado
-        botones_filtrados = []
-        for boton in botones_disponibles:
-            if boton.es_disponible_para_pais(pais_usuario):
-                botones_filtrados.append(boton)
+        for entrada in obtener_tienda(pais_usuario):
+            if str(entrada['paquete']['id']) == str(pk):
+                return Response(entrada)
 
-        data = {
-            'paquete': PaqueteCreditosSerializer(paquete).data,
-            'botones_disponibles': BotonPagoSerializer(botones_filtrados, many=True).data
-        }
-
-        return Response(data)
+        raise Http404('No PaqueteCreditos matches the given query.')
 
 
 @api_view(['GET'])
@@ -76,31 +68,14 @@ def paquetes_con_botones(request):
     Obtener todos los paquetes con sus botones de pago filtrados por país
     """
     pais_usuario = request.GET.get('pais', 'CL')
-    paquetes = PaqueteCreditos.objects.filter(activo=True).order_by('precio')
-
-    resultado = []
-    for paquete in paquetes:
-        # Filtrar botones disponibles para el país
-        botones_disponibles = paquete.botones_pago.filter(
-            activo=True,
-            metodo_pago__activo=True
-        )
 
-        botones_filtrados = []
-        for boton in botones_disponibles:
-            if boton.es_disponible_para_pais(pais_usuario):
-                botones_filtrados.append(boton)
-
-        if botones_filtrados:  # Solo incluir paquetes con botones disponibles
-            resultado.append({
-                'paquete': PaqueteCreditosSerializer(paquete).data,
-                'botones_disponibles': BotonPagoSerializer(botones_filtrados, many=True).data
-            })
+    # Solo incluir paquetes con botones disponibles
+    resultado = [entrada for entrada in obtener_tienda(pais_usuario) if entrada['botones_disponibles']]
 
     return Response(resultado)
 
 
-class TipoSuscripcionViewSet(viewsets.ReadOnlyModelViewSet):
+class TipoSuscripcionViewSet(CamposDinamicosViewSetMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet para obtener tipos de suscripción disponibles
     """
@@ -144,19 +119,64 @@ def mis_transacciones(request):
     """
     Obtener historial de transacciones de créditos del usuario
     """
-    transacciones = TransaccionCreditos.objects.filter(user=request.user)[:20]
-    serializer = TransaccionCreditosSerializer(transacciones, many=True)
-    return Response(serializer.data)
+    contexto = {'request': request}
+    transacciones = TransaccionCreditos.objects.filter(user=request.user).select_related('user', 'paquete_creditos')
+    if pide_campos(request):
+        transacciones = optimizar_queryset(
+            transacciones, TransaccionCreditosSerializer(context=contexto), 'created_at'
+        )
+
+    return respuesta_paginada(
+        request, transacciones,
+        lambda pagina: TransaccionCreditosSerializer(pagina, many=True, context=contexto).data
+    )
+
+
+def historial_resumido(queryset):
+    """
+    Historial sin la interpretación ni el JSON de cartas: el serializer
+    resumen usa interpretacion_preview, guardado sin comprimir
+    """
+    return queryset.defer('interpretacion', 'cartas_resultado')
 
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def mi_historial_consultas(request):
     """
-    Obtener historial de consultas del usuario
+    Obtener historial de consultas del usuario; con ?cursor= o ?limite= se
+    pagina por cursor (ver billing/paginacion.py). Con ?vista=resumen se omiten interpretación y cartas (ver mi_historial_consulta_detalle);
+    ?fields= permite elegir las columnas también en la vista completa
+    """
+    contexto = {'request': request}
+    consultas = HistorialConsultas.objects.filter(user=request.user)
+
+    if request.GET.get('vista') == 'resumen':
+        consultas = historial_resumido(consultas)
+        serializer_class = HistorialConsultasResumenSerializer
+    else:
+        consultas = consultas.select_related('user')
+        if pide_campos(request):
+            consultas = optimizar_queryset(consultas, HistorialConsultasSerializer(context=contexto), 'created_at')
+        serializer_class = HistorialConsultasSerializer
+
+    return respuesta_paginada(
+        request, consultas, lambda pagina: serializer_class(pagina, many=True, context=contexto).data
+    )
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def mi_historial_consulta_detalle(request, pk):
+    """
+    Obtener una consulta completa del historial del usuario
     """
-    consultas = HistorialConsultas.objects.filter(user=request.user)[:20]
-    serializer = HistorialConsultasSerializer(consultas, many=True)
+    contexto = {'request': request}
+    consultas = HistorialConsultas.objects.select_related('user')
+    if pide_campos(request):
+        consultas = optimizar_queryset(consultas, HistorialConsultasSerializer(context=contexto))
+    consulta = get_object_or_404(consultas, pk=pk, user=request.user)
+    serializer = HistorialConsultasSerializer(consulta, context=contexto)
     return Response(serializer.data)
 
 
@@ -180,7 +200,7 @@ def generar_url_pago(request):
         boton_pago = get_object_or_404(BotonPago, id=boton_pago_id, paquete=paquete, activo=True)
 
         # Verificar si el botón está disponible para el país del usuario
-        if not boton_pago.es_disponible_para_pais(pais_usuario):
+        if not boton_disponible_para_pais(boton_pago, pais_usuario):
             return Response({
                 'error': 'Método de pago no disponible en tu país'
             }, status=status.HTTP_400_BAD_REQUEST)
@@ -492,24 +512,18 @@ def _crear_pago_desde_paypal_success(payment_ref, request):
                 }
             )
 
-            # Obtener o crear wallet
-            wallet, wallet_created = Wallet.objects.get_or_create(user=request.user)
-
-            # Agregar créditos
-            creditos_antes = wallet.creditos_disponibles
-            wallet.agregar_creditos(paquete.cantidad_creditos)
-            creditos_despues = wallet.creditos_disponibles
-
-            # Crear registro de transacción
-            TransaccionCreditos.objects.create(
-                user=request.user,
-                tipo='compra',
-                cantidad=paquete.cantidad_creditos,
-                descripcion=f'Compra vía PayPal (auto-creado) - Ref: {payment_ref}',
-                paquete_creditos=paquete
+            # Agregar créditos y registrar la transacción
+            transaccion, _ = registrar_movimiento(
+                request.user,
+                'compra',
+                paquete.cantidad_creditos,
+                f'Compra vía PayPal (auto-creado) - Ref: {payment_ref}',
+                paquete_creditos=paquete,
+                clave_idempotencia=clave_pago(pago)
             )
+            wallet = Wallet.objects.get(user=request.user)
 
-            logger.info(f"✅ Pago creado exitosamente: {payment_ref} | Usuario: {request.user.email} | Créditos: {creditos_antes} → {creditos_despues}")
+            logger.info(f"✅ Pago creado exitosamente: {payment_ref} | Usuario: {request.user.email} | Créditos: {transaccion.saldo_resultante}")
 
             return Response({
                 'success': True,
@@ -555,35 +569,23 @@ def _procesar_pago_completado(pago):
             pago.estado = 'completado'
             pago.save()
 
-            # Obtener o crear wallet
-            wallet, created = Wallet.objects.get_or_create(user=pago.user)
-            creditos_antes = wallet.creditos_disponibles
-
-            # Agregar créditos
-            wallet.agregar_creditos(pago.paquete_creditos.cantidad_creditos)
-            creditos_despues = wallet.creditos_disponibles
-
-            # Crear transacción (verificar que no exista)
-            transaccion_existente = TransaccionCreditos.objects.filter(
-                user=pago.user,
-                tipo='compra',
+            # Agregar créditos y registrar la transacción; la clave del pago evita
+            # acreditarlo dos veces si llega por más de un camino
+            transaccion, creada = registrar_movimiento(
+                pago.user,
+                'compra',
+                pago.paquete_creditos.cantidad_creditos,
+                f'Compra de {pago.paquete_creditos.nombre} vía {pago.metodo_pago} - Ref: {pago.referencia_externa}',
                 paquete_creditos=pago.paquete_creditos,
-                descripcion__icontains=pago.referencia_externa
-            ).first()
-
-            if not transaccion_existente:
-                TransaccionCreditos.objects.create(
-                    user=pago.user,
-                    tipo='compra',
-                    cantidad=pago.paquete_creditos.cantidad_creditos,
-                    descripcion=f'Compra de {pago.paquete_creditos.nombre} vía {pago.metodo_pago} - Ref: {pago.referencia_externa}',
-                    paquete_creditos=pago.paquete_creditos
-                )
+                clave_idempotencia=clave_pago(pago)
+            )
+
+            if creada:
                 logger.info(f"📝 Transacción registrada para {pago.referencia_externa}")
             else:
                 logger.info(f"ℹ️ Transacción ya existía para {pago.referencia_externa}")
 
-            logger.info(f"✅ Pago {pago.referencia_externa} completado | Usuario: {pago.user.email} | Créditos: {creditos_antes} → {creditos_despues}")
+            logger.info(f"✅ Pago {pago.referencia_externa} completado | Usuario: {pago.user.email} | Créditos: {transaccion.saldo_resultante}")
 
     except Exception as e:
         logger.error(f"💥 Error procesando pago completado {pago.referencia_externa}: {str(e)}")
@@ -698,17 +700,13 @@ def estadisticas_usuario(request):
     ).first()
 
     total_consultas = HistorialConsultas.objects.filter(user=user).count()
-    creditos_gastados = TransaccionCreditos.objects.filter(
-        user=user,
-        tipo='uso'
-    ).aggregate(total=models.Sum('cantidad'))['total'] or 0
 
     data = {
         'creditos_disponibles': wallet.creditos_disponibles,
         'suscripcion_activa': suscripcion_activa.esta_activa() if suscripcion_activa else False,
         'tiradas_disponibles_suscripcion': suscripcion_activa.tiradas_disponibles() if suscripcion_activa else 0,
         'total_consultas': total_consultas,
-        'creditos_gastados_total': creditos_gastados
+        'creditos_gastados_total': wallet.creditos_gastados_total
     }
 
     serializer = EstadisticasUsuarioSerializer(data)
@@ -755,6 +753,7 @@ def procesar_consulta_tarot(request):
     pregunta = request.data.get('pregunta', '')
     interpretacion = request.data.get('interpretacion', '')
     cartas_resultado = request.data.get('cartas_resultado', [])
+    semilla_sorteo = request.data.get('semilla_sorteo')
 
     user = request.user
     wallet, created = Wallet.objects.get_or_create(user=user)
@@ -763,38 +762,35 @@ def procesar_consulta_tarot(request):
     suscripcion_activa = Suscripcion.objects.filter(
         user=user,
         estado='activa'
-    ).first()
+    ).select_related('tipo_suscripcion').first()
 
     uso_suscripcion = False
 
     try:
         with transaction.atomic():
-            if suscripcion_activa and suscripcion_activa.tiradas_disponibles() > 0:
-                if suscripcion_activa.usar_tirada():
-                    uso_suscripcion = True
-                    costo_final = 0
-                    print(">>> [DEBUG] Usando tirada de suscripción")
-                else:
-                    return Response({
-                        'error': 'Error usando tirada de suscripción'
-                    }, status=status.HTTP_400_BAD_REQUEST)
+            # Vigencia y cupo se verifican en el mismo UPDATE que consume la tirada;
+            # si otra consulta usó la última, se cobra en créditos
+            if suscripcion_activa and suscripcion_activa.usar_tirada():
+                uso_suscripcion = True
+                costo_final = 0
+                print(">>> [DEBUG] Usando tirada de suscripción")
             else:
-                if not wallet.tiene_creditos_suficientes(costo_creditos):
+                # El saldo se verifica y descuenta en el mismo UPDATE
+                transaccion, _ = registrar_movimiento(
+                    user,
+                    'uso',
+                    costo_creditos,
+                    f'Consulta de tarot - {tirada_info.get("nombre", "Tirada")}'
+                )
+                if transaccion is None:
                     print(">>> [DEBUG] Créditos insuficientes")
                     return Response({
                         'error': 'Créditos insuficientes'
                     }, status=status.HTTP_400_BAD_REQUEST)
 
-                wallet.descontar_creditos(costo_creditos)
+                wallet.refresh_from_db()
                 print(">>> [DEBUG] Créditos después: ", wallet.creditos_disponibles)
                 costo_final = costo_creditos
-
-                TransaccionCreditos.objects.create(
-                    user=user,
-                    tipo='uso',
-                    cantidad=costo_creditos,
-                    descripcion=f'Consulta de tarot - {tirada_info.get("nombre", "Tirada")}'
-                )
                 print(">>> [DEBUG] Transacción registrada")
 
             HistorialConsultas.objects.create(
@@ -805,7 +801,13 @@ def procesar_consulta_tarot(request):
                 costo_creditos=costo_final,
                 uso_suscripcion=uso_suscripcion,
                 interpretacion=interpretacion,
-                cartas_resultado=cartas_resultado
+                cartas_resultado=compactar_cartas(
+                    cartas_resultado,
+                    tirada_info.get('id'),
+                    tirada_info.get('nombre', ''),
+                    tirada_info.get('mazo_nombre', ''),
+                    semilla=semilla_sorteo
+                )
             )
 
             print(">>> [DEBUG] Consulta registrada en historial")
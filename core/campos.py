@@ -0,0 +1,198 @@
+"""
+Campos dispersos (sparse fieldsets) para los serializers de la API.
+
+- ?fields=id,nombre,mazos.nombre  limita la respuesta a esos campos; la
+  notación con punto limita los serializers anidados. Sin ?fields= se
+  entregan todos los campos, como siempre.
+- ?expand=mazo  reemplaza el id de una FK por el objeto serializado, para
+  los campos declarados en Meta.expandibles del serializer.
+
+optimizar_queryset traduce los campos que quedaron en el serializer a
+.only() / select_related() / Prefetch, así las columnas pesadas
+(significados, descripciones, interpretaciones) tampoco salen de la base
+de datos cuando no se piden.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+
+
+def parsear_campos(valor):
+    """
+    'a,b.c,b.d' -> {'a': {}, 'b': {'c': {}, 'd': {}}}; None si no se pidió nada
+    """
+    if not valor:
+        return None
+    arbol = {}
+    for ruta in valor.split(','):
+        nodo = arbol
+        for parte in ruta.strip().split('.'):
+            if parte:
+                nodo = nodo.setdefault(parte, {})
+    return arbol or None
+
+
+class CamposDinamicosMixin:
+    """
+    Mixin para ModelSerializer: aplica ?fields= y ?expand= del request del
+    contexto (o los argumentos `campos` / `expandir`, con el formato de
+    parsear_campos) al construir el serializer raíz.
+
+    Los serializers pueden declarar en Meta:
+        expandibles = {'mazo': MazoSerializer}
+    """
+
+    def __init__(self, *args, campos=None, expandir=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is not None and campos is None and expandir is None:
+            parametros = getattr(request, 'query_params', request.GET)
+            campos = parsear_campos(parametros.get('fields'))
+            expandir = parsear_campos(parametros.get('expand'))
+        if campos or expandir:
+            self.restringir_campos(campos, expandir)
+
+    def restringir_campos(self, campos, expandir=None):
+        expandir = expandir or {}
+        expandibles = getattr(self.Meta, 'expandibles', {})
+
+        for nombre, subexpandir in expandir.items():
+            if nombre not in expandibles:
+                raise ValidationError({'expand': f"'{nombre}' no se puede expandir"})
+            self.fields[nombre] = expandibles[nombre](read_only=True, campos=(campos or {}).get(nombre) or None,
+                                                      expandir=subexpandir or None)
+
+        if campos:
+            desconocidos = set(campos) - set(self.fields)
+            if desconocidos:
+                raise ValidationError({'fields': f"Campos desconocidos: {', '.join(sorted(desconocidos))}"})
+            for nombre in set(self.fields) - set(campos) - set(expandir):
+                self.fields.pop(nombre)
+
+        # Propagar la selección a los serializers anidados que no se expandieron recién
+        for nombre, campo in self.fields.items():
+            if nombre in expandir:
+                continue
+            hijo = campo.child if isinstance(campo, serializers.ListSerializer) else campo
+            subcampos = (campos or {}).get(nombre)
+            if subcampos and isinstance(hijo, CamposDinamicosMixin):
+                hijo.restringir_campos(subcampos)
+
+
+def _es_columna(modelo, partes):
+    """
+    True si la ruta (por ejemplo ['metodo_pago', 'nombre']) llega a una columna
+    """
+    for parte in partes:
+        try:
+            campo = modelo._meta.get_field(parte)
+        except FieldDoesNotExist:
+            return False
+        if campo.one_to_many or campo.many_to_many:
+            return False
+        modelo = campo.related_model
+    return True
+
+
+def _plan(serializer, modelo):
+    """
+    (only, select_related, prefetch) que necesita el serializer para `modelo`.
+    only es None si algún campo no sale directo de una columna (propiedades,
+    SerializerMethodField, anotaciones): en ese caso se cargan todas.
+    """
+    if isinstance(serializer, serializers.ListSerializer):
+        serializer = serializer.child
+
+    only = {modelo._meta.pk.name}
+    select = set()
+    prefetch = []
+    for campo in serializer.fields.values():
+        if campo.source == '*':
+            only = None
+            continue
+        partes = campo.source.split('.')
+        try:
+            campo_modelo = modelo._meta.get_field(partes[0])
+        except FieldDoesNotExist:
+            only = None
+            continue
+
+        if campo_modelo.one_to_many or campo_modelo.many_to_many:
+            # Relación inversa serializada en lista: su propio queryset en un Prefetch
+            relacionado = campo_modelo.related_model
+            sub_only, sub_select, sub_prefetch = _plan(campo, relacionado)
+            queryset = relacionado._default_manager.select_related(*sub_select).prefetch_related(*sub_prefetch)
+            if sub_only is not None:
+                if campo_modelo.one_to_many:
+                    sub_only.add(campo_modelo.field.name)
+                queryset = queryset.only(*sub_only)
+            lookup = campo_modelo.get_accessor_name() if campo_modelo.auto_created else campo_modelo.name
+            prefetch.append(Prefetch(lookup, queryset=queryset))
+            continue
+
+        if not campo_modelo.is_relation:
+            if only is not None:
+                only.add(campo_modelo.name)
+            continue
+
+        # FK: solo el id, una columna del relacionado o el objeto anidado
+        if only is not None:
+            only.add(campo_modelo.name)
+        if isinstance(campo, serializers.BaseSerializer):
+            sub_only, sub_select, sub_prefetch = _plan(campo, campo_modelo.related_model)
+            select.add(campo_modelo.name)
+            select.update(f'{campo_modelo.name}__{s}' for s in sub_select)
+            if only is not None:
+                if sub_only is None or sub_prefetch:
+                    only = None
+                else:
+                    only.update(f'{campo_modelo.name}__{s}' for s in sub_only)
+        elif len(partes) > 1:
+            select.add('__'.join(partes[:-1]))
+            if only is not None:
+                if _es_columna(campo_modelo.related_model, partes[1:]):
+                    only.update('__'.join(partes[:i]) for i in range(2, len(partes) + 1))
+                else:
+                    only = None
+
+    return only, select, prefetch
+
+
+def optimizar_queryset(queryset, serializer, *requeridos):
+    """
+    Reducir el queryset a lo que usa el serializer (ya restringido) más las
+    columnas `requeridos` (por ejemplo las del cursor de paginación).
+    Reemplaza select_related / prefetch_related previos del queryset.
+    """
+    only, select, prefetch = _plan(serializer, queryset.model)
+    if only is not None:
+        only.update(requeridos)
+    queryset = queryset.select_related(None).prefetch_related(None)
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    if only is not None:
+        queryset = queryset.only(*only)
+    return queryset
+
+
+def pide_campos(request):
+    """
+    True si el request restringe o expande campos
+    """
+    return bool(request.GET.get('fields') or request.GET.get('expand'))
+
+
+class CamposDinamicosViewSetMixin:
+    """
+    Mixin para ViewSets: con ?fields= / ?expand= el queryset se reduce a
+    las columnas y relaciones del serializer restringido
+    """
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if pide_campos(self.request):
+            queryset = optimizar_queryset(queryset, self.get_serializer())
+        return queryset
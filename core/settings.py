@@ -240,6 +240,97 @@ AUTH_USER_MODEL = 'users.CustomUser'
 
 GEMINI_API_KEY = config('GEMINI_API_KEY')
 
+# Protecciones de las llamadas a Gemini (ver oraculoApi/resiliencia.py)
+GEMINI_LIMITES = {
+    # Llamadas simultáneas por proceso y segundos máximos esperando un cupo
+    'MAX_CONCURRENCIA': config('GEMINI_MAX_CONCURRENCIA', default=8, cast=int),
+    'ESPERA_MAX': config('GEMINI_ESPERA_MAX', default=5, cast=float),
+    # Segundos máximos por llamada
+    'DEADLINE': config('GEMINI_DEADLINE', default=30, cast=float),
+    # Fallos/timeouts seguidos que abren el circuito y segundos que permanece abierto
+    'UMBRAL_FALLOS': config('GEMINI_UMBRAL_FALLOS', default=5, cast=int),
+    'TIEMPO_APERTURA': config('GEMINI_TIEMPO_APERTURA', default=30, cast=float),
+}
+
+# ==========================================
+# CACHE
+# ==========================================
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Interpretaciones reutilizables (ver oraculoApi/cache_interpretaciones.py).
+    # locmem desaloja por LRU al llegar a MAX_ENTRIES
+    'interpretaciones': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'interpretaciones',
+        'OPTIONS': {
+            'MAX_ENTRIES': config('CACHE_INTERPRETACIONES_MAX', default=5000, cast=int),
+        },
+    },
+    # Versiones que invalidan los caches de cada proceso (ver core/versiones.py);
+    # debe ser un backend compartido por todos los workers, no locmem
+    'versiones': {
+        'BACKEND': config('CACHE_VERSIONES_BACKEND', default='django.core.cache.backends.db.DatabaseCache'),
+        'LOCATION': config('CACHE_VERSIONES_LOCATION', default='cache_versiones'),
+    },
+}
+
+VERSIONES_CACHE = 'versiones'
+# Segundos que cada proceso reutiliza una versión leída antes de volver a consultarla
+VERSIONES_REFRESCO = config('VERSIONES_REFRESCO', default=1.0, cast=float)
+
+ORACULO_CACHE_INTERPRETACIONES = {
+    'ACTIVO': config('CACHE_INTERPRETACIONES', default=False, cast=bool),
+    'ALIAS': 'interpretaciones',
+    'TTL': config('CACHE_INTERPRETACIONES_TTL', default=60 * 60 * 24 * 7, cast=int),
+    # Política por defecto: reutilizar solo en tiradas de hasta MAX_CARTAS cartas
+    'MAX_CARTAS': 1,
+    # Excepciones {id: True/False}; la de la tirada gana sobre la del mazo
+    'MAZOS': {},
+    'TIRADAS': {},
+    # USD por 1M tokens de gemini-2.0-flash-lite, para estimar el costo ahorrado
+    'PRECIO_ENTRADA_1M': 0.075,
+    'PRECIO_SALIDA_1M': 0.30,
+}
+
+# Cache HTTP de los endpoints del catálogo (ETag desde la versión
+# del catálogo, ver oraculoApi/catalogo.py). Pasado MAX_AGE el cliente revalida
+# con If-None-Match y recibe 304 si el catálogo no cambió
+ORACULO_CATALOGO_MAX_AGE = config('CATALOGO_MAX_AGE', default=60, cast=int)
+
+# ==========================================
+# CLIENTE DE API INTERNO (appWeb)
+# ==========================================
+
+# 'local': las vistas web llaman a la API en el mismo proceso (sin red)
+# 'http': llamadas HTTP reales a API_BASE_URL (web y API desplegadas por separado)
+API_CLIENT_MODE = config('API_CLIENT_MODE', default='local')
+API_BASE_URL = config('API_BASE_URL', default='https://www.tarotnautica.store/api')
+API_LOCAL_PREFIX = '/api'
+
+# Solo para modo 'http': pool de conexiones keep-alive compartido por proceso
+API_CLIENT_POOL = {
+    'connections': config('API_CLIENT_POOL_CONNECTIONS', default=10, cast=int),
+    'maxsize': config('API_CLIENT_POOL_MAXSIZE', default=20, cast=int),
+}
+# Reintentos con backoff, aplicados solo a GET
+API_CLIENT_RETRIES = {
+    'total': config('API_CLIENT_RETRIES', default=2, cast=int),
+    'backoff_factor': 0.3,
+    'status_forcelist': (502, 503, 504),
+}
+# Timeouts (connect, read) en segundos; se usa el prefijo de endpoint más largo que coincida
+API_CLIENT_TIMEOUTS = {
+    'default': (3.05, 10),
+    '/oraculo/consulta-tarot/': (3.05, 60),
+}
+# Threads para APIClient.gather() (llamadas GET independientes en paralelo)
+API_CLIENT_GATHER_WORKERS = config('API_CLIENT_GATHER_WORKERS', default=8, cast=int)
+# Respuestas GET con ETag que se guardan por proceso para revalidarlas
+API_CLIENT_VALIDADORES_MAX = config('API_CLIENT_VALIDADORES_MAX', default=256, cast=int)
+
 # ==========================================
 # EMAIL
 # ==========================================
@@ -0,0 +1,77 @@
+"""
+Versiones compartidas por todos los procesos.
+
+Los caches en memoria de cada worker (snapshot del catálogo, tienda por
+país, diccionario de compresión activo) se invalidan cambiando una versión.
+Para que una edición hecha en un worker llegue a los demás, la versión vive
+en el alias de cache settings.VERSIONES_CACHE (por defecto DatabaseCache,
+cuya tabla crea la migración oraculoApi 0004; en producción puede apuntar
+a memcached o redis).
+
+Cada proceso recuerda el valor leído durante settings.VERSIONES_REFRESCO
+segundos, así la mayoría de las lecturas no consultan el backend: un cambio
+tarda a lo sumo eso en verse en los demás workers. En el proceso que hace
+el cambio se ve de inmediato.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+def token_tiempo():
+    # Un token único (no un contador): si la clave se pierde del cache, la
+    # versión nueva nunca coincide con una anterior y nada queda desactualizado
+    return str(time.time_ns())
+
+
+class VersionCompartida:
+    """
+    Valor guardado en el cache compartido bajo `clave`; `inicial` calcula el
+    valor cuando la clave no existe
+    """
+
+    def __init__(self, clave, inicial=token_tiempo):
+        self.clave = clave
+        self.inicial = inicial
+        self._local = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _cache():
+        return caches[settings.VERSIONES_CACHE]
+
+    def _recordar(self, valor):
+        self._local = (valor, time.monotonic() + settings.VERSIONES_REFRESCO)
+        return valor
+
+    def obtener(self):
+        """
+        Valor actual
+        """
+        local = self._local
+        if local is not None and time.monotonic() < local[1]:
+            return local[0]
+
+        cache = self._cache()
+        valor = cache.get(self.clave)
+        if valor is None:
+            with self._lock:
+                cache.add(self.clave, self.inicial(), timeout=None)
+                valor = cache.get(self.clave)
+        return self._recordar(valor)
+
+    def cambiar(self, valor=None):
+        """
+        Guardar un valor nuevo (por defecto un token nuevo) para todos los procesos
+        """
+        valor = token_tiempo() if valor is None else valor
+        self._cache().set(self.clave, valor, timeout=None)
+        return self._recordar(valor)
+
+    def olvidar(self):
+        """
+        Descartar el valor recordado por este proceso
+        """
+        self._local = None
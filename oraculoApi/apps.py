@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class OraculoapiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'oraculoApi'
+
+    def ready(self):
+        import oraculoApi.signals
@@ -0,0 +1,142 @@
+"""
+Cache de interpretaciones para lecturas idénticas.
+
+Dos consultas con el mismo mazo, tirada, cartas (en el mismo orden y con la
+misma orientación) y la misma temática de pregunta producen prácticamente la
+misma interpretación; con el cache activo la segunda no llama a Gemini.
+
+La clave es un hash de esas entradas normalizadas más el modelo y la versión
+del catálogo, así que editar una carta o cambiar de modelo deja de usar las
+interpretaciones anteriores. Se guarda en el alias de cache de Django
+configurado (ORACULO_CACHE_INTERPRETACIONES['ALIAS']): el TTL es el timeout de
+cada entrada y el backend se encarga del desalojo (locmem desaloja por LRU al
+llegar a MAX_ENTRIES; file y db eliminan entradas al azar al superarlo).
+
+Que una tirada pueda reutilizar interpretaciones es una política por mazo y
+por tirada (ver reutilizable()).
+"""
+import hashlib
+import json
+import logging
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .catalogo import version_catalogo
+
+logger = logging.getLogger(__name__)
+
+_PREFIJO = 'oraculo:interpretacion:'
+_CONTADORES = ('hits', 'misses', 'tokens_entrada_ahorrados', 'tokens_salida_ahorrados')
+
+
+def _config():
+    return settings.ORACULO_CACHE_INTERPRETACIONES
+
+
+def _cache():
+    return caches[_config()['ALIAS']]
+
+
+def _estimar_tokens(texto):
+    # Misma estimación que usa GeminiService en sus logs
+    return len(texto) // 4
+
+
+def reutilizable(mazo, tirada):
+    """
+    Si una interpretación guardada es aceptable para esta tirada.
+    Prioridad: política de la tirada, luego la del mazo, y si ninguna está
+    definida, solo las tiradas de hasta MAX_CARTAS cartas.
+    """
+    config = _config()
+    if not config['ACTIVO']:
+        return False
+    if tirada.id in config['TIRADAS']:
+        return config['TIRADAS'][tirada.id]
+    if mazo.id in config['MAZOS']:
+        return config['MAZOS'][mazo.id]
+    return tirada.cantidad_cartas <= config['MAX_CARTAS']
+
+
+def clave_lectura(modelo, mazo, tirada, cartas_resultado, categoria):
+    """
+    Clave del cache para una lectura, o None si la política no permite
+    reutilizar interpretaciones en esta tirada
+    """
+    if not reutilizable(mazo, tirada):
+        return None
+
+    lectura = {
+        'modelo': modelo,
+        'catalogo': version_catalogo(),
+        'mazo': mazo.id,
+        'tirada': tirada.id,
+        'cartas': [[c['carta']['id'], c['es_invertida']] for c in cartas_resultado],
+        'categoria': categoria,
+    }
+    normalizada = json.dumps(lectura, sort_keys=True, separators=(',', ':'))
+    return _PREFIJO + hashlib.sha256(normalizada.encode('utf-8')).hexdigest()
+
+
+def _incrementar(cache, contador, cantidad=1):
+    clave = _PREFIJO + contador
+    cache.add(clave, 0, timeout=None)
+    try:
+        cache.incr(clave, cantidad)
+    except ValueError:
+        # La clave se desalojó entre add() e incr()
+        cache.set(clave, cantidad, timeout=None)
+
+
+def obtener(clave):
+    """
+    Interpretación guardada para la clave, o None. Actualiza los contadores.
+    """
+    if clave is None:
+        return None
+
+    cache = _cache()
+    entrada = cache.get(clave)
+    if entrada is None:
+        _incrementar(cache, 'misses')
+        return None
+
+    _incrementar(cache, 'hits')
+    _incrementar(cache, 'tokens_entrada_ahorrados', entrada['tokens_entrada'])
+    _incrementar(cache, 'tokens_salida_ahorrados', entrada['tokens_salida'])
+    logger.info(f"♻️ Interpretación reutilizada del cache ({entrada['tokens_salida']} tokens ahorrados)")
+    return entrada['interpretacion']
+
+
+def guardar(clave, prompt, interpretacion):
+    """
+    Guardar la interpretación generada para la clave
+    """
+    if clave is None:
+        return
+
+    _cache().set(clave, {
+        'interpretacion': interpretacion,
+        'tokens_entrada': _estimar_tokens(prompt),
+        'tokens_salida': _estimar_tokens(interpretacion),
+    }, timeout=_config()['TTL'])
+
+
+def estadisticas():
+    """
+    Hits, misses, hit rate y costo ahorrado (estimado con los precios del modelo)
+    """
+    config = _config()
+    valores = _cache().get_many([_PREFIJO + contador for contador in _CONTADORES])
+    datos = {contador: valores.get(_PREFIJO + contador, 0) for contador in _CONTADORES}
+
+    consultas = datos['hits'] + datos['misses']
+    datos['hit_rate'] = round(datos['hits'] / consultas, 4) if consultas else 0.0
+    datos['costo_ahorrado_usd'] = round(
+        datos['tokens_entrada_ahorrados'] * config['PRECIO_ENTRADA_1M'] / 1_000_000
+        + datos['tokens_salida_ahorrados'] * config['PRECIO_SALIDA_1M'] / 1_000_000,
+        6
+    )
+    datos['activo'] = config['ACTIVO']
+    return datos
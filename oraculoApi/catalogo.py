@@ -0,0 +1,225 @@
+"""
+Versión del catálogo del oráculo (sets, mazos, cartas, tiradas e items).
+
+El catálogo casi nunca cambia, así que todo lo que se deriva de él (secciones
+de prompt, snapshots, payloads serializados) se puede cachear mientras la
+versión no cambie. Las señales de oraculoApi/signals.py invalidan la versión
+al guardar o borrar cualquier modelo del catálogo.
+
+La versión vive en el cache compartido por todos los procesos
+(core/versiones.py), así una edición hecha en un worker invalida el
+catálogo de todos.
+
+obtener_catalogo() devuelve un snapshot en memoria de todo el catálogo,
+construido una vez por proceso y por versión: una consulta de tarot no hace
+ninguna query al catálogo. Incluye también cada carta y tirada ya serializada,
+para armar las respuestas sin pasar por los serializers en cada consulta.
+Los objetos y dicts del snapshot se comparten entre requests y threads, así
+que son de solo lectura: los payloads serializados se guardan congelados
+(MappingProxyType y tuplas) y carta_serializada() / tirada_serializada()
+entregan una copia que quien la recibe puede modificar.
+
+CatalogoHTTPCacheMixin deriva de la versión el ETag y el Cache-Control de
+los endpoints del catálogo: un GET condicional con el ETag vigente se
+responde con 304 sin ninguna query. La versión es la recordada por el
+proceso, así que otro worker puede seguir respondiendo 304 con la anterior
+durante a lo sumo settings.VERSIONES_REFRESCO segundos. No se envía
+Last-Modified: dos ediciones en el mismo segundo tendrían la misma fecha y
+un If-Modified-Since recibiría un 304 desactualizado.
+"""
+import hashlib
+import threading
+from dataclasses import dataclass
+from types import MappingProxyType
+
+from django.conf import settings
+from django.http import Http404
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+
+from core.versiones import VersionCompartida
+
+from .models import Set, Mazo, Carta, Tirada, ItemDeTirada
+from .serializers import CartaSerializer, TiradaSerializer
+from .sorteo import arreglo_ids
+
+CATALOGO_VERSION_KEY = 'oraculo:catalogo:version'
+
+_version = VersionCompartida(CATALOGO_VERSION_KEY)
+
+
+def version_catalogo():
+    """
+    Versión actual del catálogo
+    """
+    return _version.obtener()
+
+
+def invalidar_catalogo():
+    """
+    Marcar el catálogo como modificado
+    """
+    _version.cambiar()
+
+
+def _etag(request, version):
+    # La misma versión da cuerpos distintos según la URL (?fields=, filtros,
+    # paginación), el host (URLs absolutas de las imágenes) y el formato pedido
+    clave = '\n'.join((
+        version, request.scheme, request.get_host(), request.get_full_path(),
+        request.META.get('HTTP_ACCEPT', ''),
+    ))
+    return '"%s"' % hashlib.sha256(clave.encode()).hexdigest()[:32]
+
+
+def _cabeceras_cache(response, etag):
+    response.headers.setdefault('ETag', etag)
+    patch_cache_control(response, public=True, max_age=settings.ORACULO_CATALOGO_MAX_AGE)
+    patch_vary_headers(response, ('Accept',))
+    return response
+
+
+class CatalogoHTTPCacheMixin:
+    """
+    Mixin para los ViewSets de solo lectura del catálogo: validadores HTTP
+    desde la versión del catálogo. Con un If-None-Match vigente se responde
+    304 antes de autenticar, consultar o serializar.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return super().dispatch(request, *args, **kwargs)
+
+        etag = _etag(request, version_catalogo())
+        response = get_conditional_response(request, etag=etag)
+        if response is not None:
+            return _cabeceras_cache(response, etag)
+
+        response = super().dispatch(request, *args, **kwargs)
+        if response.status_code != 200:
+            return response
+        return _cabeceras_cache(response, etag)
+
+
+def _congelar(valor):
+    if isinstance(valor, dict):
+        return MappingProxyType({clave: _congelar(v) for clave, v in valor.items()})
+    if isinstance(valor, list):
+        return tuple(_congelar(v) for v in valor)
+    return valor
+
+
+def _descongelar(valor):
+    if isinstance(valor, MappingProxyType):
+        return {clave: _descongelar(v) for clave, v in valor.items()}
+    if isinstance(valor, tuple):
+        return [_descongelar(v) for v in valor]
+    return valor
+
+
+@dataclass(frozen=True)
+class CatalogoSnapshot:
+    """
+    Catálogo completo en una versión dada, indexado por id
+    """
+    version: str
+    sets: MappingProxyType
+    mazos: MappingProxyType
+    tiradas: MappingProxyType
+    # mazo_id -> tupla de cartas del mazo
+    cartas_por_mazo: MappingProxyType
+    # mazo_id -> array('q') con los ids de las cartas, ordenados (ver sorteo.py)
+    ids_por_mazo: MappingProxyType
+    # tirada_id -> tupla de items ordenados por 'orden'
+    items_por_tirada: MappingProxyType
+    # id -> CartaSerializer(carta).data / TiradaSerializer(tirada).data, congelados
+    cartas_serializadas: MappingProxyType
+    tiradas_serializadas: MappingProxyType
+
+    def carta_serializada(self, carta_id):
+        """
+        Copia modificable de la carta serializada; None si no existe
+        """
+        carta = self.cartas_serializadas.get(carta_id)
+        return None if carta is None else _descongelar(carta)
+
+    def tirada_serializada(self, tirada_id):
+        """
+        Copia modificable de la tirada serializada (con sus items); None si no existe
+        """
+        tirada = self.tiradas_serializadas.get(tirada_id)
+        return None if tirada is None else _descongelar(tirada)
+
+    def obtener_tirada(self, set_id, mazo_id, tirada_id):
+        """
+        Equivalente a los tres get_object_or_404 de la consulta: la tirada debe
+        ser del mazo y el mazo del set
+
+        Returns:
+            tuple: (set, mazo, tirada)
+        """
+        set_obj = self.sets.get(set_id)
+        if set_obj is None:
+            raise Http404('No Set matches the given query.')
+        mazo = self.mazos.get(mazo_id)
+        if mazo is None or mazo.set_id != set_obj.id:
+            raise Http404('No Mazo matches the given query.')
+        tirada = self.tiradas.get(tirada_id)
+        if tirada is None or tirada.mazo_id != mazo.id:
+            raise Http404('No Tirada matches the given query.')
+        return set_obj, mazo, tirada
+
+
+def _construir_snapshot(version):
+    sets = {s.id: s for s in Set.objects.all()}
+    mazos = {m.id: m for m in Mazo.objects.select_related('set')}
+    tiradas = {t.id: t for t in Tirada.objects.select_related('mazo').prefetch_related('items')}
+
+    cartas_por_mazo = {mazo_id: [] for mazo_id in mazos}
+    for carta in Carta.objects.select_related('mazo'):
+        cartas_por_mazo.setdefault(carta.mazo_id, []).append(carta)
+
+    items_por_tirada = {tirada_id: [] for tirada_id in tiradas}
+    for item in ItemDeTirada.objects.order_by('tirada_id', 'orden'):
+        items_por_tirada.setdefault(item.tirada_id, []).append(item)
+
+    return CatalogoSnapshot(
+        version=version,
+        sets=MappingProxyType(sets),
+        mazos=MappingProxyType(mazos),
+        tiradas=MappingProxyType(tiradas),
+        cartas_por_mazo=MappingProxyType({k: tuple(v) for k, v in cartas_por_mazo.items()}),
+        ids_por_mazo=MappingProxyType({
+            k: arreglo_ids(carta.id for carta in v) for k, v in cartas_por_mazo.items()
+        }),
+        items_por_tirada=MappingProxyType({k: tuple(v) for k, v in items_por_tirada.items()}),
+        cartas_serializadas=MappingProxyType({
+            carta.id: _congelar(CartaSerializer(carta).data)
+            for cartas in cartas_por_mazo.values() for carta in cartas
+        }),
+        tiradas_serializadas=MappingProxyType({
+            tirada.id: _congelar(TiradaSerializer(tirada).data) for tirada in tiradas.values()
+        }),
+    )
+
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+
+def obtener_catalogo():
+    """
+    Snapshot del catálogo para la versión actual; se reconstruye solo cuando
+    la versión cambió
+    """
+    global _snapshot
+    version = version_catalogo()
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.version == version:
+        return snapshot
+
+    with _snapshot_lock:
+        if _snapshot is None or _snapshot.version != version:
+            # La versión se leyó antes de las queries: si el catálogo cambia
+            # mientras se construye, la próxima llamada vuelve a construirlo
+            _snapshot = _construir_snapshot(version)
+        return _snapshot
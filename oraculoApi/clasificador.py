@@ -0,0 +1,189 @@
+"""
+Clasificación de la pregunta del consultante por temática.
+
+Las categorías y sus palabras clave son datos (CATEGORIAS_PREGUNTA): para
+añadir una temática o ampliar una existente basta con editar la tabla, o crear
+un ClasificadorPreguntas propio con otra tabla. Las palabras clave se compilan
+en un único índice palabra -> categoría, así que la pregunta se recorre una
+sola vez sin importar cuántas categorías haya, y al comparar palabras enteras
+'ex' ya no coincide dentro de 'examen' o 'experiencia'. Las palabras clave
+son palabras sueltas.
+"""
+import re
+from functools import lru_cache
+
+# El orden de la tabla desempata categorías con el mismo peso
+CATEGORIAS_PREGUNTA = [
+    {
+        'tipo': 'AMOR Y RELACIONES',
+        'enfoque': 'Emocional y vincular',
+        'palabras': [
+            'amor', 'relación', 'pareja', 'ex', 'matrimonio', 'divorcio',
+            'infidelidad', 'novio', 'novia', 'esposo', 'esposa',
+        ],
+        'instrucciones_especificas': """
+Para consultas de amor:
+- Describe dinámicas emocionales específicas
+- Habla sobre comunicación, confianza y compatibilidad
+- Predice encuentros, reencuentros o separaciones
+- Menciona sentimientos y reacciones de las personas involucradas
+- Da fechas aproximadas para cambios importantes en la relación
+""",
+    },
+    {
+        'tipo': 'TRABAJO Y CARRERA',
+        'enfoque': 'Profesional y material',
+        'palabras': [
+            'trabajo', 'empleo', 'carrera', 'jefe', 'ascenso', 'despido',
+            'entrevista', 'proyecto', 'negocio', 'empresa',
+        ],
+        'instrucciones_especificas': """
+Para consultas laborales:
+- Analiza oportunidades de crecimiento profesional
+- Predice cambios en el ambiente laboral
+- Describe relaciones con colegas y superiores
+- Menciona aspectos financieros y estabilidad económica
+- Da consejos sobre decisiones profesionales importantes
+""",
+    },
+    {
+        'tipo': 'SALUD Y BIENESTAR',
+        'enfoque': 'Físico y energético',
+        'palabras': [
+            'salud', 'enfermedad', 'médico', 'doctor', 'hospital', 'síntomas',
+            'tratamiento', 'cirugía',
+        ],
+        'instrucciones_especificas': """
+Para consultas de salud:
+- Enfócate en el bienestar general y energía vital
+- Describe cómo el estado emocional afecta la salud física
+- Predice la evolución de tratamientos o consultas médicas
+- Menciona la importancia del autocuidado y prevención
+- NUNCA diagnostiques condiciones médicas específicas
+""",
+    },
+    {
+        'tipo': 'DINERO Y FINANZAS',
+        'enfoque': 'Material y práctico',
+        'palabras': [
+            'dinero', 'finanzas', 'inversión', 'deuda', 'préstamo', 'lotería',
+            'herencia', 'economía',
+        ],
+        'instrucciones_especificas': """
+Para consultas financieras:
+- Analiza tendencias económicas personales
+- Predice oportunidades de ingresos o pérdidas
+- Describe la relación con el dinero y la abundancia
+- Menciona inversiones, gastos importantes o cambios financieros
+- Da consejos sobre administración y prudencia económica
+""",
+    },
+    {
+        'tipo': 'FAMILIA Y HOGAR',
+        'enfoque': 'Familiar y doméstico',
+        'palabras': [
+            'familia', 'madre', 'padre', 'hijo', 'hija', 'hermano', 'hermana',
+            'abuelo', 'abuela',
+        ],
+        'instrucciones_especificas': """
+Para consultas familiares:
+- Describe dinámicas familiares y roles
+- Predice cambios en la estructura o armonía familiar
+- Analiza conflictos generacionales o de convivencia
+- Menciona tradiciones, herencias o mudanzas
+- Da consejos sobre comunicación y comprensión familiar
+""",
+    },
+    {
+        'tipo': 'ESPIRITUALIDAD Y PROPÓSITO',
+        'enfoque': 'Espiritual y trascendente',
+        'palabras': [
+            'espiritual', 'alma', 'propósito', 'misión', 'karma', 'destino',
+            'energía',
+        ],
+        'instrucciones_especificas': """
+Para consultas espirituales:
+- Explora el crecimiento espiritual y la evolución del alma
+- Describe lecciones kármicas y propósitos de vida
+- Predice despertar espiritual o cambios de conciencia
+- Menciona prácticas espirituales recomendadas
+- Da orientación sobre el camino de auto-realización
+""",
+    },
+]
+
+CATEGORIA_GENERAL = {
+    'tipo': 'CONSULTA GENERAL',
+    'enfoque': 'Holístico y equilibrado',
+    'palabras': [],
+    'instrucciones_especificas': """
+Para consultas generales:
+- Proporciona una visión integral de la situación
+- Analiza múltiples aspectos de la vida que podrían estar afectados
+- Predice cambios importantes en cualquier área
+- Describe patrones y ciclos de vida actuales
+- Da consejos prácticos y aplicables a la situación general
+""",
+}
+
+
+_SIN_TILDES = str.maketrans('áéíóúüàèìòùâêîôû', 'aeiouuaeiouaeiou')
+# Todo lo que no es letra o dígito separa palabras: 'ex-pareja' son dos
+_SEPARADORES = re.compile(r'[\W_]+')
+
+
+def normalizar_texto(texto):
+    """
+    Minúsculas y sin tildes ('Relación' -> 'relacion'); la ñ se conserva
+    """
+    return texto.lower().translate(_SIN_TILDES)
+
+
+@lru_cache(maxsize=4096)
+def _normalizar_palabra(palabra):
+    # El vocabulario de las preguntas es limitado: cachear cada palabra ya
+    # normalizada evita repetir translate() en casi todas las consultas
+    return normalizar_texto(palabra)
+
+
+class ClasificadorPreguntas:
+    """
+    Clasificador multi-etiqueta de preguntas por palabras clave
+    """
+
+    def __init__(self, categorias, general=CATEGORIA_GENERAL):
+        self.categorias = list(categorias)
+        self.general = general
+
+        # Índice palabra -> categoría: cada palabra de la pregunta se resuelve
+        # con una consulta a un dict, sin importar cuántas palabras clave haya.
+        # Se indexan también los plurales ('hijos', 'relaciones') pero no otras
+        # palabras que solo empiezan igual
+        self.indice = {}
+        for posicion, categoria in enumerate(self.categorias):
+            for palabra in categoria['palabras']:
+                palabra = normalizar_texto(palabra)
+                for forma in (palabra, palabra + 's', palabra + 'es'):
+                    self.indice.setdefault(forma, posicion)
+
+    def clasificar(self, pregunta):
+        """
+        Todas las categorías presentes en la pregunta con su peso (proporción
+        de palabras clave encontradas), de mayor a menor peso. Lista vacía si
+        ninguna coincide.
+        """
+        indice = self.indice
+        coincidencias = {}
+        for token in _SEPARADORES.split(pregunta):
+            posicion = indice.get(_normalizar_palabra(token))
+            if posicion is not None:
+                coincidencias[posicion] = coincidencias.get(posicion, 0) + 1
+
+        if not coincidencias:
+            return []
+        total = sum(coincidencias.values())
+        ordenadas = sorted(coincidencias.items(), key=lambda item: (-item[1], item[0]))
+        return [(self.categorias[posicion], cantidad / total) for posicion, cantidad in ordenadas]
+
+
+clasificador_preguntas = ClasificadorPreguntas(CATEGORIAS_PREGUNTA)
@@ -0,0 +1,73 @@
+import os
+import re
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Lo que hace un worker al arrancar: configurar Django y cargar todas las URLs (y con ellas las vistas)
+_SCRIPT_ARRANQUE = 'import django; django.setup(); import core.urls'
+
+# Módulos pesados que solo deben cargarse al llamar a Gemini por primera vez
+_MODULOS_DIFERIDOS = ('google.generativeai', 'grpc')
+
+_LINEA_IMPORTTIME = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+
+class Command(BaseCommand):
+    help = 'Mide el tiempo de import del arranque con python -X importtime y lo compara con un presupuesto'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--presupuesto-ms',
+            type=float,
+            default=1000,
+            help='Tiempo máximo de import aceptable en milisegundos (default: 1000)'
+        )
+        parser.add_argument(
+            '--top',
+            type=int,
+            default=10,
+            help='Cantidad de paquetes más costosos a mostrar (default: 10)'
+        )
+
+    def _medir(self):
+        entorno = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'core.settings'))
+        proceso = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', _SCRIPT_ARRANQUE],
+            cwd=settings.BASE_DIR, env=entorno, capture_output=True, text=True
+        )
+        if proceso.returncode != 0:
+            raise CommandError(f"El arranque falló:\n{proceso.stderr[-2000:]}")
+
+        modulos = []
+        for linea in proceso.stderr.splitlines():
+            match = _LINEA_IMPORTTIME.match(linea)
+            if match:
+                propio, acumulado, sangria, nombre = match.groups()
+                modulos.append((nombre, int(propio), int(acumulado), len(sangria)))
+        return modulos
+
+    def handle(self, *args, **options):
+        modulos = self._medir()
+        total_ms = sum(propio for _, propio, _, _ in modulos) / 1000
+        nombres = {nombre for nombre, _, _, _ in modulos}
+
+        # Los imports de primer nivel tienen la menor sangría; su acumulado incluye a sus dependencias
+        nivel_superior = min(nivel for _, _, _, nivel in modulos)
+        principales = sorted(
+            (m for m in modulos if m[3] == nivel_superior), key=lambda m: m[2], reverse=True
+        )[:options['top']]
+
+        self.stdout.write(self.style.SUCCESS(f"⏱️ Import del arranque: {total_ms:.1f}ms ({len(modulos)} módulos)"))
+        for nombre, _, acumulado, _ in principales:
+            self.stdout.write(f"  {acumulado / 1000:8.1f}ms  {nombre}")
+
+        cargados = [modulo for modulo in _MODULOS_DIFERIDOS if modulo in nombres]
+        if cargados:
+            raise CommandError(f"Se importan al arrancar módulos que deberían ser diferidos: {', '.join(cargados)}")
+        if total_ms > options['presupuesto_ms']:
+            raise CommandError(f"El import del arranque ({total_ms:.1f}ms) supera el presupuesto de {options['presupuesto_ms']}ms")
+
+        self.stdout.write(self.style.SUCCESS(f"✅ Dentro del presupuesto de {options['presupuesto_ms']}ms"))
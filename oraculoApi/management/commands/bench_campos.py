@@ -0,0 +1,49 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory
+
+from oraculoApi.views import CartaViewSet, SetConMazosViewSet, MazoConTiradasViewSet
+
+# (nombre, viewset, ?fields= de la versión liviana del listado)
+LISTADOS = [
+    ('cartas (mazos_list)', CartaViewSet, 'id,mazo,nombre,imagen'),
+    ('sets con mazos (home)', SetConMazosViewSet, 'id,nombre,descripcion,mazos.id'),
+    ('mazos con tiradas', MazoConTiradasViewSet, 'id,nombre,tiradas.id,tiradas.nombre,tiradas.costo'),
+]
+
+
+class Command(BaseCommand):
+    help = ('Compara el tamaño de la respuesta y de las filas leídas de la base de datos de los '
+            'listados del catálogo completos y con ?fields=')
+
+    def _bytes_leidos(self, queries):
+        # Se re-ejecuta cada query capturada y se mide el texto de las columnas devueltas
+        total = 0
+        with connection.cursor() as cursor:
+            for query in queries:
+                cursor.execute(query['sql'])
+                total += sum(len(str(valor)) for fila in cursor.fetchall() for valor in fila if valor is not None)
+        return total
+
+    def _medir(self, viewset, parametros):
+        factory = APIRequestFactory(HTTP_HOST=settings.ALLOWED_HOSTS[0])
+        vista = viewset.as_view({'get': 'list'})
+        with CaptureQueriesContext(connection) as queries:
+            respuesta = vista(factory.get('/', parametros))
+            respuesta.render()
+        return len(respuesta.content), self._bytes_leidos(queries.captured_queries), len(queries)
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS("📦 Listados completos vs ?fields="))
+        for nombre, viewset, campos in LISTADOS:
+            json_antes, db_antes, queries_antes = self._medir(viewset, {})
+            json_despues, db_despues, queries_despues = self._medir(viewset, {'fields': campos})
+            self.stdout.write(
+                f"  {nombre:<24} JSON {json_antes:>9,}B -> {json_despues:>9,}B "
+                f"({json_antes / max(json_despues, 1):5.1f}x)  "
+                f"BD {db_antes:>9,}B -> {db_despues:>9,}B ({db_antes / max(db_despues, 1):5.1f}x)  "
+                f"queries {queries_antes} -> {queries_despues}"
+            )
+            self.stdout.write(f"      ?fields={campos}")
@@ -0,0 +1,147 @@
+import itertools
+import time
+from functools import partial
+
+from django.core.management.base import BaseCommand
+
+from oraculoApi.clasificador import CATEGORIAS_PREGUNTA, CATEGORIA_GENERAL, ClasificadorPreguntas, clasificador_preguntas
+
+CORPUS_PREGUNTAS = [
+    '¿Volverá mi ex a buscarme?',
+    '¿Mi pareja me es fiel?',
+    '¿Encontraré el amor este año?',
+    '¿Cómo va a evolucionar mi relación con mi novio?',
+    '¿Me darán el ascenso en el trabajo?',
+    '¿Debo aceptar la oferta de empleo en otra empresa?',
+    '¿Cómo me irá en la entrevista del lunes?',
+    '¿Funcionará mi negocio de repostería?',
+    '¿Qué dirá el médico sobre mis síntomas?',
+    '¿Saldrá bien la cirugía de mi madre?',
+    '¿Podré pagar mis deudas antes de diciembre?',
+    '¿Es buen momento para una inversión?',
+    '¿Cómo se resolverá el tema de la herencia con mis hermanos?',
+    '¿Qué pasará con mi familia si nos mudamos?',
+    '¿Cuál es el propósito de mi alma en esta vida?',
+    '¿Qué karma estoy trabajando con mi padre?',
+    '¿Aprobaré el examen de matemáticas?',
+    '¿Qué experiencia me espera en el viaje?',
+    '¿Qué me depara el futuro?',
+    '¿Debo mudarme de ciudad?',
+    'Necesito una guía general para las próximas semanas',
+    '¿Mi esposa y yo superaremos la crisis económica?',
+    '¿Mis hijos estarán bien en su nuevo colegio?',
+    '¿Qué energía rodea mi proyecto personal?',
+]
+
+
+def _clasificar_lineal(categorias, pregunta):
+    """
+    Algoritmo anterior: búsqueda de subcadenas categoría por categoría,
+    se queda con la primera que coincida
+    """
+    pregunta_lower = pregunta.lower()
+    for categoria in categorias:
+        if any(palabra in pregunta_lower for palabra in categoria['palabras']):
+            return categoria
+    return CATEGORIA_GENERAL
+
+
+def _clasificar_lineal_todas(categorias, pregunta):
+    """
+    Búsqueda de subcadenas sin cortar en la primera categoría, para obtener
+    todas como hace el clasificador compilado
+    """
+    pregunta_lower = pregunta.lower()
+    return [
+        categoria for categoria in categorias
+        if any(palabra in pregunta_lower for palabra in categoria['palabras'])
+    ]
+
+
+def _categorias_sinteticas(cantidad):
+    # Categorías de relleno (palabras que no aparecen en las preguntas) para
+    # ver cómo escala cada algoritmo con tablas más grandes
+    return [
+        {
+            'tipo': f'SINTÉTICA {i}',
+            'enfoque': '',
+            'instrucciones_especificas': '',
+            'palabras': [f'zq{i}x{j}' for j in range(10)],
+        }
+        for i in range(cantidad)
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Compara el clasificador de preguntas compilado con la búsqueda lineal anterior'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--archivo',
+            type=str,
+            help='Archivo con una pregunta por línea (default: corpus de ejemplo)'
+        )
+        parser.add_argument(
+            '--iteraciones',
+            type=int,
+            default=20000,
+            help='Clasificaciones a medir por algoritmo (default: 20000)'
+        )
+        parser.add_argument(
+            '--escala',
+            type=int,
+            action='append',
+            help='Medir también con N categorías sintéticas extra (se puede repetir)'
+        )
+        parser.add_argument(
+            '--detalle',
+            action='store_true',
+            help='Mostrar las preguntas en las que ambos algoritmos difieren'
+        )
+
+    def _medir(self, funcion, preguntas, iteraciones):
+        ciclo = itertools.islice(itertools.cycle(preguntas), iteraciones)
+        inicio = time.perf_counter()
+        for pregunta in ciclo:
+            funcion(pregunta)
+        return (time.perf_counter() - inicio) / iteraciones * 1_000_000
+
+    def handle(self, *args, **options):
+        if options['archivo']:
+            with open(options['archivo'], encoding='utf-8') as archivo:
+                preguntas = [linea.strip() for linea in archivo if linea.strip()]
+        else:
+            preguntas = CORPUS_PREGUNTAS
+
+        iteraciones = options['iteraciones']
+        self.stdout.write(self.style.SUCCESS(
+            f"⏱️ Clasificador de preguntas: {len(preguntas)} preguntas, {iteraciones} iteraciones"
+        ))
+
+        for extra in [0] + (options['escala'] or []):
+            categorias = CATEGORIAS_PREGUNTA + _categorias_sinteticas(extra)
+            clasificador = ClasificadorPreguntas(categorias)
+            self.stdout.write(f"  {len(categorias)} categorías:")
+            for nombre, funcion in (
+                ('lineal, primera (anterior)', partial(_clasificar_lineal, categorias)),
+                ('lineal, todas', partial(_clasificar_lineal_todas, categorias)),
+                ('índice compilado, todas', clasificador.clasificar),
+            ):
+                self.stdout.write(f"    {nombre:<28} {self._medir(funcion, preguntas, iteraciones):8.2f}µs/pregunta")
+
+        diferencias = 0
+        multiples = 0
+        for pregunta in preguntas:
+            categorias = clasificador_preguntas.clasificar(pregunta)
+            if len(categorias) > 1:
+                multiples += 1
+            anterior = _clasificar_lineal(CATEGORIAS_PREGUNTA, pregunta)['tipo']
+            actual = categorias[0][0]['tipo'] if categorias else CATEGORIA_GENERAL['tipo']
+            if anterior != actual:
+                diferencias += 1
+                if options['detalle']:
+                    etiquetas = ', '.join(f"{c['tipo']}={peso:.2f}" for c, peso in categorias) or actual
+                    self.stdout.write(f"    {pregunta!r}: {anterior} -> {etiquetas}")
+
+        self.stdout.write(f"  preguntas con varias categorías: {multiples}/{len(preguntas)}")
+        self.stdout.write(f"  categoría principal distinta a la anterior: {diferencias}/{len(preguntas)}")
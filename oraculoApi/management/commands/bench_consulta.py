@@ -0,0 +1,146 @@
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+
+from oraculoApi import views
+from oraculoApi.models import Tirada
+from oraculoApi.resiliencia import LimitadorConcurrencia
+from oraculoApi.services import get_gemini_service
+
+
+class ModeloSimulado:
+    """
+    Sustituto de genai.GenerativeModel que tarda lo que tardaría Gemini,
+    sin llamar a la API real ni gastar tokens
+    """
+
+    def __init__(self, latencia):
+        self.latencia = latencia
+
+    def _respuesta(self):
+        texto = 'Interpretación simulada. ' * 40
+        candidato = SimpleNamespace(
+            finish_reason=SimpleNamespace(name='STOP'),
+            content=SimpleNamespace(parts=[SimpleNamespace(text=texto)]),
+        )
+        return SimpleNamespace(candidates=[candidato])
+
+    def generate_content(self, *args, **kwargs):
+        time.sleep(self.latencia)
+        return self._respuesta()
+
+    async def generate_content_async(self, *args, **kwargs):
+        await asyncio.sleep(self.latencia)
+        return self._respuesta()
+
+
+class Command(BaseCommand):
+    help = 'Compara el throughput de consulta-tarot síncrono (workers WSGI) vs asíncrono (ASGI)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tirada-id',
+            type=int,
+            help='ID de la tirada a usar (default: la primera)'
+        )
+        parser.add_argument(
+            '--consultas',
+            type=int,
+            default=100,
+            help='Número de consultas concurrentes a lanzar (default: 100)'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Workers síncronos simulados para el camino WSGI (default: 4)'
+        )
+        parser.add_argument(
+            '--latencia',
+            type=float,
+            default=2.0,
+            help='Segundos que tarda el modelo simulado en responder (default: 2.0)'
+        )
+
+    def _payload(self, tirada):
+        return {
+            'pregunta': '¿Qué me depara el trabajo este año?',
+            'set_id': tirada.mazo.set_id,
+            'mazo_id': tirada.mazo_id,
+            'tirada_id': tirada.id,
+        }
+
+    def _medir_sync(self, payload, consultas, workers):
+        factory = RequestFactory(HTTP_HOST='localhost')
+
+        def una_consulta(_):
+            request = factory.post('/api/oraculo/consulta-tarot/', data=payload, content_type='application/json')
+            return views.consulta_tarot(request).status_code
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            codigos = list(executor.map(una_consulta, range(consultas)))
+        return time.perf_counter() - inicio, codigos
+
+    def _medir_async(self, payload, consultas):
+        factory = RequestFactory(HTTP_HOST='localhost')
+
+        async def una_consulta():
+            request = factory.post(
+                '/api/oraculo/consulta-tarot-async/', data=json.dumps(payload), content_type='application/json'
+            )
+            response = await views.consulta_tarot_async(request)
+            return response.status_code
+
+        async def todas():
+            return await asyncio.gather(*(una_consulta() for _ in range(consultas)))
+
+        inicio = time.perf_counter()
+        codigos = asyncio.run(todas())
+        return time.perf_counter() - inicio, codigos
+
+    def _reportar(self, nombre, duracion, codigos):
+        exitosas = sum(1 for codigo in codigos if codigo == 200)
+        self.stdout.write(
+            f"  {nombre:<28} {duracion:8.2f}s  "
+            f"{len(codigos) / duracion:8.2f} consultas/s  "
+            f"({exitosas}/{len(codigos)} OK)"
+        )
+
+    def handle(self, *args, **options):
+        gemini_service = get_gemini_service()
+        if gemini_service is None:
+            self.stdout.write(self.style.ERROR("❌ GeminiService no está disponible"))
+            return
+
+        tiradas = Tirada.objects.select_related('mazo')
+        tirada = tiradas.get(id=options['tirada_id']) if options['tirada_id'] else tiradas.first()
+        if tirada is None:
+            self.stdout.write(self.style.ERROR("❌ No hay tiradas en la base de datos"))
+            return
+
+        payload = self._payload(tirada)
+        consultas = options['consultas']
+        modelo_original = gemini_service.model
+        limitador_original = gemini_service.limitador
+        gemini_service.model = ModeloSimulado(options['latencia'])
+        # Se mide la concurrencia de cada modelo de ejecución, no el límite de GEMINI_LIMITES
+        gemini_service.limitador = LimitadorConcurrencia(consultas)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"⏱️ {consultas} consultas, tirada '{tirada.nombre}', latencia simulada {options['latencia']}s"
+        ))
+        try:
+            duracion, codigos = self._medir_sync(payload, consultas, options['workers'])
+            self._reportar(f"síncrono ({options['workers']} workers)", duracion, codigos)
+
+            duracion, codigos = self._medir_async(payload, consultas)
+            self._reportar("asíncrono (1 event loop)", duracion, codigos)
+        finally:
+            gemini_service.model = modelo_original
+            gemini_service.limitador = limitador_original
@@ -0,0 +1,88 @@
+import logging
+import statistics
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from oraculoApi.models import Tirada
+from oraculoApi.services import get_gemini_service
+
+
+class Command(BaseCommand):
+    help = 'Mide el tiempo y las asignaciones de memoria de crear_prompt_tarot (cache frío vs caliente)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tirada-id',
+            type=int,
+            help='ID de la tirada a usar (default: la primera)'
+        )
+        parser.add_argument(
+            '--iteraciones',
+            type=int,
+            default=2000,
+            help='Prompts a generar por escenario (default: 2000)'
+        )
+
+    def _cartas(self, num_cartas):
+        return [
+            {
+                'carta': {'nombre': f'Carta {i}', 'numero': i},
+                'posicion': f'Posición {i}',
+                'descripcion_posicion': f'Aspecto {i} de la situación',
+                'es_invertida': i % 2 == 0,
+                'significado_usado': 'Energía de transformación y nuevos comienzos. ' * 5,
+            }
+            for i in range(1, num_cartas + 1)
+        ]
+
+    def _medir(self, tirada, cartas, iteraciones, frio):
+        pregunta = '¿Qué me depara el trabajo este año?'
+        tiempos = []
+        for _ in range(iteraciones):
+            if frio:
+                self.gemini_service._prompt_cache_clave = None
+            inicio = time.perf_counter()
+            self.gemini_service.crear_prompt_tarot(pregunta, tirada.mazo, tirada, cartas)
+            tiempos.append((time.perf_counter() - inicio) * 1_000_000)
+
+        if frio:
+            self.gemini_service._prompt_cache_clave = None
+        tracemalloc.start()
+        self.gemini_service.crear_prompt_tarot(pregunta, tirada.mazo, tirada, cartas)
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return statistics.median(tiempos), pico
+
+    def handle(self, *args, **options):
+        self.gemini_service = get_gemini_service()
+        if self.gemini_service is None:
+            self.stdout.write(self.style.ERROR("❌ GeminiService no está disponible"))
+            return
+
+        tiradas = Tirada.objects.select_related('mazo__set')
+        tirada = tiradas.get(id=options['tirada_id']) if options['tirada_id'] else tiradas.first()
+        if tirada is None:
+            self.stdout.write(self.style.ERROR("❌ No hay tiradas en la base de datos"))
+            return
+
+        # Los logs por prompt distorsionan la medición
+        logger = logging.getLogger('oraculoApi.services')
+        nivel_original = logger.level
+        logger.setLevel(logging.WARNING)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"⏱️ crear_prompt_tarot, tirada '{tirada.nombre}', {options['iteraciones']} iteraciones"
+        ))
+        try:
+            for num_cartas in (1, 3, 5, 10):
+                cartas = self._cartas(num_cartas)
+                for nombre, frio in (('frío', True), ('caliente', False)):
+                    mediana, pico = self._medir(tirada, cartas, options['iteraciones'], frio)
+                    self.stdout.write(
+                        f"  {num_cartas:>2} cartas  {nombre:<9} "
+                        f"p50={mediana:8.1f}µs  pico memoria={pico / 1024:7.1f}KiB"
+                    )
+        finally:
+            logger.setLevel(nivel_original)
@@ -0,0 +1,64 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from oraculoApi.catalogo import obtener_catalogo
+from oraculoApi.serializers import CartaSerializer, TiradaSerializer
+
+
+class Command(BaseCommand):
+    help = 'Compara la serialización por consulta (serializers DRF) con los payloads precalculados del catálogo'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iteraciones',
+            type=int,
+            default=2000,
+            help='Consultas simuladas por tamaño de tirada (default: 2000)'
+        )
+
+    def _serializers(self, tirada, cartas):
+        return (
+            [CartaSerializer(carta).data for carta in cartas],
+            TiradaSerializer(tirada).data,
+        )
+
+    def _precalculado(self, catalogo, tirada, cartas):
+        return (
+            [catalogo.carta_serializada(carta.id) for carta in cartas],
+            catalogo.tirada_serializada(tirada.id),
+        )
+
+    def _medir(self, funcion, iteraciones):
+        tiempos = []
+        for _ in range(iteraciones):
+            inicio = time.perf_counter()
+            funcion()
+            tiempos.append((time.perf_counter() - inicio) * 1_000_000)
+        return statistics.median(tiempos)
+
+    def handle(self, *args, **options):
+        catalogo = obtener_catalogo()
+        if not catalogo.tiradas:
+            self.stdout.write(self.style.ERROR("❌ No hay tiradas en la base de datos"))
+            return
+
+        tirada = next(iter(catalogo.tiradas.values()))
+        cartas_mazo = catalogo.cartas_por_mazo[tirada.mazo_id]
+        iteraciones = options['iteraciones']
+
+        self.stdout.write(self.style.SUCCESS(
+            f"⏱️ Serialización por consulta, tirada '{tirada.nombre}', {iteraciones} iteraciones"
+        ))
+        for num_cartas in (1, 3, 5, 10):
+            if num_cartas > len(cartas_mazo):
+                self.stdout.write(self.style.WARNING(f"  {num_cartas:>2} cartas: el mazo solo tiene {len(cartas_mazo)}"))
+                continue
+            cartas = cartas_mazo[:num_cartas]
+            antes = self._medir(lambda: self._serializers(tirada, cartas), iteraciones)
+            despues = self._medir(lambda: self._precalculado(catalogo, tirada, cartas), iteraciones)
+            self.stdout.write(
+                f"  {num_cartas:>2} cartas  serializers={antes:8.1f}µs  "
+                f"precalculado={despues:6.2f}µs  ({antes / despues:6.0f}x)"
+            )
@@ -0,0 +1,81 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from oraculoApi import sorteo
+from oraculoApi.catalogo import obtener_catalogo
+
+
+def _sorteo_anterior(cartas, cantidad, permite_invertidas):
+    # Implementación anterior: random global sobre instancias de Carta y un choice por carta
+    seleccionadas = random.sample(cartas, cantidad)
+    return seleccionadas, [random.choice([True, False]) if permite_invertidas else False for _ in seleccionadas]
+
+
+class Command(BaseCommand):
+    help = ('Compara el sorteo anterior (random global sobre instancias de Carta) con el motor de '
+            'sorteo por consulta y con su modo por lotes')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--mazo-id',
+            type=int,
+            help='ID del mazo (default: el que tenga más cartas)'
+        )
+        parser.add_argument(
+            '--sorteos',
+            type=int,
+            default=20000,
+            help='Sorteos por tamaño de tirada (default: 20000)'
+        )
+
+    def _medir(self, funcion, sorteos):
+        inicio = time.perf_counter()
+        funcion()
+        return sorteos / (time.perf_counter() - inicio)
+
+    def handle(self, *args, **options):
+        catalogo = obtener_catalogo()
+        if options['mazo_id'] is not None:
+            if options['mazo_id'] not in catalogo.mazos:
+                raise CommandError(f"No existe el mazo {options['mazo_id']}")
+            mazo = catalogo.mazos[options['mazo_id']]
+        elif catalogo.mazos:
+            mazo = max(catalogo.mazos.values(), key=lambda m: len(catalogo.ids_por_mazo[m.id]))
+        else:
+            raise CommandError('No hay mazos en la base de datos')
+
+        cartas = catalogo.cartas_por_mazo[mazo.id]
+        ids_cartas = catalogo.ids_por_mazo[mazo.id]
+        sorteos = options['sorteos']
+        invertidas = mazo.permite_cartas_invertidas
+
+        self.stdout.write(self.style.SUCCESS(
+            f"🎴 Mazo '{mazo.nombre}' ({len(ids_cartas)} cartas), {sorteos} sorteos por tamaño"
+        ))
+        for cantidad in (1, 3, 5, 10):
+            if cantidad > len(ids_cartas):
+                self.stdout.write(self.style.WARNING(f"  {cantidad:>2} cartas: el mazo solo tiene {len(ids_cartas)}"))
+                continue
+            anterior = self._medir(
+                lambda: [_sorteo_anterior(cartas, cantidad, invertidas) for _ in range(sorteos)], sorteos)
+            por_consulta = self._medir(
+                lambda: [sorteo.sortear(ids_cartas, cantidad, invertidas) for _ in range(sorteos)], sorteos)
+            por_lote = self._medir(
+                lambda: sorteo.sortear_lote(ids_cartas, cantidad, invertidas, sorteos), sorteos)
+            self.stdout.write(
+                f"  {cantidad:>2} cartas  anterior={anterior:10,.0f}/s  "
+                f"por consulta={por_consulta:10,.0f}/s  lote={por_lote:10,.0f}/s"
+            )
+
+        # Una semilla registrada reproduce el mismo sorteo
+        tirada = next((t for t in catalogo.tiradas.values()
+                       if t.mazo_id == mazo.id and t.cantidad_cartas <= len(ids_cartas)), None)
+        if tirada is not None:
+            original = sorteo.sortear(ids_cartas, tirada.cantidad_cartas, invertidas)
+            if sorteo.reproducir(original.semilla, mazo, tirada) != original:
+                raise CommandError(f'La semilla {original.semilla} no reproduce el sorteo')
+            self.stdout.write(self.style.SUCCESS(
+                f"✅ La semilla {original.semilla} reproduce el sorteo de '{tirada.nombre}'"
+            ))
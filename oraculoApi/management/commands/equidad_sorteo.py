@@ -0,0 +1,285 @@
+import json
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from oraculoApi import sorteo
+from oraculoApi.catalogo import obtener_catalogo
+
+
+def _gamma_q(a, x):
+    """
+    Gamma incompleta superior regularizada Q(a, x) (serie o fracción continua de Lentz)
+    """
+    if x <= 0:
+        return 1.0
+    prefactor = math.exp(-x + a * math.log(x) - math.lgamma(a))
+    if x < a + 1:
+        termino = suma = 1.0 / a
+        n = a
+        for _ in range(100000):
+            n += 1
+            termino *= x / n
+            suma += termino
+            if abs(termino) < abs(suma) * 1e-15:
+                break
+        return max(0.0, 1.0 - suma * prefactor)
+
+    minimo = 1e-300
+    b = x + 1 - a
+    c = 1 / minimo
+    d = 1 / b
+    h = d
+    for i in range(1, 100000):
+        an = -i * (i - a)
+        b += 2
+        d = an * d + b
+        d = minimo if abs(d) < minimo else d
+        c = b + an / c
+        c = minimo if abs(c) < minimo else c
+        d = 1 / d
+        delta = d * c
+        h *= delta
+        if abs(delta - 1) < 1e-15:
+            break
+    return prefactor * h
+
+
+def _prueba_chi2(estadistico, grados):
+    return {
+        'estadistico': round(estadistico, 4),
+        'grados_libertad': grados,
+        'p': _gamma_q(grados / 2, estadistico / 2),
+    }
+
+
+def _chi2_uniforme(observados):
+    esperado = sum(observados) / len(observados)
+    return sum((o - esperado) ** 2 for o in observados) / esperado
+
+
+def _analizar(ids_cartas, cantidad, permite_invertidas, apariciones, invertidas, sorteos):
+    num_cartas = len(ids_cartas)
+    pruebas = {}
+
+    # Cada posición recibe una carta uniforme: multinomial exacta con n-1 grados de libertad
+    pruebas['posiciones'] = [
+        _prueba_chi2(_chi2_uniforme(por_posicion), num_cartas - 1) for por_posicion in apariciones
+    ]
+
+    # Totales por carta: sin reposición dentro de un sorteo el Pearson se escala
+    # por (n-k)/(n-1); se corrige para que siga una chi-cuadrado con n-1 gl
+    totales = [sum(columna) for columna in zip(*apariciones)]
+    if cantidad < num_cartas:
+        pearson = _chi2_uniforme(totales)
+        pruebas['cartas'] = _prueba_chi2(pearson * (num_cartas - 1) / (num_cartas - cantidad), num_cartas - 1)
+
+    total_invertidas = [sum(columna) for columna in zip(*invertidas)]
+    cartas_sorteadas = sorteos * cantidad
+    invertidas_total = sum(total_invertidas)
+    if permite_invertidas:
+        # Balance global: binomial(cartas_sorteadas, 1/2)
+        z = (invertidas_total - cartas_sorteadas / 2) / math.sqrt(cartas_sorteadas / 4)
+        pruebas['orientacion'] = {
+            'invertidas': invertidas_total,
+            'proporcion': invertidas_total / cartas_sorteadas,
+            'z': round(z, 4),
+            'p': math.erfc(abs(z) / math.sqrt(2)),
+        }
+        # Por carta: invertidas ~ binomial(apariciones de la carta, 1/2), 1 gl por carta
+        estadistico = sum(
+            (2 * inv - total) ** 2 / total for inv, total in zip(total_invertidas, totales) if total
+        )
+        pruebas['orientacion_por_carta'] = _prueba_chi2(estadistico, sum(1 for total in totales if total))
+    elif invertidas_total:
+        pruebas['orientacion'] = {'invertidas': invertidas_total, 'p': 0.0}
+
+    esperado = cartas_sorteadas / num_cartas
+    return {
+        'cartas_en_mazo': num_cartas,
+        'cantidad_cartas': cantidad,
+        'permite_invertidas': permite_invertidas,
+        'sorteos': sorteos,
+        'frecuencia_relativa': {
+            'min': min(totales) / esperado,
+            'max': max(totales) / esperado,
+        },
+        'pruebas': pruebas,
+    }
+
+
+def _valores_p(pruebas):
+    for nombre, prueba in pruebas.items():
+        for item in (prueba if isinstance(prueba, list) else [prueba]):
+            yield nombre, item['p']
+
+
+class Command(BaseCommand):
+    help = ('Simula millones de sorteos por mazo y cantidad de cartas con el motor de producción '
+            '(oraculoApi/sorteo.py), en paralelo, y prueba con chi-cuadrado que cartas, posiciones '
+            'y orientaciones sean uniformes. Escribe un reporte JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sorteos',
+            type=int,
+            default=1_000_000,
+            help='Sorteos por mazo y cantidad de cartas (default: 1000000)'
+        )
+        parser.add_argument(
+            '--mazo-id',
+            type=int,
+            action='append',
+            help='Mazo a simular, repetible (default: todos)'
+        )
+        parser.add_argument(
+            '--cantidades',
+            type=int,
+            nargs='+',
+            help='Cantidades de cartas a simular (default: las de las tiradas de cada mazo)'
+        )
+        parser.add_argument(
+            '--procesos',
+            type=int,
+            default=os.cpu_count(),
+            help='Procesos en paralelo (default: núcleos disponibles)'
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=100_000,
+            help='Sorteos por tarea enviada a un proceso (default: 100000)'
+        )
+        parser.add_argument(
+            '--semilla',
+            type=int,
+            help='Semilla maestra, para repetir exactamente una corrida (default: al azar)'
+        )
+        parser.add_argument(
+            '--alfa',
+            type=float,
+            default=0.001,
+            help='Nivel de significancia por mazo y cantidad, con corrección de Bonferroni (default: 0.001)'
+        )
+        parser.add_argument(
+            '--salida',
+            default='equidad_sorteo.json',
+            help='Archivo del reporte JSON (default: equidad_sorteo.json; "-" para stdout)'
+        )
+
+    def _casos(self, catalogo, mazo_ids, cantidades):
+        casos = []
+        for mazo_id in mazo_ids or sorted(catalogo.mazos):
+            if mazo_id not in catalogo.mazos:
+                raise CommandError(f'No existe el mazo {mazo_id}')
+            mazo = catalogo.mazos[mazo_id]
+            ids_cartas = catalogo.ids_por_mazo[mazo_id]
+            por_tiradas = {t.cantidad_cartas for t in catalogo.tiradas.values() if t.mazo_id == mazo_id}
+            for cantidad in sorted(cantidades or por_tiradas):
+                if 0 < cantidad <= len(ids_cartas):
+                    casos.append((mazo, ids_cartas, cantidad))
+                else:
+                    self.stdout.write(self.style.WARNING(
+                        f"  mazo '{mazo.nombre}': {cantidad} cartas no se pueden sortear de {len(ids_cartas)}"
+                    ))
+        return casos
+
+    def handle(self, *args, **options):
+        catalogo = obtener_catalogo()
+        casos = self._casos(catalogo, options['mazo_id'], options['cantidades'])
+        if not casos:
+            raise CommandError('No hay mazos con cartas suficientes para simular')
+
+        sorteos = options['sorteos']
+        lote = options['lote']
+        semilla_maestra = options['semilla'] if options['semilla'] is not None else sorteo.nueva_semilla()
+        generador_semillas = random.Random(semilla_maestra)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"🎲 {len(casos)} combinaciones mazo/cantidad x {sorteos:,} sorteos, "
+            f"{options['procesos']} procesos, semilla {semilla_maestra}"
+        ))
+        inicio = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=options['procesos']) as pool:
+            tareas = []
+            for mazo, ids_cartas, cantidad in casos:
+                pendientes = sorteos
+                futuros = []
+                while pendientes > 0:
+                    tamano = min(lote, pendientes)
+                    futuros.append(pool.submit(
+                        sorteo.frecuencias_lote, ids_cartas, cantidad, mazo.permite_cartas_invertidas,
+                        tamano, generador_semillas.getrandbits(sorteo.BITS_SEMILLA)
+                    ))
+                    pendientes -= tamano
+                tareas.append((mazo, ids_cartas, cantidad, futuros))
+
+            resultados = []
+            fallidas = 0
+            for mazo, ids_cartas, cantidad, futuros in tareas:
+                apariciones = [[0] * len(ids_cartas) for _ in range(cantidad)]
+                invertidas = [[0] * len(ids_cartas) for _ in range(cantidad)]
+                for futuro in futuros:
+                    parcial_apariciones, parcial_invertidas = futuro.result()
+                    for acumulado, parcial in ((apariciones, parcial_apariciones), (invertidas, parcial_invertidas)):
+                        for fila, fila_parcial in zip(acumulado, parcial):
+                            for i, valor in enumerate(fila_parcial):
+                                fila[i] += valor
+
+                resultado = _analizar(
+                    ids_cartas, cantidad, mazo.permite_cartas_invertidas, apariciones, invertidas, sorteos
+                )
+                valores_p = list(_valores_p(resultado['pruebas']))
+                umbral = options['alfa'] / len(valores_p)
+                rechazadas = sorted({nombre for nombre, p in valores_p if p < umbral})
+                resultado.update({
+                    'mazo_id': mazo.id,
+                    'mazo': mazo.nombre,
+                    'umbral_p': umbral,
+                    'rechazadas': rechazadas,
+                    'uniforme': not rechazadas,
+                })
+                resultados.append(resultado)
+                fallidas += bool(rechazadas)
+
+                p_minimo = min(p for _, p in valores_p)
+                linea = (
+                    f"  {mazo.nombre[:24]:<24} {cantidad:>2} cartas  "
+                    f"frec. {resultado['frecuencia_relativa']['min']:.4f}-{resultado['frecuencia_relativa']['max']:.4f}  "
+                    f"p mínimo {p_minimo:.4g}"
+                )
+                if 'orientacion' in resultado['pruebas'] and 'proporcion' in resultado['pruebas']['orientacion']:
+                    linea += f"  invertidas {resultado['pruebas']['orientacion']['proporcion']:.5f}"
+                if rechazadas:
+                    self.stdout.write(self.style.ERROR(f"❌{linea}  no uniforme: {', '.join(rechazadas)}"))
+                else:
+                    self.stdout.write(self.style.SUCCESS(f"✅{linea}"))
+        duracion = time.perf_counter() - inicio
+
+        reporte = {
+            'generado': timezone.now().isoformat(),
+            'version_catalogo': catalogo.version,
+            'semilla': semilla_maestra,
+            'sorteos_por_caso': sorteos,
+            'alfa': options['alfa'],
+            'procesos': options['procesos'],
+            'duracion_s': round(duracion, 2),
+            'sorteos_por_segundo': round(sorteos * len(casos) / duracion),
+            'uniforme': not fallidas,
+            'resultados': resultados,
+        }
+        contenido = json.dumps(reporte, ensure_ascii=False, indent=2)
+        if options['salida'] == '-':
+            self.stdout.write(contenido)
+        else:
+            with open(options['salida'], 'w', encoding='utf-8') as archivo:
+                archivo.write(contenido + '\n')
+            self.stdout.write(f"📄 Reporte en {options['salida']} ({duracion:.1f}s)")
+
+        if fallidas:
+            raise CommandError(f'{fallidas} combinaciones mazo/cantidad no pasaron las pruebas de uniformidad')
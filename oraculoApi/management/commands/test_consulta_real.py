@@ -6,7 +6,7 @@ import json
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 from oraculoApi.models import Set, Mazo, Carta, Tirada, ItemDeTirada
-from oraculoApi.services import gemini_service
+from oraculoApi.services import get_gemini_service
 from oraculoApi.serializers import CartaSerializer, TiradaSerializer
 
 class Command(BaseCommand):
@@ -164,6 +164,7 @@ class Command(BaseCommand):
             
             # Paso 7: Generar prompt para IA (CORREGIDO - Ahora incluye tirada)
             self.stdout.write("\n✍️ PASO 7: Creando prompt mejorado para Gemini...")
+            gemini_service = get_gemini_service()
             prompt = gemini_service.crear_prompt_tarot(pregunta, mazo, tirada, cartas_resultado)
             
             if verbose:
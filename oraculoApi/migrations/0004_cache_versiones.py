@@ -0,0 +1,19 @@
+from django.core.management import call_command
+from django.db import migrations
+
+
+def crear_tabla_cache(apps, schema_editor):
+    # Tabla del alias de cache 'versiones' cuando usa DatabaseCache (core/versiones.py);
+    # createcachetable no hace nada si la tabla ya existe o si el backend es otro
+    call_command('createcachetable', database=schema_editor.connection.alias, verbosity=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("oraculoApi", "0003_alter_carta_significado_invertida"),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_tabla_cache, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,189 @@
+"""
+Protecciones alrededor de las llamadas a Gemini.
+
+- LimitadorConcurrencia: máximo de llamadas simultáneas por proceso. Si Gemini
+  se pone lento, las consultas esperan un tiempo acotado por un cupo en vez
+  de ocupar todos los workers (y dejar sin atender billing, perfil, etc.).
+- CircuitBreaker: tras N fallos o timeouts seguidos deja de llamar a Gemini
+  durante un tiempo y las consultas reciben de inmediato la interpretación
+  alternativa; después deja pasar una llamada de prueba para ver si se
+  recuperó.
+
+Ambos son thread-safe y reciben el reloj como parámetro para poder
+probarlos sin esperar en tiempo real.
+"""
+import asyncio
+import threading
+import time
+
+
+class CircuitoAbierto(Exception):
+    """
+    El circuit breaker está abierto: no se llama a Gemini
+    """
+    pass
+
+
+class SinCapacidad(Exception):
+    """
+    No se liberó un cupo de concurrencia dentro del tiempo de espera
+    """
+    pass
+
+
+class LimitadorConcurrencia:
+    """
+    Semáforo con métricas de cupos en uso y consultas en espera
+    """
+
+    def __init__(self, maximo):
+        self.maximo = maximo
+        self._semaforo = threading.BoundedSemaphore(maximo)
+        self._lock = threading.Lock()
+        self.en_vuelo = 0
+        self.en_espera = 0
+        self.rechazadas = 0
+
+    def _tomar(self, espera):
+        if self._semaforo.acquire(blocking=False):
+            return True
+        with self._lock:
+            self.en_espera += 1
+        try:
+            return self._semaforo.acquire(timeout=espera)
+        finally:
+            with self._lock:
+                self.en_espera -= 1
+
+    def _registrar(self, adquirido):
+        with self._lock:
+            if adquirido:
+                self.en_vuelo += 1
+            else:
+                self.rechazadas += 1
+        if not adquirido:
+            raise SinCapacidad(f'Sin cupo para llamar a Gemini ({self.maximo} en vuelo)')
+
+    def adquirir(self, espera):
+        """
+        Tomar un cupo esperando como máximo `espera` segundos
+        """
+        self._registrar(self._tomar(espera))
+
+    async def adquirir_async(self, espera):
+        """
+        Igual que adquirir() sin bloquear el event loop mientras se espera
+        """
+        if self._semaforo.acquire(blocking=False):
+            self._registrar(True)
+            return
+
+        # El thread no se puede cancelar: si la consulta se cancela mientras
+        # espera, quien de los dos termine último devuelve el cupo
+        lock = threading.Lock()
+        estado = {'cancelada': False, 'tomado': False}
+
+        def tomar():
+            adquirido = self._tomar(espera)
+            with lock:
+                if estado['cancelada']:
+                    if adquirido:
+                        self._semaforo.release()
+                    return False
+                estado['tomado'] = adquirido
+            return adquirido
+
+        try:
+            adquirido = await asyncio.to_thread(tomar)
+        except asyncio.CancelledError:
+            with lock:
+                estado['cancelada'] = True
+                if estado['tomado']:
+                    self._semaforo.release()
+            raise
+        self._registrar(adquirido)
+
+    def liberar(self):
+        with self._lock:
+            self.en_vuelo -= 1
+        self._semaforo.release()
+
+    def estado(self):
+        with self._lock:
+            return {
+                'max_concurrencia': self.maximo,
+                'en_vuelo': self.en_vuelo,
+                'en_espera': self.en_espera,
+                'rechazadas': self.rechazadas,
+            }
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker de tres estados: cerrado -> abierto -> semiabierto
+    """
+    CERRADO = 'cerrado'
+    ABIERTO = 'abierto'
+    SEMIABIERTO = 'semiabierto'
+
+    def __init__(self, umbral_fallos, tiempo_apertura, reloj=time.monotonic):
+        self.umbral_fallos = umbral_fallos
+        self.tiempo_apertura = tiempo_apertura
+        self._reloj = reloj
+        self._lock = threading.Lock()
+        self._estado = self.CERRADO
+        self._fallos_consecutivos = 0
+        self._abierto_desde = None
+        self._prueba_en_curso = False
+        self.aperturas = 0
+
+    def permitir(self):
+        """
+        Lanza CircuitoAbierto si no se debe llamar a Gemini ahora
+        """
+        with self._lock:
+            if self._estado == self.ABIERTO:
+                if self._reloj() - self._abierto_desde < self.tiempo_apertura:
+                    raise CircuitoAbierto('Circuito de Gemini abierto')
+                self._estado = self.SEMIABIERTO
+
+            if self._estado == self.SEMIABIERTO:
+                # Solo una llamada de prueba a la vez
+                if self._prueba_en_curso:
+                    raise CircuitoAbierto('Circuito de Gemini semiabierto, prueba en curso')
+                self._prueba_en_curso = True
+
+    def registrar_exito(self):
+        with self._lock:
+            self._estado = self.CERRADO
+            self._fallos_consecutivos = 0
+            self._prueba_en_curso = False
+
+    def registrar_fallo(self):
+        with self._lock:
+            self._fallos_consecutivos += 1
+            self._prueba_en_curso = False
+            if self._estado == self.SEMIABIERTO or self._fallos_consecutivos >= self.umbral_fallos:
+                if self._estado != self.ABIERTO:
+                    self.aperturas += 1
+                self._estado = self.ABIERTO
+                self._abierto_desde = self._reloj()
+
+    def cancelar_prueba(self):
+        """
+        La llamada permitida terminó sin resultado (p. ej. el cliente cortó el stream)
+        """
+        with self._lock:
+            self._prueba_en_curso = False
+
+    def estado(self):
+        with self._lock:
+            estado = self._estado
+            if estado == self.ABIERTO and self._reloj() - self._abierto_desde >= self.tiempo_apertura:
+                estado = self.SEMIABIERTO
+            return {
+                'circuito': estado,
+                'fallos_consecutivos': self._fallos_consecutivos,
+                'umbral_fallos': self.umbral_fallos,
+                'aperturas': self.aperturas,
+            }
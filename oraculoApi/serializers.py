@@ -1,37 +1,40 @@
 from rest_framework import serializers
+from core.campos import CamposDinamicosMixin
 from .models import Set, Mazo, Carta, Tirada, ItemDeTirada
 
 
-class SetSerializer(serializers.ModelSerializer):
+class SetSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     class Meta:
         model = Set
         fields = ['id', 'nombre', 'descripcion']
 
 
-class MazoSerializer(serializers.ModelSerializer):
+class MazoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     set_nombre = serializers.CharField(source='set.nombre', read_only=True)
     
     class Meta:
         model = Mazo
         fields = ['id', 'set', 'set_nombre', 'nombre', 'descripcion', 'permite_cartas_invertidas']
+        expandibles = {'set': SetSerializer}
 
 
-class CartaSerializer(serializers.ModelSerializer):
+class CartaSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     mazo_nombre = serializers.CharField(source='mazo.nombre', read_only=True)
     
     class Meta:
         model = Carta
         fields = ['id', 'mazo', 'mazo_nombre', 'numero', 'nombre', 'imagen', 
                  'significado_normal', 'significado_invertida']
+        expandibles = {'mazo': MazoSerializer}
 
 
-class ItemDeTiradaSerializer(serializers.ModelSerializer):
+class ItemDeTiradaSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     class Meta:
         model = ItemDeTirada
         fields = ['id', 'nombre_posicion', 'descripcion', 'orden']
 
 
-class TiradaSerializer(serializers.ModelSerializer):
+class TiradaSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     mazo_nombre = serializers.CharField(source='mazo.nombre', read_only=True)
     items = ItemDeTiradaSerializer(many=True, read_only=True)
     
@@ -39,10 +42,11 @@ class TiradaSerializer(serializers.ModelSerializer):
         model = Tirada
         fields = ['id', 'mazo', 'mazo_nombre', 'nombre', 'descripcion', 
                  'imagen', 'cantidad_cartas', 'costo', 'items']
+        expandibles = {'mazo': MazoSerializer}
 
 
 # Serializers para el flujo principal de consulta
-class SetConMazosSerializer(serializers.ModelSerializer):
+class SetConMazosSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     mazos = MazoSerializer(many=True, read_only=True)
     
     class Meta:
@@ -50,7 +54,7 @@ class SetConMazosSerializer(serializers.ModelSerializer):
         fields = ['id', 'nombre', 'descripcion', 'mazos']
 
 
-class MazoConTiradasSerializer(serializers.ModelSerializer):
+class MazoConTiradasSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     tiradas = TiradaSerializer(many=True, read_only=True)
     set_nombre = serializers.CharField(source='set.nombre', read_only=True)
     
@@ -58,6 +62,7 @@ class MazoConTiradasSerializer(serializers.ModelSerializer):
         model = Mazo
         fields = ['id', 'set', 'set_nombre', 'nombre', 'descripcion', 
                  'permite_cartas_invertidas', 'tiradas']
+        expandibles = {'set': SetSerializer}
 
 
 # Serializer para la respuesta de la consulta de tarot
@@ -80,4 +85,5 @@ class RespuestaTarotSerializer(serializers.Serializer):
     pregunta = serializers.CharField()
     interpretacion_ia = serializers.CharField()
     cartas = CartaEnTiradaSerializer(many=True)
-    tirada_info = TiradaSerializer()
\ No newline at end of file
+    tirada_info = TiradaSerializer()
+    semilla_sorteo = serializers.IntegerField()
\ No newline at end of file
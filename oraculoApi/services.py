@@ -1,24 +1,336 @@
-import google.generativeai as genai
 from django.conf import settings
+import asyncio
 import logging
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+from .catalogo import version_catalogo
+from .resiliencia import CircuitBreaker, CircuitoAbierto, LimitadorConcurrencia, SinCapacidad
+from .clasificador import clasificador_preguntas
 
 logger = logging.getLogger(__name__)
 
+MODELO_GEMINI = 'gemini-2.0-flash-lite'
+
+# ==========================================
+# PLANTILLAS DEL PROMPT DE TAROT
+# ==========================================
+# Precompiladas una sola vez; crear_prompt_tarot las concatena en orden
+
+_PROMPT_ENCABEZADO = """🔮 SISTEMA DE INTERPRETACIÓN PROFESIONAL DE TAROT 🔮
+
+INSTRUCCIONES FUNDAMENTALES:
+- Eres un tarotista profesional con décadas de experiencia
+- NUNCA inventes información que no tienes
+- Analiza primero, interpreta después
+- Sé específico y directo en tus predicciones
+- Usa toda la información proporcionada de manera precisa
+
+═══════════════════════════════════════════════════════════════
+
+📚 INFORMACIÓN DEL MAZO UTILIZADO:
+"""
+
+_PROMPT_MAZO = """• Nombre: {nombre}
+• Descripción: {descripcion}
+• Permite cartas invertidas: {invertidas}
+• Set: {set_nombre} - {set_descripcion}
+
+═══════════════════════════════════════════════════════════════
+
+"""
+
+_PROMPT_TIRADA = """🎯 TIRADA SELECCIONADA: {nombre}
+📖 Descripción de la tirada: {descripcion}
+📊 Número de cartas: {num_cartas} cartas
+💰 Valor energético: {costo} créditos
+
+🔮 SIGNIFICADO DE LA TIRADA:
+{significado}
+
+"""
+
+_PROMPT_PREGUNTA = """🔥 PREGUNTA DEL CONSULTANTE:
+"{pregunta}"
+
+💭 CONTEXTO DETECTADO: {tipo}
+📋 ENFOQUE REQUERIDO: {enfoque}
+
+═══════════════════════════════════════════════════════════════
+
+🃏 CARTAS EXTRAÍDAS Y SUS POSICIONES:
+"""
+
+_PROMPT_CARTA = """
+┌─ CARTA {i} ─────────────────────────────────────────────┐
+│ 📍 POSICIÓN EN TIRADA: {posicion}
+│ 🎯 ROL ESPECÍFICO: {descripcion_posicion}
+│ 🃏 CARTA REVELADA: {nombre} ({orientacion})
+│ 🔢 NÚMERO EN MAZO: #{numero}
+│ ⚡ ENERGÍA ACTIVA: {significado}...
+│ 🧭 CONTEXTO TIRADA: Esta carta responde específicamente a 
+│     "{descripcion_posicion}" en tu consulta
+└────────────────────────────────────────────────────────┘
+"""
+
+_PROMPT_PROCESO = """
+═══════════════════════════════════════════════════════════════
+
+🎭 PROCESO DE INTERPRETACIÓN OBLIGATORIO:
+
+PASO 1 - ANÁLISIS DE LA TIRADA COMPLETA:
+Primero comprende el propósito de la tirada "{nombre}":
+{descripcion}
+
+PASO 2 - ANÁLISIS INDIVIDUAL POR POSICIÓN:
+Examina cada carta en su función específica dentro de la tirada:
+"""
+
+_PROMPT_SINTESIS = """
+
+PASO 3 - SÍNTESIS DE ENERGÍAS:
+Une las energías de todas las cartas según el diseño de la tirada.
+Busca patrones, contradicciones y complementos entre las posiciones.
+
+PASO 4 - INTERPRETACIÓN CONTEXTUAL:
+"""
+
+_PROMPT_FORMATO = """
+
+PASO 5 - PREDICCIÓN REALISTA BASADA EN LA TIRADA:
+Proporciona predicciones específicas que honren el diseño y propósito de "{nombre}".
+
+═══════════════════════════════════════════════════════════════
+
+📝 FORMATO DE RESPUESTA REQUERIDO:
+
+🔮 **RESUMEN DE LA TIRADA "{nombre_upper}"**
+[Explicación de qué revela esta tirada específica sobre la consulta]
+
+📊 **INTERPRETACIÓN POR POSICIÓN**"""
+
+_PROMPT_POSICION = """
+• **{posicion}** ({descripcion_posicion})
+  🃏 {nombre} {orientacion_emoji}
+  └─ [Interpreta cómo esta carta responde específicamente a "{descripcion_posicion}"]"""
+
+_PROMPT_RESPUESTA = """
+
+🎯 **RESPUESTA DIRECTA A TU PREGUNTA**
+[Respuesta clara y específica a: "{pregunta}"]
+
+"""
+
+_PROMPT_CIERRE = """🔍 **DETALLES REVELADOS**
+[Información adicional que las cartas quieren destacar]
+
+⏰ **TIMING Y SEÑALES**
+[Cuándo esperar cambios o qué señales observar]
+
+🌟 **CONSEJO FINAL**
+[Acción concreta recomendada basada en las cartas]
+
+═══════════════════════════════════════════════════════════════
+
+⚠️ RESTRICCIONES IMPORTANTES:
+- DEBES interpretar cada carta según su ROL ESPECÍFICO en la tirada "{nombre}"
+- NO ignores la función de cada posición en el diseño de la tirada
+- NO uses frases vagas como "depende de ti" o "el universo decidirá"
+- NO inventes cartas que no están en la tirada
+- SÍ sé específico sobre probabilidades y tendencias
+- SÍ menciona las cartas por nombre y posición cuando las interpretes
+- SÍ respeta el diseño y propósito original de la tirada seleccionada
+- RESPONDE SOLO DESPUÉS de analizar la tirada completa y cada posición
+
+🌟 AHORA PROCEDE CON LA INTERPRETACIÓN COMPLETA DE LA TIRADA "{nombre}":
+"""
+
 class GeminiService:
     def __init__(self):
         """
         Inicializar el servicio de Gemini con 2.0 Flash-Lite (más económico y eficiente)
         """
         try:
+            # Import diferido: google.generativeai arrastra grpc/protobuf y
+            # solo hace falta cuando de verdad se va a llamar a Gemini
+            import google.generativeai as genai
+
             genai.configure(api_key=settings.GEMINI_API_KEY)
+            self._genai = genai
             # ACTUALIZADO: Usar Gemini 2.0 Flash-Lite para máxima eficiencia de costos
-            self.model = genai.GenerativeModel('gemini-2.0-flash-lite')
-            logger.info("Gemini service initialized successfully with gemini-2.0-flash-lite")
+            self.model_name = MODELO_GEMINI
+            self.model = genai.GenerativeModel(self.model_name)
+            self._prompt_cache = {}
+            self._prompt_cache_clave = None
+
+            limites = settings.GEMINI_LIMITES
+            self.deadline = limites['DEADLINE']
+            self.espera_max = limites['ESPERA_MAX']
+            self.limitador = LimitadorConcurrencia(limites['MAX_CONCURRENCIA'])
+            self.breaker = CircuitBreaker(limites['UMBRAL_FALLOS'], limites['TIEMPO_APERTURA'])
+            logger.info(f"Gemini service initialized successfully with {self.model_name}")
             logger.info("💰 Usando modelo más económico: $0.075/$0.30 por 1M tokens")
         except Exception as e:
             logger.error(f"Error initializing Gemini service: {str(e)}")
             raise
     
+    def _generation_config(self):
+        """
+        Configuración optimizada para 2.0 Flash-Lite
+        """
+        return self._genai.types.GenerationConfig(
+            temperature=0.85,  # Ligeramente más creativo para interpretaciones místicas
+            top_p=0.9,
+            top_k=40,
+            max_output_tokens=1200,  # Aumentado para interpretaciones más completas
+            response_mime_type="text/plain",
+        )
+
+    def _safety_settings(self):
+        """
+        Configuración de seguridad (permitir contenido místico/esotérico)
+        """
+        return [
+            {
+                "category": "HARM_CATEGORY_HARASSMENT",
+                "threshold": "BLOCK_MEDIUM_AND_ABOVE"
+            },
+            {
+                "category": "HARM_CATEGORY_HATE_SPEECH",
+                "threshold": "BLOCK_MEDIUM_AND_ABOVE"
+            },
+            {
+                "category": "HARM_CATEGORY_SEXUALLY_EXPLICIT",
+                "threshold": "BLOCK_MEDIUM_AND_ABOVE"
+            },
+            {
+                "category": "HARM_CATEGORY_DANGEROUS_CONTENT",
+                "threshold": "BLOCK_MEDIUM_AND_ABOVE"
+            }
+        ]
+
+    def _extraer_interpretacion(self, response):
+        """
+        Extraer el texto de la respuesta de Gemini, o la interpretación alternativa
+        si fue bloqueada o viene vacía
+        """
+        logger.info("✅ Respuesta recibida de Gemini 2.0 Flash-Lite")
+
+        if response.candidates and len(response.candidates) > 0:
+            candidate = response.candidates[0]
+
+            # Verificar si la respuesta fue bloqueada por seguridad
+            if hasattr(candidate, 'finish_reason'):
+                logger.info(f"🔍 Finish reason: {candidate.finish_reason}")
+
+                # Si fue bloqueado por seguridad, usar interpretación alternativa
+                if hasattr(candidate.finish_reason, 'name') and candidate.finish_reason.name in ['SAFETY', 'RECITATION']:
+                    logger.warning("⚠️ Respuesta bloqueada por filtros de seguridad")
+                    return self._get_mystical_fallback_interpretation()
+
+            if hasattr(candidate, 'content') and candidate.content and candidate.content.parts:
+                interpretacion = candidate.content.parts[0].text
+                logger.info("🎭 Interpretación mística generada exitosamente")
+                logger.info(f"📊 Tokens estimados: ~{len(interpretacion) // 4} (costo: ~$0.0002)")
+                return interpretacion.strip()
+            else:
+                logger.warning("⚠️ No se pudo extraer texto de la respuesta")
+                return self._get_mystical_fallback_interpretation()
+        else:
+            logger.warning("⚠️ No hay candidatos en la respuesta de Gemini")
+            return self._get_mystical_fallback_interpretation()
+
+    def _manejar_error_generacion(self, e):
+        """
+        Registrar el error de generación y devolver la interpretación alternativa
+        """
+        if isinstance(e, (CircuitoAbierto, SinCapacidad)):
+            logger.warning(f"⚡ Gemini no disponible, usando interpretación alternativa: {str(e)}")
+            return self._get_mystical_fallback_interpretation()
+
+        logger.error(f"❌ Error generating tarot interpretation: {str(e)}")
+        logger.error(f"🔧 Tipo de error: {type(e).__name__}")
+
+        # Si es un error 404, sugerir modelo alternativo
+        if "404" in str(e) or "not found" in str(e).lower():
+            logger.error("💡 Modelo gemini-2.0-flash-lite no disponible, considera usar gemini-1.5-flash")
+
+        return self._get_mystical_fallback_interpretation()
+
+    def _request_options(self):
+        return {'timeout': self.deadline}
+
+    def _registrar_resultado(self, inicio, medir_deadline):
+        if medir_deadline and time.monotonic() - inicio > self.deadline:
+            # El cliente de Gemini no siempre respeta el timeout: una respuesta
+            # fuera de plazo cuenta como fallo para el circuit breaker
+            logger.warning(f"⏰ Gemini respondió fuera del deadline de {self.deadline}s")
+            self.breaker.registrar_fallo()
+        else:
+            self.breaker.registrar_exito()
+
+    @contextmanager
+    def _llamada_protegida(self, medir_deadline=True):
+        """
+        Envolver una llamada a Gemini con el circuit breaker y el límite de
+        concurrencia. Lanza CircuitoAbierto o SinCapacidad sin llamar a Gemini.
+        """
+        self.breaker.permitir()
+        try:
+            self.limitador.adquirir(self.espera_max)
+        except SinCapacidad:
+            self.breaker.cancelar_prueba()
+            raise
+
+        inicio = time.monotonic()
+        terminada = False
+        try:
+            yield
+            terminada = True
+        except Exception:
+            self.breaker.registrar_fallo()
+            raise
+        finally:
+            self.limitador.liberar()
+            if terminada:
+                self._registrar_resultado(inicio, medir_deadline)
+            else:
+                self.breaker.cancelar_prueba()
+
+    @asynccontextmanager
+    async def _llamada_protegida_async(self):
+        """
+        Versión asíncrona de _llamada_protegida
+        """
+        self.breaker.permitir()
+        try:
+            await self.limitador.adquirir_async(self.espera_max)
+        except SinCapacidad:
+            self.breaker.cancelar_prueba()
+            raise
+
+        inicio = time.monotonic()
+        terminada = False
+        try:
+            yield
+            terminada = True
+        except Exception:
+            self.breaker.registrar_fallo()
+            raise
+        finally:
+            self.limitador.liberar()
+            if terminada:
+                self._registrar_resultado(inicio, True)
+            else:
+                self.breaker.cancelar_prueba()
+
+    def estado_llamadas(self):
+        """
+        Estado del circuit breaker y de la cola de llamadas a Gemini, para monitoreo
+        """
+        return {**self.breaker.estado(), **self.limitador.estado(), 'deadline': self.deadline}
+
     def generar_interpretacion_tarot(self, prompt_completo):
         """
         Generar interpretación de tarot usando Gemini 2.0 Flash-Lite
@@ -31,81 +343,127 @@ class GeminiService:
         """
         try:
             logger.info("🔮 Iniciando generación de interpretación con Gemini 2.0 Flash-Lite")
-            
-            # Configuración optimizada para 2.0 Flash-Lite
-            generation_config = genai.types.GenerationConfig(
-                temperature=0.85,  # Ligeramente más creativo para interpretaciones místicas
-                top_p=0.9,
-                top_k=40,
-                max_output_tokens=1200,  # Aumentado para interpretaciones más completas
-                response_mime_type="text/plain",
-            )
-            
-            # Configuración de seguridad (permitir contenido místico/esotérico)
-            safety_settings = [
-                {
-                    "category": "HARM_CATEGORY_HARASSMENT",
-                    "threshold": "BLOCK_MEDIUM_AND_ABOVE"
-                },
-                {
-                    "category": "HARM_CATEGORY_HATE_SPEECH", 
-                    "threshold": "BLOCK_MEDIUM_AND_ABOVE"
-                },
-                {
-                    "category": "HARM_CATEGORY_SEXUALLY_EXPLICIT",
-                    "threshold": "BLOCK_MEDIUM_AND_ABOVE"
-                },
-                {
-                    "category": "HARM_CATEGORY_DANGEROUS_CONTENT",
-                    "threshold": "BLOCK_MEDIUM_AND_ABOVE"
-                }
-            ]
-            
             logger.info("📡 Enviando prompt a Gemini 2.0 Flash-Lite...")
-            
+
             # Generar respuesta
-            response = self.model.generate_content(
-                prompt_completo,
-                generation_config=generation_config,
-                safety_settings=safety_settings
-            )
-            
-            logger.info("✅ Respuesta recibida de Gemini 2.0 Flash-Lite")
-            
-            if response.candidates and len(response.candidates) > 0:
-                candidate = response.candidates[0]
-                
-                # Verificar si la respuesta fue bloqueada por seguridad
-                if hasattr(candidate, 'finish_reason'):
-                    logger.info(f"🔍 Finish reason: {candidate.finish_reason}")
-                    
-                    # Si fue bloqueado por seguridad, usar interpretación alternativa
-                    if hasattr(candidate.finish_reason, 'name') and candidate.finish_reason.name in ['SAFETY', 'RECITATION']:
-                        logger.warning("⚠️ Respuesta bloqueada por filtros de seguridad")
-                        return self._get_mystical_fallback_interpretation()
-                
-                if hasattr(candidate, 'content') and candidate.content and candidate.content.parts:
-                    interpretacion = candidate.content.parts[0].text
-                    logger.info("🎭 Interpretación mística generada exitosamente")
-                    logger.info(f"📊 Tokens estimados: ~{len(interpretacion) // 4} (costo: ~$0.0002)")
-                    return interpretacion.strip()
-                else:
-                    logger.warning("⚠️ No se pudo extraer texto de la respuesta")
-                    return self._get_mystical_fallback_interpretation()
+            with self._llamada_protegida():
+                response = self.model.generate_content(
+                    prompt_completo,
+                    generation_config=self._generation_config(),
+                    safety_settings=self._safety_settings(),
+                    request_options=self._request_options()
+                )
+            return self._extraer_interpretacion(response)
+
+        except Exception as e:
+            return self._manejar_error_generacion(e)
+
+    async def generar_interpretacion_tarot_async(self, prompt_completo):
+        """
+        Versión asíncrona de generar_interpretacion_tarot para vistas ASGI.
+        No bloquea el event loop mientras Gemini genera la respuesta.
+
+        Args:
+            prompt_completo (str): El prompt completo para la IA
+
+        Returns:
+            str: La interpretación generada por la IA
+        """
+        try:
+            logger.info("🔮 Iniciando generación asíncrona de interpretación con Gemini 2.0 Flash-Lite")
+
+            async with self._llamada_protegida_async():
+                response = await asyncio.wait_for(
+                    self.model.generate_content_async(
+                        prompt_completo,
+                        generation_config=self._generation_config(),
+                        safety_settings=self._safety_settings(),
+                        request_options=self._request_options()
+                    ),
+                    timeout=self.deadline
+                )
+            return self._extraer_interpretacion(response)
+
+        except Exception as e:
+            return self._manejar_error_generacion(e)
+
+    def _texto_de_chunk(self, chunk):
+        """
+        Extraer el texto de un chunk del stream. Devuelve None si Gemini
+        cortó la respuesta por filtros de seguridad.
+        """
+        if not chunk.candidates:
+            return ''
+
+        candidate = chunk.candidates[0]
+        finish_reason = getattr(candidate, 'finish_reason', None)
+        if hasattr(finish_reason, 'name') and finish_reason.name in ['SAFETY', 'RECITATION']:
+            return None
+
+        if hasattr(candidate, 'content') and candidate.content and candidate.content.parts:
+            return ''.join(part.text for part in candidate.content.parts)
+        return ''
+
+    def generar_interpretacion_tarot_stream(self, prompt_completo, resultado=None):
+        """
+        Generar interpretación de tarot en modo streaming (stream=True)
+
+        Args:
+            prompt_completo (str): El prompt completo para la IA
+            resultado (dict, opcional): se marca resultado['completa'] = True si
+                Gemini terminó la interpretación sin cortes ni fallback
+
+        Yields:
+            str: Fragmentos de la interpretación a medida que Gemini los genera.
+            Si falla antes de emitir texto, se emite la interpretación alternativa.
+        """
+        emitido = False
+        try:
+            logger.info("🔮 Iniciando generación en streaming con Gemini 2.0 Flash-Lite")
+
+            cortado = False
+            # El cupo se mantiene mientras dure el stream; el deadline se aplica
+            # a cada petición del stream, no a la transmisión completa
+            with self._llamada_protegida(medir_deadline=False):
+                response = self.model.generate_content(
+                    prompt_completo,
+                    generation_config=self._generation_config(),
+                    safety_settings=self._safety_settings(),
+                    request_options=self._request_options(),
+                    stream=True
+                )
+
+                for chunk in response:
+                    texto = self._texto_de_chunk(chunk)
+                    if texto is None:
+                        logger.warning("⚠️ Stream cortado por filtros de seguridad")
+                        cortado = True
+                        break
+                    if texto:
+                        emitido = True
+                        yield texto
+
+            if emitido:
+                logger.info("🎭 Interpretación mística transmitida exitosamente")
+                if resultado is not None and not cortado:
+                    resultado['completa'] = True
             else:
-                logger.warning("⚠️ No hay candidatos en la respuesta de Gemini")
-                return self._get_mystical_fallback_interpretation()
-                
+                logger.warning("⚠️ El stream de Gemini no devolvió texto")
+                yield self._get_mystical_fallback_interpretation()
+
         except Exception as e:
-            logger.error(f"❌ Error generating tarot interpretation: {str(e)}")
-            logger.error(f"🔧 Tipo de error: {type(e).__name__}")
-            
-            # Si es un error 404, sugerir modelo alternativo
-            if "404" in str(e) or "not found" in str(e).lower():
-                logger.error("💡 Modelo gemini-2.0-flash-lite no disponible, considera usar gemini-1.5-flash")
-            
-            return self._get_mystical_fallback_interpretation()
-    
+            if emitido:
+                # El cliente ya recibió parte del texto: cortar el stream sin mezclar el fallback
+                logger.error(f"❌ Error a mitad del stream de interpretación: {str(e)}")
+            else:
+                yield self._manejar_error_generacion(e)
+
+    def es_interpretacion_alternativa(self, interpretacion):
+        """
+        Si el texto es la interpretación alternativa (Gemini falló o bloqueó la respuesta)
+        """
+        return interpretacion == self._get_mystical_fallback_interpretation()
+
     def _get_mystical_fallback_interpretation(self):
         """
         Interpretación mística alternativa cuando el servicio no está disponible
@@ -145,7 +503,11 @@ ancestral despierte memorias del alma que te guiarán hacia tu verdad más profu
         """
         PROMPT COMPLETAMENTE MEJORADO - Dinámico, estructurado y realista
         Usa toda la información disponible de los modelos para crear interpretaciones precisas
-        
+
+        Las secciones fijas están precompiladas a nivel de módulo y las que solo
+        dependen del mazo o de la tirada se cachean (ver _secciones_tirada); por
+        consulta solo se formatean la pregunta, el contexto y las cartas.
+
         Args:
             pregunta (str): La pregunta del usuario
             mazo (Mazo): Objeto del mazo utilizado
@@ -153,143 +515,116 @@ ancestral despierte memorias del alma que te guiarán hacia tu verdad más profu
             cartas_resultado (list): Lista de cartas con sus posiciones
         """
         
-        # 1. INFORMACIÓN COMPLETA DE LA TIRADA
+        # 1. INFORMACIÓN COMPLETA DE LA TIRADA (cacheada por mazo/tirada)
         num_cartas = len(cartas_resultado)
-        tirada_nombre = tirada.nombre
-        tirada_descripcion = tirada.descripcion
-        tirada_costo = tirada.costo
+        seccion_mazo = self._seccion_mazo(mazo)
+        tirada_cabecera, tirada_proceso, tirada_formato, tirada_cierre = self._secciones_tirada(tirada, num_cartas)
         
         # 2. ANÁLISIS DE CONTEXTO DE LA PREGUNTA
         contexto_pregunta = self._analizar_contexto_pregunta(pregunta)
         
-        prompt = f"""🔮 SISTEMA DE INTERPRETACIÓN PROFESIONAL DE TAROT 🔮
-
-INSTRUCCIONES FUNDAMENTALES:
-- Eres un tarotista profesional con décadas de experiencia
-- NUNCA inventes información que no tienes
-- Analiza primero, interpreta después
-- Sé específico y directo en tus predicciones
-- Usa toda la información proporcionada de manera precisa
-
-═══════════════════════════════════════════════════════════════
-
-📚 INFORMACIÓN DEL MAZO UTILIZADO:
-• Nombre: {mazo.nombre}
-• Descripción: {mazo.descripcion}
-• Permite cartas invertidas: {"Sí" if mazo.permite_cartas_invertidas else "No"}
-• Set: {mazo.set.nombre} - {mazo.set.descripcion}
-
-═══════════════════════════════════════════════════════════════
-
-🎯 TIRADA SELECCIONADA: {tirada_nombre}
-📖 Descripción de la tirada: {tirada_descripcion}
-📊 Número de cartas: {num_cartas} cartas
-💰 Valor energético: {tirada_costo} créditos
-
-🔮 SIGNIFICADO DE LA TIRADA:
-{self._obtener_significado_tirada(tirada, cartas_resultado)}
-
-🔥 PREGUNTA DEL CONSULTANTE:
-"{pregunta}"
-
-💭 CONTEXTO DETECTADO: {contexto_pregunta['tipo']}
-📋 ENFOQUE REQUERIDO: {contexto_pregunta['enfoque']}
-
-═══════════════════════════════════════════════════════════════
-
-🃏 CARTAS EXTRAÍDAS Y SUS POSICIONES:
-"""
+        partes = [
+            _PROMPT_ENCABEZADO,
+            seccion_mazo,
+            tirada_cabecera,
+            _PROMPT_PREGUNTA.format(
+                pregunta=pregunta,
+                tipo=contexto_pregunta['tipo'],
+                enfoque=contexto_pregunta['enfoque'],
+            ),
+        ]
 
         # 3. INFORMACIÓN DETALLADA DE CADA CARTA CON SU CONTEXTO EN LA TIRADA
         for i, carta_info in enumerate(cartas_resultado, 1):
             carta = carta_info['carta']
-            orientacion = "INVERTIDA ⥯" if carta_info['es_invertida'] else "DERECHA ⬆"
-            
-            prompt += f"""
-┌─ CARTA {i} ─────────────────────────────────────────────┐
-│ 📍 POSICIÓN EN TIRADA: {carta_info['posicion']}
-│ 🎯 ROL ESPECÍFICO: {carta_info['descripcion_posicion']}
-│ 🃏 CARTA REVELADA: {carta['nombre']} ({orientacion})
-│ 🔢 NÚMERO EN MAZO: #{carta.get('numero', 'N/A')}
-│ ⚡ ENERGÍA ACTIVA: {carta_info['significado_usado'][:150]}...
-│ 🧭 CONTEXTO TIRADA: Esta carta responde específicamente a 
-│     "{carta_info['descripcion_posicion']}" en tu consulta
-└────────────────────────────────────────────────────────┘
-"""
+            partes.append(_PROMPT_CARTA.format(
+                i=i,
+                posicion=carta_info['posicion'],
+                descripcion_posicion=carta_info['descripcion_posicion'],
+                nombre=carta['nombre'],
+                orientacion="INVERTIDA ⥯" if carta_info['es_invertida'] else "DERECHA ⬆",
+                numero=carta.get('numero', 'N/A'),
+                significado=carta_info['significado_usado'][:150],
+            ))
 
         # 4. INSTRUCCIONES ESPECÍFICAS POR CONTEXTO
-        prompt += f"""
-═══════════════════════════════════════════════════════════════
-
-🎭 PROCESO DE INTERPRETACIÓN OBLIGATORIO:
-
-PASO 1 - ANÁLISIS DE LA TIRADA COMPLETA:
-Primero comprende el propósito de la tirada "{tirada_nombre}":
-{tirada_descripcion}
-
-PASO 2 - ANÁLISIS INDIVIDUAL POR POSICIÓN:
-Examina cada carta en su función específica dentro de la tirada:
-{self._generar_guia_posiciones(cartas_resultado)}
-
-PASO 3 - SÍNTESIS DE ENERGÍAS:
-Une las energías de todas las cartas según el diseño de la tirada.
-Busca patrones, contradicciones y complementos entre las posiciones.
-
-PASO 4 - INTERPRETACIÓN CONTEXTUAL:
-{contexto_pregunta['instrucciones_especificas']}
-
-PASO 5 - PREDICCIÓN REALISTA BASADA EN LA TIRADA:
-Proporciona predicciones específicas que honren el diseño y propósito de "{tirada_nombre}".
-
-═══════════════════════════════════════════════════════════════
-
-📝 FORMATO DE RESPUESTA REQUERIDO:
-
-🔮 **RESUMEN DE LA TIRADA "{tirada_nombre.upper()}"**
-[Explicación de qué revela esta tirada específica sobre la consulta]
-
-📊 **INTERPRETACIÓN POR POSICIÓN**"""
+        partes.append(tirada_proceso)
+        partes.append(self._generar_guia_posiciones(cartas_resultado))
+        partes.append(_PROMPT_SINTESIS)
+        partes.append(contexto_pregunta['instrucciones_especificas'])
+        partes.append(tirada_formato)
 
         # 5. ESTRUCTURA DINÁMICA BASADA EN LAS POSICIONES REALES DE LA TIRADA
-        for i, carta_info in enumerate(cartas_resultado, 1):
-            orientacion_emoji = "🔄" if carta_info['es_invertida'] else "⬆️"
-            prompt += f"""
-• **{carta_info['posicion']}** ({carta_info['descripcion_posicion']})
-  🃏 {carta_info['carta']['nombre']} {orientacion_emoji}
-  └─ [Interpreta cómo esta carta responde específicamente a "{carta_info['descripcion_posicion']}"]"""
-
-        prompt += f"""
-
-🎯 **RESPUESTA DIRECTA A TU PREGUNTA**
-[Respuesta clara y específica a: "{pregunta}"]
-
-🔍 **DETALLES REVELADOS**
-[Información adicional que las cartas quieren destacar]
-
-⏰ **TIMING Y SEÑALES**
-[Cuándo esperar cambios o qué señales observar]
+        for carta_info in cartas_resultado:
+            partes.append(_PROMPT_POSICION.format(
+                posicion=carta_info['posicion'],
+                descripcion_posicion=carta_info['descripcion_posicion'],
+                nombre=carta_info['carta']['nombre'],
+                orientacion_emoji="🔄" if carta_info['es_invertida'] else "⬆️",
+            ))
+
+        partes.append(_PROMPT_RESPUESTA.format(pregunta=pregunta))
+        partes.append(tirada_cierre)
+        prompt = ''.join(partes)
 
-🌟 **CONSEJO FINAL**
-[Acción concreta recomendada basada en las cartas]
-
-═══════════════════════════════════════════════════════════════
+        logger.info(f"📝 Prompt generado: {len(prompt)} caracteres, ~{len(prompt)//4} tokens estimados")
+        logger.info(f"🎯 Tirada utilizada: {tirada.nombre} con {num_cartas} cartas")
+        return prompt
 
-⚠️ RESTRICCIONES IMPORTANTES:
-- DEBES interpretar cada carta según su ROL ESPECÍFICO en la tirada "{tirada_nombre}"
-- NO ignores la función de cada posición en el diseño de la tirada
-- NO uses frases vagas como "depende de ti" o "el universo decidirá"
-- NO inventes cartas que no están en la tirada
-- SÍ sé específico sobre probabilidades y tendencias
-- SÍ menciona las cartas por nombre y posición cuando las interpretes
-- SÍ respeta el diseño y propósito original de la tirada seleccionada
-- RESPONDE SOLO DESPUÉS de analizar la tirada completa y cada posición
+    def _cache_prompt(self):
+        """
+        Cache de secciones de prompt válido para la versión actual del catálogo
+        y del modelo; se vacía entero cuando cualquiera de las dos cambia
+        """
+        clave = (self.model_name, version_catalogo())
+        if self._prompt_cache_clave != clave:
+            self._prompt_cache = {}
+            self._prompt_cache_clave = clave
+        return self._prompt_cache
 
-🌟 AHORA PROCEDE CON LA INTERPRETACIÓN COMPLETA DE LA TIRADA "{tirada_nombre}":
-"""
+    def _seccion_mazo(self, mazo):
+        """
+        Bloque con la información del mazo (y su set)
+        """
+        cache_prompt = self._cache_prompt()
+        clave = ('mazo', mazo.pk)
+        seccion = cache_prompt.get(clave)
+        if seccion is None:
+            seccion = _PROMPT_MAZO.format(
+                nombre=mazo.nombre,
+                descripcion=mazo.descripcion,
+                invertidas="Sí" if mazo.permite_cartas_invertidas else "No",
+                set_nombre=mazo.set.nombre,
+                set_descripcion=mazo.set.descripcion,
+            )
+            cache_prompt[clave] = seccion
+        return seccion
 
-        logger.info(f"📝 Prompt generado: {len(prompt)} caracteres, ~{len(prompt)//4} tokens estimados")
-        logger.info(f"🎯 Tirada utilizada: {tirada_nombre} con {num_cartas} cartas")
-        return prompt
+    def _secciones_tirada(self, tirada, num_cartas):
+        """
+        Bloques que solo dependen de la tirada: cabecera con su significado,
+        proceso de interpretación, formato de respuesta y restricciones finales
+        """
+        cache_prompt = self._cache_prompt()
+        clave = ('tirada', tirada.pk, num_cartas)
+        secciones = cache_prompt.get(clave)
+        if secciones is None:
+            datos = {
+                'nombre': tirada.nombre,
+                'nombre_upper': tirada.nombre.upper(),
+                'descripcion': tirada.descripcion,
+                'num_cartas': num_cartas,
+                'costo': tirada.costo,
+                'significado': self._obtener_significado_tirada(tirada, [None] * num_cartas),
+            }
+            secciones = (
+                _PROMPT_TIRADA.format(**datos),
+                _PROMPT_PROCESO.format(**datos),
+                _PROMPT_FORMATO.format(**datos),
+                _PROMPT_CIERRE.format(**datos),
+            )
+            cache_prompt[clave] = secciones
+        return secciones
 
     def _obtener_significado_tirada(self, tirada, cartas_resultado):
         """
@@ -317,115 +652,34 @@ Proporciona predicciones específicas que honren el diseño y propósito de "{ti
 
     def _analizar_contexto_pregunta(self, pregunta):
         """
-        Analiza el contexto de la pregunta para proporcionar instrucciones específicas
+        Analiza el contexto de la pregunta para proporcionar instrucciones específicas.
+        La categoría de más peso define el enfoque; si la pregunta toca otras
+        temáticas se añaden también sus instrucciones.
         """
-        pregunta_lower = pregunta.lower()
-        
-        # AMOR Y RELACIONES
-        if any(word in pregunta_lower for word in ['amor', 'relación', 'pareja', 'ex', 'matrimonio', 'divorcio', 'infidelidad', 'novio', 'novia', 'esposo', 'esposa']):
+        categorias = clasificador_preguntas.clasificar(pregunta)
+        if not categorias:
+            principal = clasificador_preguntas.general
             return {
-                'tipo': 'AMOR Y RELACIONES',
-                'enfoque': 'Emocional y vincular',
-                'instrucciones_especificas': """
-Para consultas de amor:
-- Describe dinámicas emocionales específicas
-- Habla sobre comunicación, confianza y compatibilidad
-- Predice encuentros, reencuentros o separaciones
-- Menciona sentimientos y reacciones de las personas involucradas
-- Da fechas aproximadas para cambios importantes en la relación
-                """
-            }
-        
-        # TRABAJO Y CARRERA
-        elif any(word in pregunta_lower for word in ['trabajo', 'empleo', 'carrera', 'jefe', 'ascenso', 'despido', 'entrevista', 'proyecto', 'negocio', 'empresa']):
-            return {
-                'tipo': 'TRABAJO Y CARRERA',
-                'enfoque': 'Profesional y material',
-                'instrucciones_especificas': """
-Para consultas laborales:
-- Analiza oportunidades de crecimiento profesional
-- Predice cambios en el ambiente laboral
-- Describe relaciones con colegas y superiores
-- Menciona aspectos financieros y estabilidad económica
-- Da consejos sobre decisiones profesionales importantes
-                """
-            }
-        
-        # SALUD
-        elif any(word in pregunta_lower for word in ['salud', 'enfermedad', 'médico', 'doctor', 'hospital', 'síntomas', 'tratamiento', 'cirugía']):
-            return {
-                'tipo': 'SALUD Y BIENESTAR',
-                'enfoque': 'Físico y energético',
-                'instrucciones_especificas': """
-Para consultas de salud:
-- Enfócate en el bienestar general y energía vital
-- Describe cómo el estado emocional afecta la salud física
-- Predice la evolución de tratamientos o consultas médicas
-- Menciona la importancia del autocuidado y prevención
-- NUNCA diagnostiques condiciones médicas específicas
-                """
-            }
-        
-        # DINERO Y FINANZAS
-        elif any(word in pregunta_lower for word in ['dinero', 'finanzas', 'inversión', 'deuda', 'préstamo', 'lotería', 'herencia', 'economía']):
-            return {
-                'tipo': 'DINERO Y FINANZAS',
-                'enfoque': 'Material y práctico',
-                'instrucciones_especificas': """
-Para consultas financieras:
-- Analiza tendencias económicas personales
-- Predice oportunidades de ingresos o pérdidas
-- Describe la relación con el dinero y la abundancia
-- Menciona inversiones, gastos importantes o cambios financieros
-- Da consejos sobre administración y prudencia económica
-                """
-            }
-        
-        # FAMILIA
-        elif any(word in pregunta_lower for word in ['familia', 'madre', 'padre', 'hijo', 'hija', 'hermano', 'hermana', 'abuelo', 'abuela']):
-            return {
-                'tipo': 'FAMILIA Y HOGAR',
-                'enfoque': 'Familiar y doméstico',
-                'instrucciones_especificas': """
-Para consultas familiares:
-- Describe dinámicas familiares y roles
-- Predice cambios en la estructura o armonía familiar
-- Analiza conflictos generacionales o de convivencia
-- Menciona tradiciones, herencias o mudanzas
-- Da consejos sobre comunicación y comprensión familiar
-                """
-            }
-        
-        # ESPIRITUALIDAD
-        elif any(word in pregunta_lower for word in ['espiritual', 'alma', 'propósito', 'misión', 'karma', 'destino', 'energía']):
-            return {
-                'tipo': 'ESPIRITUALIDAD Y PROPÓSITO',
-                'enfoque': 'Espiritual y trascendente',
-                'instrucciones_especificas': """
-Para consultas espirituales:
-- Explora el crecimiento espiritual y la evolución del alma
-- Describe lecciones kármicas y propósitos de vida
-- Predice despertar espiritual o cambios de conciencia
-- Menciona prácticas espirituales recomendadas
-- Da orientación sobre el camino de auto-realización
-                """
-            }
-        
-        # GENERAL/OTROS
-        else:
-            return {
-                'tipo': 'CONSULTA GENERAL',
-                'enfoque': 'Holístico y equilibrado',
-                'instrucciones_especificas': """
-Para consultas generales:
-- Proporciona una visión integral de la situación
-- Analiza múltiples aspectos de la vida que podrían estar afectados
-- Predice cambios importantes en cualquier área
-- Describe patrones y ciclos de vida actuales
-- Da consejos prácticos y aplicables a la situación general
-                """
+                'tipo': principal['tipo'],
+                'enfoque': principal['enfoque'],
+                'instrucciones_especificas': principal['instrucciones_especificas'],
+                'categorias': [],
             }
 
+        principal = categorias[0][0]
+        tipo = principal['tipo']
+        if len(categorias) > 1:
+            tipo += f" (también: {', '.join(categoria['tipo'] for categoria, _ in categorias[1:])})"
+
+        return {
+            'tipo': tipo,
+            'enfoque': principal['enfoque'],
+            'instrucciones_especificas': ''.join(
+                categoria['instrucciones_especificas'] for categoria, _ in categorias
+            ),
+            'categorias': [(categoria['tipo'], round(peso, 2)) for categoria, peso in categorias],
+        }
+
     def test_connection(self):
         """
         Método para probar la conexión con Gemini 2.0 Flash-Lite
@@ -447,10 +701,25 @@ Para consultas generales:
             return False, str(e)
 
 
-# Instancia global del servicio
-try:
-    gemini_service = GeminiService()
-    logger.info("🚀 GeminiService con 2.0 Flash-Lite listo para consultas de tarot")
-except Exception as e:
-    logger.error(f"❌ Error creando instancia global de GeminiService: {str(e)}")
-    gemini_service = None
\ No newline at end of file
+# Instancia global del servicio, creada en el primer uso (no al importar el
+# módulo) para que migrate, el admin y el arranque de cada worker no paguen
+# el import de google.generativeai ni la configuración del cliente
+_gemini_service = None
+_gemini_service_lock = threading.Lock()
+
+
+def get_gemini_service():
+    """
+    Instancia compartida de GeminiService, o None si no se pudo inicializar
+    (se reintenta en la siguiente llamada)
+    """
+    global _gemini_service
+    if _gemini_service is None:
+        with _gemini_service_lock:
+            if _gemini_service is None:
+                try:
+                    _gemini_service = GeminiService()
+                    logger.info("🚀 GeminiService con 2.0 Flash-Lite listo para consultas de tarot")
+                except Exception as e:
+                    logger.error(f"❌ Error creando instancia global de GeminiService: {str(e)}")
+    return _gemini_service
\ No newline at end of file
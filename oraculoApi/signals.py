@@ -0,0 +1,24 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Set, Mazo, Carta, Tirada, ItemDeTirada
+from .catalogo import invalidar_catalogo
+
+
+@receiver(post_save, sender=Set)
+@receiver(post_save, sender=Mazo)
+@receiver(post_save, sender=Carta)
+@receiver(post_save, sender=Tirada)
+@receiver(post_save, sender=ItemDeTirada)
+@receiver(post_delete, sender=Set)
+@receiver(post_delete, sender=Mazo)
+@receiver(post_delete, sender=Carta)
+@receiver(post_delete, sender=Tirada)
+@receiver(post_delete, sender=ItemDeTirada)
+def catalogo_modificado(sender, **kwargs):
+    """
+    Invalidar todo lo cacheado a partir del catálogo cuando cambia cualquier modelo.
+    Se invalida al confirmar la transacción: antes, otro request podría leer
+    la versión nueva junto con el contenido anterior y cachearlo con ella
+    """
+    transaction.on_commit(invalidar_catalogo)
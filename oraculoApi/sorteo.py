@@ -0,0 +1,107 @@
+"""
+Motor de sorteo de cartas para las consultas.
+
+Cada sorteo usa su propio generador (random.Random) sembrado con una semilla
+nueva de `secrets`, en vez del módulo random global compartido por todos los
+threads. Las cartas se eligen sobre el arreglo compacto de ids del mazo
+(CatalogoSnapshot.ids_por_mazo, ordenado por id) y las orientaciones salen
+de una sola llamada a getrandbits, un bit por carta.
+
+La semilla se devuelve con la consulta y se guarda en el historial: con la
+semilla, el mazo y la tirada, reproducir() vuelve a obtener exactamente las
+mismas cartas y orientaciones mientras el mazo tenga las mismas cartas.
+
+sortear_lote() usa el mismo código para generar miles de sorteos seguidos
+(simulaciones y pruebas de uniformidad, ver los comandos bench_sorteo y
+equidad_sorteo).
+"""
+import random
+import secrets
+from array import array
+from dataclasses import dataclass
+
+# Semillas de 53 bits: se pueden enviar como número en JSON sin perder precisión
+BITS_SEMILLA = 53
+
+
+@dataclass(frozen=True)
+class Sorteo:
+    semilla: int
+    cartas: tuple
+    invertidas: tuple
+
+
+def nueva_semilla():
+    return secrets.randbits(BITS_SEMILLA)
+
+
+def arreglo_ids(ids_cartas):
+    """
+    Arreglo compacto y ordenado de ids de cartas, el que usa el sorteo
+    """
+    return array('q', sorted(ids_cartas))
+
+
+def _sortear(generador, ids_cartas, cantidad, permite_invertidas):
+    cartas = generador.sample(ids_cartas, cantidad)
+    bits = generador.getrandbits(cantidad) if permite_invertidas else 0
+    return cartas, bits
+
+
+def _orientaciones(bits, cantidad):
+    return tuple(bool(bits >> i & 1) for i in range(cantidad))
+
+
+def sortear(ids_cartas, cantidad, permite_invertidas, semilla=None):
+    """
+    Sortear `cantidad` cartas distintas de `ids_cartas` (ver arreglo_ids) y
+    su orientación. Sin semilla se usa una nueva.
+    """
+    if cantidad > len(ids_cartas):
+        raise ValueError('No hay suficientes cartas en el mazo para esta tirada')
+    if semilla is None:
+        semilla = nueva_semilla()
+    cartas, bits = _sortear(random.Random(semilla), ids_cartas, cantidad, permite_invertidas)
+    return Sorteo(semilla=semilla, cartas=tuple(cartas), invertidas=_orientaciones(bits, cantidad))
+
+
+def reproducir(semilla, mazo, tirada):
+    """
+    Sorteo de una consulta anterior a partir de su semilla
+    """
+    from .catalogo import obtener_catalogo
+    ids_cartas = obtener_catalogo().ids_por_mazo[mazo.id]
+    return sortear(ids_cartas, tirada.cantidad_cartas, mazo.permite_cartas_invertidas, semilla)
+
+
+def sortear_lote(ids_cartas, cantidad, permite_invertidas, sorteos, semilla=None):
+    """
+    Generar `sorteos` sorteos seguidos con un solo generador.
+    Devuelve (semilla, lista de (cartas, bits de orientación)); el bit i de
+    `bits` es la orientación de cartas[i] (1 = invertida).
+    """
+    if cantidad > len(ids_cartas):
+        raise ValueError('No hay suficientes cartas en el mazo para esta tirada')
+    if semilla is None:
+        semilla = nueva_semilla()
+    generador = random.Random(semilla)
+    return semilla, [_sortear(generador, ids_cartas, cantidad, permite_invertidas) for _ in range(sorteos)]
+
+
+def frecuencias_lote(ids_cartas, cantidad, permite_invertidas, sorteos, semilla):
+    """
+    Conteos de un sortear_lote para las pruebas de uniformidad: por posición,
+    cuántas veces salió cada carta y cuántas de esas veces invertida (listas
+    alineadas con ids_cartas)
+    """
+    indice = {carta_id: i for i, carta_id in enumerate(ids_cartas)}
+    apariciones = [[0] * len(ids_cartas) for _ in range(cantidad)]
+    invertidas = [[0] * len(ids_cartas) for _ in range(cantidad)]
+    _, lote = sortear_lote(ids_cartas, cantidad, permite_invertidas, sorteos, semilla)
+    for cartas, bits in lote:
+        for posicion, carta_id in enumerate(cartas):
+            i = indice[carta_id]
+            apariciones[posicion][i] += 1
+            if bits >> posicion & 1:
+                invertidas[posicion][i] += 1
+    return apariciones, invertidas
@@ -1,3 +1,467 @@
-from django.test import TestCase
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from core.campos import optimizar_queryset, parsear_campos
+
+from oraculoApi import catalogo
+from oraculoApi.clasificador import ClasificadorPreguntas, clasificador_preguntas
+from oraculoApi.serializers import CartaSerializer, TiradaSerializer
+from oraculoApi.resiliencia import CircuitBreaker, CircuitoAbierto, LimitadorConcurrencia, SinCapacidad
+from oraculoApi.services import GeminiService
+from oraculoApi.models import Set, Mazo, Carta, Tirada, ItemDeTirada
+
+
+# La versión recordada por el proceso no vence durante la prueba
+@override_settings(VERSIONES_REFRESCO=3600)
+class CacheHTTPCatalogoTests(TestCase):
+    """
+    Validadores HTTP de los endpoints del catálogo
+    """
+    url = '/api/oraculo/sets/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.set = Set.objects.create(nombre='Set de prueba', descripcion='Descripción')
+
+    def setUp(self):
+        # Otras pruebas cambian la versión dentro de transacciones que se
+        # revierten: se descarta el valor que el proceso recuerda de ellas
+        catalogo._version.olvidar()
+
+    def test_304_sin_queries_al_catalogo(self):
+        respuesta = self.client.get(self.url)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertIn('public', respuesta['Cache-Control'])
+        with self.assertNumQueries(0):
+            condicional = self.client.get(self.url, HTTP_IF_NONE_MATCH=respuesta['ETag'])
+        self.assertEqual(condicional.status_code, 304)
+        self.assertEqual(condicional['ETag'], respuesta['ETag'])
+
+    def test_sin_last_modified(self):
+        respuesta = self.client.get(self.url)
+        self.assertNotIn('Last-Modified', respuesta)
+        # Solo el ETag decide el 304
+        condicional = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT')
+        self.assertEqual(condicional.status_code, 200)
+
+    def test_validadores_iguales_en_todos_los_procesos(self):
+        respuesta = self.client.get(self.url)
+        # Otro proceso: sin valores recordados, lee la misma versión compartida
+        catalogo._version.olvidar()
+        self.assertEqual(self.client.get(self.url)['ETag'], respuesta['ETag'])
+
+    def test_edicion_invalida_al_confirmar(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.set.nombre = 'Set renombrado'
+            self.set.save()
+            self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        respuesta = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertContains(respuesta, 'Set renombrado')
+
+
+class ClasificadorPreguntasTests(SimpleTestCase):
+    """
+    Clasificación de la pregunta por palabras clave enteras
+    """
+
+    def _tipos(self, pregunta, clasificador=clasificador_preguntas):
+        return [categoria['tipo'] for categoria, _ in clasificador.clasificar(pregunta)]
+
+    def test_palabras_separadas_por_puntuacion(self):
+        for pregunta in ('¿Volverá mi ex-pareja?', '¿Y mi ex?', 'Mi pareja/ex...', '"Amor", ¿llegará?'):
+            with self.subTest(pregunta=pregunta):
+                self.assertEqual(self._tipos(pregunta), ['AMOR Y RELACIONES'])
+
+    def test_sin_coincidencias_parciales(self):
+        self.assertEqual(self._tipos('¿Aprobaré el examen? Busco experiencia'), [])
+
+    def test_tildes_mayusculas_y_plurales(self):
+        self.assertEqual(self._tipos('RELACION con mis HIJOS'), ['AMOR Y RELACIONES', 'FAMILIA Y HOGAR'])
+        self.assertEqual(self._tipos('¿Mejorarán mis relaciones?'), ['AMOR Y RELACIONES'])
+
+    def test_varias_categorias_por_peso(self):
+        resultado = clasificador_preguntas.clasificar('¿Mi trabajo, mi jefe y el dinero de mi empresa?')
+        self.assertEqual(
+            [(categoria['tipo'], peso) for categoria, peso in resultado],
+            [('TRABAJO Y CARRERA', 0.75), ('DINERO Y FINANZAS', 0.25)]
+        )
+
+    def test_empate_por_orden_de_la_tabla(self):
+        self.assertEqual(self._tipos('Salud y dinero'), ['SALUD Y BIENESTAR', 'DINERO Y FINANZAS'])
+        self.assertEqual(self._tipos('Dinero y salud'), ['SALUD Y BIENESTAR', 'DINERO Y FINANZAS'])
+
+    def test_tabla_propia(self):
+        clasificador = ClasificadorPreguntas([{'tipo': 'VIAJES', 'palabras': ['viaje', 'país']}])
+        self.assertEqual(self._tipos('¿Un viaje a otro pais?', clasificador), ['VIAJES'])
+        self.assertEqual(self._tipos('¿Mi pareja?', clasificador), [])
+
+
+class ModeloSimulado:
+    """
+    Sustituto de genai.GenerativeModel: responde tras `latencia` segundos, o
+    falla mientras `caido` sea True, sin llamar a la API real
+    """
+
+    def __init__(self, latencia=0, caido=False):
+        self.latencia = latencia
+        self.caido = caido
+        self.llamadas = 0
+
+    def _respuesta(self):
+        self.llamadas += 1
+        if self.caido:
+            raise ConnectionError('503 Service Unavailable (simulado)')
+        candidato = SimpleNamespace(
+            finish_reason=SimpleNamespace(name='STOP'),
+            content=SimpleNamespace(parts=[SimpleNamespace(text='Interpretación simulada')]),
+        )
+        return SimpleNamespace(candidates=[candidato])
+
+    def generate_content(self, *args, **kwargs):
+        time.sleep(self.latencia)
+        return self._respuesta()
+
+    async def generate_content_async(self, *args, **kwargs):
+        await asyncio.sleep(self.latencia)
+        return self._respuesta()
+
+
+class Reloj:
+    """
+    Reloj manual para el circuit breaker
+    """
+
+    def __init__(self):
+        self.ahora = 0.0
+
+    def __call__(self):
+        return self.ahora
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    """
+    Transiciones cerrado -> abierto -> semiabierto -> cerrado
+    """
+
+    def setUp(self):
+        self.reloj = Reloj()
+        self.breaker = CircuitBreaker(umbral_fallos=3, tiempo_apertura=30, reloj=self.reloj)
+
+    def _abrir(self):
+        for _ in range(3):
+            self.breaker.permitir()
+            self.breaker.registrar_fallo()
+
+    def test_se_abre_tras_el_umbral_y_rechaza(self):
+        for _ in range(2):
+            self.breaker.permitir()
+            self.breaker.registrar_fallo()
+        self.assertEqual(self.breaker.estado()['circuito'], CircuitBreaker.CERRADO)
+        self.breaker.permitir()
+        self.breaker.registrar_fallo()
+        self.assertEqual(self.breaker.estado()['circuito'], CircuitBreaker.ABIERTO)
+
+        self.reloj.ahora = 29
+        with self.assertRaises(CircuitoAbierto):
+            self.breaker.permitir()
+        self.assertEqual(self.breaker.estado()['aperturas'], 1)
+
+    def test_un_exito_reinicia_los_fallos(self):
+        for _ in range(2):
+            self.breaker.registrar_fallo()
+        self.breaker.registrar_exito()
+        for _ in range(2):
+            self.breaker.registrar_fallo()
+        self.assertEqual(self.breaker.estado()['circuito'], CircuitBreaker.CERRADO)
+
+    def test_semiabierto_deja_una_prueba_y_cierra_con_exito(self):
+        self._abrir()
+        self.reloj.ahora = 30
+        self.assertEqual(self.breaker.estado()['circuito'], CircuitBreaker.SEMIABIERTO)
+        self.breaker.permitir()
+        with self.assertRaises(CircuitoAbierto):
+            self.breaker.permitir()
+        self.breaker.registrar_exito()
+        self.assertEqual(self.breaker.estado()['circuito'], CircuitBreaker.CERRADO)
+        self.breaker.permitir()
+
+    def test_semiabierto_vuelve_a_abrir_con_un_fallo(self):
+        self._abrir()
+        self.reloj.ahora = 30
+        self.breaker.permitir()
+        self.breaker.registrar_fallo()
+        self.assertEqual(self.breaker.estado()['circuito'], CircuitBreaker.ABIERTO)
+        self.assertEqual(self.breaker.estado()['aperturas'], 2)
+        with self.assertRaises(CircuitoAbierto):
+            self.breaker.permitir()
+
+    def test_prueba_cancelada_libera_el_turno(self):
+        self._abrir()
+        self.reloj.ahora = 30
+        self.breaker.permitir()
+        self.breaker.cancelar_prueba()
+        self.breaker.permitir()
+
+
+class LimitadorConcurrenciaTests(SimpleTestCase):
+    """
+    Cupos de llamadas simultáneas a Gemini
+    """
+
+    def setUp(self):
+        self.limitador = LimitadorConcurrencia(2)
+
+    def test_maximo_de_cupos(self):
+        self.limitador.adquirir(0)
+        self.limitador.adquirir(0)
+        with self.assertRaises(SinCapacidad):
+            self.limitador.adquirir(0.01)
+        self.assertEqual(self.limitador.estado()['en_vuelo'], 2)
+        self.assertEqual(self.limitador.estado()['rechazadas'], 1)
+
+        self.limitador.liberar()
+        self.limitador.adquirir(0)
+        self.assertEqual(self.limitador.estado()['en_vuelo'], 2)
+
+    def test_espera_un_cupo_liberado(self):
+        self.limitador.adquirir(0)
+        self.limitador.adquirir(0)
+        threading.Timer(0.05, self.limitador.liberar).start()
+        self.limitador.adquirir(5)
+        self.assertEqual(self.limitador.estado(), {
+            'max_concurrencia': 2, 'en_vuelo': 2, 'en_espera': 0, 'rechazadas': 0,
+        })
+
+    async def test_espera_async_cancelada_devuelve_el_cupo(self):
+        self.limitador.adquirir(0)
+        self.limitador.adquirir(0)
+        tarea = asyncio.ensure_future(self.limitador.adquirir_async(5))
+        while self.limitador.estado()['en_espera'] == 0:
+            await asyncio.sleep(0.005)
+        tarea.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await tarea
+
+        # El cupo liberado lo toma el thread de la espera cancelada, que debe devolverlo
+        self.limitador.liberar()
+        while self.limitador.estado()['en_espera']:
+            await asyncio.sleep(0.005)
+        self.limitador.liberar()
+        self.limitador.adquirir(1)
+        self.limitador.adquirir(1)
+        self.assertEqual(self.limitador.estado()['en_vuelo'], 2)
+
+
+class GeminiServiceResilienciaTests(SimpleTestCase):
+    """
+    GeminiService con un modelo simulado: interpretación alternativa cuando
+    el circuito está abierto o no hay cupo
+    """
+
+    def setUp(self):
+        self.servicio = GeminiService()
+        self.reloj = Reloj()
+        self.servicio.breaker = CircuitBreaker(umbral_fallos=2, tiempo_apertura=30, reloj=self.reloj)
+        self.servicio.limitador = LimitadorConcurrencia(2)
+        self.servicio.espera_max = 0.05
+
+    def test_circuito_abierto_no_llama_al_modelo(self):
+        self.servicio.model = modelo = ModeloSimulado(caido=True)
+        for _ in range(3):
+            texto = self.servicio.generar_interpretacion_tarot('prompt')
+            self.assertTrue(self.servicio.es_interpretacion_alternativa(texto))
+        self.assertEqual(modelo.llamadas, 2)
+        self.assertEqual(self.servicio.estado_llamadas()['circuito'], CircuitBreaker.ABIERTO)
+
+        modelo.caido = False
+        self.reloj.ahora = 30
+        self.assertEqual(self.servicio.generar_interpretacion_tarot('prompt'), 'Interpretación simulada')
+        self.assertEqual(self.servicio.estado_llamadas()['circuito'], CircuitBreaker.CERRADO)
+
+    async def test_circuito_abierto_async(self):
+        self.servicio.model = modelo = ModeloSimulado(caido=True)
+        for _ in range(3):
+            texto = await self.servicio.generar_interpretacion_tarot_async('prompt')
+            self.assertTrue(self.servicio.es_interpretacion_alternativa(texto))
+        self.assertEqual(modelo.llamadas, 2)
+
+    def test_respuesta_fuera_de_plazo_cuenta_como_fallo(self):
+        self.servicio.model = ModeloSimulado(latencia=0.05)
+        self.servicio.deadline = 0.01
+        for _ in range(2):
+            self.servicio.generar_interpretacion_tarot('prompt')
+        self.assertEqual(self.servicio.estado_llamadas()['circuito'], CircuitBreaker.ABIERTO)
+
+    def test_sin_cupo_responde_la_alternativa_sin_abrir_el_circuito(self):
+        self.servicio.model = modelo = ModeloSimulado(latencia=0.3)
+        resultados = []
+        hilos = [
+            threading.Thread(target=lambda: resultados.append(self.servicio.generar_interpretacion_tarot('prompt')))
+            for _ in range(5)
+        ]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        alternativas = sum(1 for texto in resultados if self.servicio.es_interpretacion_alternativa(texto))
+        estado = self.servicio.estado_llamadas()
+        self.assertEqual((modelo.llamadas, alternativas), (2, 3))
+        self.assertEqual((estado['rechazadas'], estado['en_vuelo']), (3, 0))
+        self.assertEqual(estado['circuito'], CircuitBreaker.CERRADO)
+
+
+def crear_catalogo(cartas=3, posiciones=('Presente',)):
+    """
+    Set con un mazo de `cartas` cartas y una tirada con esas posiciones
+    """
+    set_obj = Set.objects.create(nombre='Set', descripcion='Descripción')
+    mazo = Mazo.objects.create(set=set_obj, nombre='Mazo', descripcion='Descripción')
+    for numero in range(cartas):
+        Carta.objects.create(
+            mazo=mazo, numero=numero, nombre=f'Carta {numero}',
+            significado_normal=f'Normal {numero}', significado_invertida=f'Invertida {numero}'
+        )
+    tirada = Tirada.objects.create(
+        mazo=mazo, nombre='Tirada', descripcion='Descripción', cantidad_cartas=len(posiciones)
+    )
+    for orden, posicion in enumerate(posiciones):
+        ItemDeTirada.objects.create(tirada=tirada, nombre_posicion=posicion, descripcion=f'Sobre {posicion}', orden=orden)
+    return set_obj, mazo, tirada
+
+
+class CatalogoSnapshotTests(TestCase):
+    """
+    Los payloads del snapshot se comparten entre requests: no se pueden
+    modificar y se entregan como copias
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.set, cls.mazo, cls.tirada = crear_catalogo()
+
+    def setUp(self):
+        catalogo.invalidar_catalogo()
+        self.snapshot = catalogo.obtener_catalogo()
+        self.carta_id = self.snapshot.ids_por_mazo[self.mazo.id][0]
+
+    def test_payloads_congelados(self):
+        carta = self.snapshot.cartas_serializadas[self.carta_id]
+        tirada = self.snapshot.tiradas_serializadas[self.tirada.id]
+        with self.assertRaises(TypeError):
+            carta['nombre'] = 'Otra'
+        with self.assertRaises(TypeError):
+            tirada['items'][0]['descripcion'] = 'Otra'
+
+    def test_copias_independientes(self):
+        carta = self.snapshot.carta_serializada(self.carta_id)
+        tirada = self.snapshot.tirada_serializada(self.tirada.id)
+        carta['nombre'] = 'Otra'
+        tirada['items'][0]['descripcion'] = 'Otra'
+        tirada['items'].append({})
+
+        self.assertEqual(self.snapshot.carta_serializada(self.carta_id)['nombre'], 'Carta 0')
+        self.assertEqual(self.snapshot.tirada_serializada(self.tirada.id)['items'], [{
+            'id': self.tirada.items.get().id, 'nombre_posicion': 'Presente',
+            'descripcion': 'Sobre Presente', 'orden': 0,
+        }])
+        self.assertIsNone(self.snapshot.carta_serializada(0))
+
+
+class ConsultaSinGeminiTests(TestCase):
+    """
+    Si GeminiService no se pudo inicializar la consulta responde 503
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        set_obj, mazo, tirada = crear_catalogo()
+        cls.payload = {'pregunta': '¿Qué me espera?', 'set_id': set_obj.id, 'mazo_id': mazo.id, 'tirada_id': tirada.id}
+
+    def setUp(self):
+        catalogo.invalidar_catalogo()
+        parche = mock.patch('oraculoApi.views.get_gemini_service', return_value=None)
+        parche.start()
+        self.addCleanup(parche.stop)
+
+    def test_consultas_responden_503(self):
+        for url in ('/api/oraculo/consulta-tarot/', '/api/oraculo/consulta-tarot-async/',
+                    '/api/oraculo/consulta-tarot-stream/'):
+            with self.subTest(url=url):
+                respuesta = self.client.post(url, self.payload, content_type='application/json')
+                self.assertEqual(respuesta.status_code, 503)
+                self.assertEqual(respuesta.json(), {'error': 'Servicio de Gemini no disponible'})
+
+
+class CamposDinamicosTests(TestCase):
+    """
+    ?fields= / ?expand= en los endpoints del catálogo y el queryset que generan
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.set, cls.mazo, cls.tirada = crear_catalogo(posiciones=('Pasado', 'Presente'))
+
+    def test_parsear_campos(self):
+        self.assertIsNone(parsear_campos(''))
+        self.assertEqual(
+            parsear_campos('id, items.nombre_posicion,items.orden,'),
+            {'id': {}, 'items': {'nombre_posicion': {}, 'orden': {}}}
+        )
+
+    def test_fields_limita_respuesta_y_columnas(self):
+        with CaptureQueriesContext(connection) as queries:
+            respuesta = self.client.get('/api/oraculo/cartas/', {'fields': 'id,nombre'})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(set(respuesta.json()[0]), {'id', 'nombre'})
+        consulta_cartas = [q['sql'] for q in queries if 'oraculoApi_carta' in q['sql']]
+        self.assertEqual(len(consulta_cartas), 1)
+        self.assertNotIn('significado_normal', consulta_cartas[0])
+
+    def test_fields_anidados(self):
+        respuesta = self.client.get(f'/api/oraculo/tiradas/{self.tirada.id}/', {'fields': 'nombre,items.nombre_posicion'})
+        self.assertEqual(respuesta.json(), {
+            'nombre': 'Tirada', 'items': [{'nombre_posicion': 'Pasado'}, {'nombre_posicion': 'Presente'}],
+        })
+
+    def test_expand(self):
+        respuesta = self.client.get('/api/oraculo/cartas/', {'fields': 'id,mazo.nombre', 'expand': 'mazo'})
+        self.assertEqual(respuesta.json()[0]['mazo'], {'nombre': 'Mazo'})
+        respuesta = self.client.get('/api/oraculo/cartas/')
+        self.assertEqual(respuesta.json()[0]['mazo'], self.mazo.id)
+
+    def test_campos_invalidos(self):
+        respuesta = self.client.get('/api/oraculo/cartas/', {'fields': 'id,no_existe'})
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn('fields', respuesta.json())
+        respuesta = self.client.get('/api/oraculo/cartas/', {'expand': 'numero'})
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn('expand', respuesta.json())
+
+    def test_plan_columna_de_fk(self):
+        queryset = optimizar_queryset(Carta.objects.all(), CartaSerializer(campos={'id': {}, 'mazo_nombre': {}}))
+        self.assertEqual(queryset.query.deferred_loading, ({'id', 'mazo', 'mazo__nombre'}, False))
+        self.assertEqual(queryset.query.select_related, {'mazo': {}})
+
+    def test_plan_relacion_inversa(self):
+        queryset = optimizar_queryset(
+            Tirada.objects.prefetch_related('items'),
+            TiradaSerializer(campos={'nombre': {}, 'items': {'nombre_posicion': {}}})
+        )
+        self.assertEqual(queryset.query.deferred_loading, ({'id', 'nombre'}, False))
+        prefetch, = queryset._prefetch_related_lookups
+        self.assertEqual(prefetch.prefetch_through, 'items')
+        self.assertEqual(prefetch.queryset.query.deferred_loading, ({'id', 'tirada', 'nombre_posicion'}, False))
+
+    def test_plan_columnas_requeridas(self):
+        queryset = optimizar_queryset(Carta.objects.all(), CartaSerializer(campos={'nombre': {}}), 'numero')
+        self.assertEqual(queryset.query.deferred_loading, ({'id', 'nombre', 'numero'}, False))
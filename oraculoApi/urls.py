@@ -17,4 +17,12 @@ urlpatterns = [
     
     # Endpoint principal para consulta de tarot
     path('consulta-tarot/', views.consulta_tarot, name='consulta-tarot'),
+    # Misma consulta, asíncrona (pensada para servir con ASGI)
+    path('consulta-tarot-async/', views.consulta_tarot_async, name='consulta-tarot-async'),
+    # Misma consulta, con la interpretación transmitida por Server-Sent Events
+    path('consulta-tarot-stream/', views.consulta_tarot_stream, name='consulta-tarot-stream'),
+    # Métricas del cache de interpretaciones (solo staff)
+    path('cache-interpretaciones/', views.estadisticas_cache_interpretaciones, name='cache-interpretaciones'),
+    # Circuit breaker y cola de llamadas a Gemini (solo staff)
+    path('estado-gemini/', views.estado_gemini, name='estado-gemini'),
 ]
\ No newline at end of file
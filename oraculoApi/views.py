@@ -1,23 +1,31 @@
-from rest_framework import viewsets, status
-from rest_framework.decorators import api_view
+from rest_framework import viewsets, status, permissions
+from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
-from django.shortcuts import get_object_or_404
-import random
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from asgiref.sync import sync_to_async
+import json
 import logging  # AGREGADO: Import del módulo logging
 
+from core.campos import CamposDinamicosViewSetMixin
+
 from .models import Set, Mazo, Carta, Tirada, ItemDeTirada
 from .serializers import (
     SetSerializer, MazoSerializer, CartaSerializer, TiradaSerializer,
     SetConMazosSerializer, MazoConTiradasSerializer, ConsultaTarotSerializer,
     RespuestaTarotSerializer, CartaEnTiradaSerializer
 )
-from .services import gemini_service
+from .services import get_gemini_service
+from .catalogo import CatalogoHTTPCacheMixin, obtener_catalogo
+from .clasificador import clasificador_preguntas
+from . import cache_interpretaciones, sorteo
 
 # AGREGADO: Configuración del logger
 logger = logging.getLogger(__name__)
 
 
-class SetViewSet(viewsets.ReadOnlyModelViewSet):
+class SetViewSet(CatalogoHTTPCacheMixin, CamposDinamicosViewSetMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet para obtener Sets de mazos
     """
@@ -25,7 +33,7 @@ class SetViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = SetSerializer
 
 
-class SetConMazosViewSet(viewsets.ReadOnlyModelViewSet):
+class SetConMazosViewSet(CatalogoHTTPCacheMixin, CamposDinamicosViewSetMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet para obtener Sets con sus mazos incluidos
     """
@@ -33,7 +41,7 @@ class SetConMazosViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = SetConMazosSerializer
 
 
-class MazoViewSet(viewsets.ReadOnlyModelViewSet):
+class MazoViewSet(CatalogoHTTPCacheMixin, CamposDinamicosViewSetMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet para obtener Mazos
     """
@@ -41,7 +49,7 @@ class MazoViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = MazoSerializer
 
 
-class MazoConTiradasViewSet(viewsets.ReadOnlyModelViewSet):
+class MazoConTiradasViewSet(CatalogoHTTPCacheMixin, CamposDinamicosViewSetMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet para obtener Mazos con sus tiradas incluidas
     """
@@ -49,7 +57,7 @@ class MazoConTiradasViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = MazoConTiradasSerializer
 
 
-class CartaViewSet(viewsets.ReadOnlyModelViewSet):
+class CartaViewSet(CatalogoHTTPCacheMixin, CamposDinamicosViewSetMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet para obtener Cartas
     """
@@ -57,7 +65,7 @@ class CartaViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = CartaSerializer
 
 
-class TiradaViewSet(viewsets.ReadOnlyModelViewSet):
+class TiradaViewSet(CatalogoHTTPCacheMixin, CamposDinamicosViewSetMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet para obtener Tiradas
     """
@@ -65,6 +73,141 @@ class TiradaViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = TiradaSerializer
 
 
+class ConsultaInvalida(Exception):
+    """
+    La consulta no se puede realizar con la configuración actual del mazo/tirada
+    """
+    status_code = status.HTTP_400_BAD_REQUEST
+
+
+class GeminiNoDisponible(ConsultaInvalida):
+    """
+    GeminiService no se pudo inicializar (get_gemini_service devolvió None)
+    """
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+
+
+def _gemini():
+    """
+    Instancia compartida de GeminiService; lanza GeminiNoDisponible si no existe
+    """
+    gemini_service = get_gemini_service()
+    if gemini_service is None:
+        raise GeminiNoDisponible('Servicio de Gemini no disponible')
+    return gemini_service
+
+
+def _preparar_consulta(data):
+    """
+    Parte sincrónica de la consulta: obtiene el catálogo, sortea las cartas
+    y arma el prompt. La comparten la vista síncrona y la asíncrona.
+
+    Returns:
+        tuple: (tirada, cartas_resultado, prompt, clave_cache, sorteo)
+        clave_cache es None si la tirada no reutiliza interpretaciones;
+        sorteo.semilla permite reproducir las cartas (ver sorteo.reproducir)
+    """
+    pregunta = data['pregunta']
+
+    # Obtener objetos (del snapshot en memoria, sin queries)
+    catalogo = obtener_catalogo()
+    set_obj, mazo, tirada = catalogo.obtener_tirada(data['set_id'], data['mazo_id'], data['tirada_id'])
+
+    # Ids de las cartas del mazo
+    ids_cartas = catalogo.ids_por_mazo[mazo.id]
+
+    if len(ids_cartas) < tirada.cantidad_cartas:
+        raise ConsultaInvalida('No hay suficientes cartas en el mazo para esta tirada')
+
+    # Cartas y orientaciones al azar, con un generador propio de la consulta
+    resultado_sorteo = sorteo.sortear(ids_cartas, tirada.cantidad_cartas, mazo.permite_cartas_invertidas)
+    logger.info(f"Sorteo de tirada {tirada.id}: semilla {resultado_sorteo.semilla}")
+
+    # Obtener items de tirada ordenados
+    items_tirada = catalogo.items_por_tirada[tirada.id]
+
+    if len(items_tirada) != tirada.cantidad_cartas:
+        raise ConsultaInvalida('La configuración de la tirada no coincide con la cantidad de cartas')
+
+    # Generar resultado de cartas con posiciones
+    cartas_resultado = []
+    for item_tirada, carta_id, es_invertida in zip(items_tirada, resultado_sorteo.cartas, resultado_sorteo.invertidas):
+        carta = catalogo.carta_serializada(carta_id)
+
+        # Seleccionar significado según orientación
+        significado_usado = carta['significado_invertida'] if es_invertida else carta['significado_normal']
+
+        carta_en_tirada = {
+            'carta': carta,
+            'posicion': item_tirada.nombre_posicion,
+            'descripcion_posicion': item_tirada.descripcion,
+            'es_invertida': es_invertida,
+            'significado_usado': significado_usado
+        }
+        cartas_resultado.append(carta_en_tirada)
+
+    # MEJORADO: Pasar el objeto tirada completo al método crear_prompt_tarot
+    gemini_service = _gemini()
+    prompt = gemini_service.crear_prompt_tarot(pregunta, mazo, tirada, cartas_resultado)
+
+    categorias = [categoria['tipo'] for categoria, _ in clasificador_preguntas.clasificar(pregunta)]
+    clave_cache = cache_interpretaciones.clave_lectura(
+        gemini_service.model_name, mazo, tirada, cartas_resultado, categorias
+    )
+
+    return tirada, cartas_resultado, prompt, clave_cache, resultado_sorteo
+
+
+def _interpretar(prompt, clave_cache):
+    """
+    Interpretación desde el cache de lecturas idénticas, o generada con Gemini
+    """
+    interpretacion_ia = cache_interpretaciones.obtener(clave_cache)
+    if interpretacion_ia is None:
+        gemini_service = _gemini()
+        interpretacion_ia = gemini_service.generar_interpretacion_tarot(prompt)
+        if not gemini_service.es_interpretacion_alternativa(interpretacion_ia):
+            cache_interpretaciones.guardar(clave_cache, prompt, interpretacion_ia)
+    return interpretacion_ia
+
+
+async def _interpretar_async(prompt, clave_cache):
+    """
+    Versión asíncrona de _interpretar
+    """
+    interpretacion_ia = await sync_to_async(cache_interpretaciones.obtener)(clave_cache)
+    if interpretacion_ia is None:
+        gemini_service = _gemini()
+        interpretacion_ia = await gemini_service.generar_interpretacion_tarot_async(prompt)
+        if not gemini_service.es_interpretacion_alternativa(interpretacion_ia):
+            await sync_to_async(cache_interpretaciones.guardar)(clave_cache, prompt, interpretacion_ia)
+    return interpretacion_ia
+
+
+def _tirada_info(tirada):
+    """
+    Tirada serializada, tomada del snapshot del catálogo
+    """
+    tirada_info = obtener_catalogo().tirada_serializada(tirada.id)
+    if tirada_info is None:
+        # El catálogo cambió y la tirada ya no existe en la versión nueva
+        tirada_info = TiradaSerializer(tirada).data
+    return tirada_info
+
+
+def _respuesta_consulta(pregunta, interpretacion_ia, tirada, cartas_resultado, resultado_sorteo):
+    """
+    Preparar respuesta de la consulta
+    """
+    return {
+        'pregunta': pregunta,
+        'interpretacion_ia': interpretacion_ia,
+        'cartas': cartas_resultado,
+        'tirada_info': _tirada_info(tirada),
+        'semilla_sorteo': resultado_sorteo.semilla
+    }
+
+
 @api_view(['POST'])
 def consulta_tarot(request):
     """
@@ -77,76 +220,24 @@ def consulta_tarot(request):
     
     data = serializer.validated_data
     pregunta = data['pregunta']
-    set_id = data['set_id']
-    mazo_id = data['mazo_id']
-    tirada_id = data['tirada_id']
     
     try:
-        # Obtener objetos
-        set_obj = get_object_or_404(Set, id=set_id)
-        mazo = get_object_or_404(Mazo, id=mazo_id, set=set_obj)
-        tirada = get_object_or_404(Tirada, id=tirada_id, mazo=mazo)
-        
-        # Obtener todas las cartas del mazo
-        cartas_disponibles = list(mazo.cartas.all())
-        
-        if len(cartas_disponibles) < tirada.cantidad_cartas:
-            return Response({
-                'error': 'No hay suficientes cartas en el mazo para esta tirada'
-            }, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Seleccionar cartas al azar
-        cartas_seleccionadas = random.sample(cartas_disponibles, tirada.cantidad_cartas)
-        
-        # Obtener items de tirada ordenados
-        items_tirada = list(tirada.items.all().order_by('orden'))
-        
-        if len(items_tirada) != tirada.cantidad_cartas:
-            return Response({
-                'error': 'La configuración de la tirada no coincide con la cantidad de cartas'
-            }, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Generar resultado de cartas con posiciones
-        cartas_resultado = []
-        for i, carta in enumerate(cartas_seleccionadas):
-            item_tirada = items_tirada[i]
-            
-            # Determinar si la carta va invertida
-            es_invertida = False
-            if mazo.permite_cartas_invertidas:
-                es_invertida = random.choice([True, False])
-            
-            # Seleccionar significado según orientación
-            significado_usado = carta.significado_invertida if es_invertida else carta.significado_normal
-            
-            carta_en_tirada = {
-                'carta': CartaSerializer(carta).data,
-                'posicion': item_tirada.nombre_posicion,
-                'descripcion_posicion': item_tirada.descripcion,
-                'es_invertida': es_invertida,
-                'significado_usado': significado_usado
-            }
-            cartas_resultado.append(carta_en_tirada)
-        
-        # MEJORADO: Pasar el objeto tirada completo al método crear_prompt_tarot
-        prompt = gemini_service.crear_prompt_tarot(pregunta, mazo, tirada, cartas_resultado)
+        try:
+            tirada, cartas_resultado, prompt, clave_cache, resultado_sorteo = _preparar_consulta(data)
+        except ConsultaInvalida as e:
+            return Response({'error': str(e)}, status=e.status_code)
         
         # Obtener interpretación de Gemini
         logger.info(f"Generando interpretación para tirada: {tirada.nombre}")
-        interpretacion_ia = gemini_service.generar_interpretacion_tarot(prompt)
+        interpretacion_ia = _interpretar(prompt, clave_cache)
         
         logger.info("Interpretación generada exitosamente")
         
-        # Preparar respuesta
-        respuesta_data = {
-            'pregunta': pregunta,
-            'interpretacion_ia': interpretacion_ia,
-            'cartas': cartas_resultado,
-            'tirada_info': TiradaSerializer(tirada).data
-        }
-        
+        respuesta_data = _respuesta_consulta(pregunta, interpretacion_ia, tirada, cartas_resultado, resultado_sorteo)
         return Response(respuesta_data, status=status.HTTP_200_OK)
         
+    except ConsultaInvalida as e:
+        return Response({'error': str(e)}, status=e.status_code)
     except Exception as e:
         logger.error(f"Error en consulta de tarot: {str(e)}")
         logger.error(f"Tipo de error: {type(e).__name__}")
@@ -155,6 +246,146 @@ def consulta_tarot(request):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+def _evento_sse(evento, datos):
+    """
+    Formatear un evento Server-Sent Events con datos JSON
+    """
+    return f"event: {evento}\ndata: {json.dumps(datos, ensure_ascii=False)}\n\n"
+
+
+@api_view(['POST'])
+def consulta_tarot_stream(request):
+    """
+    Consulta de tarot con la interpretación transmitida por Server-Sent Events.
+
+    Eventos emitidos:
+    - cartas: pregunta, cartas extraídas, info de la tirada y semilla del sorteo (inmediato)
+    - texto: cada fragmento de la interpretación a medida que se genera
+    - fin: la interpretación completa, para guardarla en el historial
+    """
+    serializer = ConsultaTarotSerializer(data=request.data)
+
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    data = serializer.validated_data
+    pregunta = data['pregunta']
+
+    try:
+        tirada, cartas_resultado, prompt, clave_cache, resultado_sorteo = _preparar_consulta(data)
+        gemini_service = _gemini()
+        inicial = {
+            'pregunta': pregunta,
+            'cartas': cartas_resultado,
+            'tirada_info': _tirada_info(tirada),
+            'semilla_sorteo': resultado_sorteo.semilla
+        }
+    except ConsultaInvalida as e:
+        return Response({'error': str(e)}, status=e.status_code)
+    except Exception as e:
+        logger.error(f"Error en consulta de tarot (stream): {str(e)}")
+        return Response({
+            'error': f'Error procesando consulta: {str(e)}'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    def eventos():
+        yield _evento_sse('cartas', inicial)
+
+        guardada = cache_interpretaciones.obtener(clave_cache)
+        if guardada is not None:
+            yield _evento_sse('texto', {'texto': guardada})
+            yield _evento_sse('fin', {'interpretacion_ia': guardada})
+            return
+
+        logger.info(f"Transmitiendo interpretación para tirada: {tirada.nombre}")
+        partes = []
+        resultado = {}
+        for texto in gemini_service.generar_interpretacion_tarot_stream(prompt, resultado):
+            partes.append(texto)
+            yield _evento_sse('texto', {'texto': texto})
+
+        interpretacion_ia = ''.join(partes).strip()
+        if resultado.get('completa'):
+            cache_interpretaciones.guardar(clave_cache, prompt, interpretacion_ia)
+        yield _evento_sse('fin', {'interpretacion_ia': interpretacion_ia})
+
+    response = StreamingHttpResponse(eventos(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Evitar que nginx acumule el stream antes de enviarlo
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@csrf_exempt
+@require_POST
+async def consulta_tarot_async(request):
+    """
+    Versión asíncrona de consulta_tarot para despliegues ASGI (core/asgi.py).
+
+    El acceso al ORM y la serialización se ejecutan con sync_to_async; la
+    llamada a Gemini se espera sin bloquear el event loop, de modo que un solo
+    proceso puede atender muchas consultas en vuelo.
+    """
+    try:
+        payload = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({'error': 'JSON inválido'}, status=status.HTTP_400_BAD_REQUEST)
+
+    serializer = ConsultaTarotSerializer(data=payload)
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    data = serializer.validated_data
+    pregunta = data['pregunta']
+
+    try:
+        try:
+            tirada, cartas_resultado, prompt, clave_cache, resultado_sorteo = await sync_to_async(_preparar_consulta)(data)
+        except ConsultaInvalida as e:
+            return JsonResponse({'error': str(e)}, status=e.status_code)
+
+        logger.info(f"Generando interpretación (async) para tirada: {tirada.nombre}")
+        interpretacion_ia = await _interpretar_async(prompt, clave_cache)
+
+        logger.info("Interpretación generada exitosamente")
+
+        respuesta_data = await sync_to_async(_respuesta_consulta)(
+            pregunta, interpretacion_ia, tirada, cartas_resultado, resultado_sorteo
+        )
+        return JsonResponse(respuesta_data, status=status.HTTP_200_OK, json_dumps_params={'ensure_ascii': False})
+
+    except ConsultaInvalida as e:
+        return JsonResponse({'error': str(e)}, status=e.status_code)
+    except Exception as e:
+        logger.error(f"Error en consulta de tarot async: {str(e)}")
+        logger.error(f"Tipo de error: {type(e).__name__}")
+        return JsonResponse({
+            'error': f'Error procesando consulta: {str(e)}'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def estadisticas_cache_interpretaciones(request):
+    """
+    Hit rate y costo ahorrado por el cache de interpretaciones
+    """
+    return Response(cache_interpretaciones.estadisticas())
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def estado_gemini(request):
+    """
+    Estado del circuit breaker y cola de llamadas a Gemini
+    """
+    try:
+        gemini_service = _gemini()
+    except GeminiNoDisponible as e:
+        return Response({'error': str(e)}, status=e.status_code)
+    return Response(gemini_service.estado_llamadas())
+
+
 def generar_prompt_ia(pregunta, mazo, cartas_resultado):
     """
     Genera el prompt que se enviará a la IA (MÉTODO LEGACY - Ya no se usa)